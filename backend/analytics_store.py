@@ -0,0 +1,375 @@
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from itertools import repeat
+import numpy as np
+from test import ANALYZER_VERSION, capture_fingerprint
+from packet_table import PROTOCOL_NAMES
+from histograms import LogHistogram
+
+# Packet rows per executemany() call during ingest
+INGEST_BATCH = 50_000
+# Captures waiting for the ingest thread, analyses don't wait beyond that
+INGEST_QUEUE = 16
+# Seconds a connection waits for another process's write to finish
+BUSY_TIMEOUT = 30.0
+# Captures kept, the oldest ingested are deleted past it (0 keeps everything)
+MAX_CAPTURES = 500
+# Seconds of packets per stored metric histogram, the time resolution of percentile queries
+HISTOGRAM_WINDOW = 60.0
+
+PERCENTILES = (50, 95, 99)
+METRICS = ("latency_ms", "jitter_ms")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    id INTEGER PRIMARY KEY,
+    capture_key TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    source TEXT NOT NULL,
+    display_filter TEXT,
+    analyzer_version TEXT NOT NULL,
+    ingested_at REAL NOT NULL,
+    start_time REAL,
+    end_time REAL,
+    packets INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    summary TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS captures_time ON captures (start_time, end_time);
+
+CREATE TABLE IF NOT EXISTS protocols (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS capture_protocols (
+    capture_id INTEGER NOT NULL REFERENCES captures (id) ON DELETE CASCADE,
+    protocol_id INTEGER NOT NULL REFERENCES protocols (id),
+    packets INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    latency_count INTEGER NOT NULL,
+    latency_sum REAL NOT NULL,
+    latency_min REAL,
+    latency_max REAL,
+    jitter_count INTEGER NOT NULL,
+    jitter_sum REAL NOT NULL,
+    jitter_max REAL,
+    PRIMARY KEY (capture_id, protocol_id)
+);
+
+CREATE TABLE IF NOT EXISTS packet_metrics (
+    capture_id INTEGER NOT NULL REFERENCES captures (id) ON DELETE CASCADE,
+    protocol_id INTEGER NOT NULL,
+    time REAL NOT NULL,
+    length INTEGER NOT NULL,
+    latency_ms REAL,
+    jitter_ms REAL,
+    flow_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS packet_metrics_protocol_time ON packet_metrics (protocol_id, time);
+CREATE INDEX IF NOT EXISTS packet_metrics_capture ON packet_metrics (capture_id);
+
+CREATE TABLE IF NOT EXISTS metric_histograms (
+    capture_id INTEGER NOT NULL REFERENCES captures (id) ON DELETE CASCADE,
+    protocol_id INTEGER NOT NULL,
+    metric TEXT NOT NULL,
+    window_start REAL NOT NULL,
+    histogram TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS metric_histograms_metric_time ON metric_histograms (metric, protocol_id, window_start);
+"""
+
+
+class StoreError(ValueError):
+    pass
+
+
+def _summary_sections(result):
+    """Analysis payload sections worth keeping, without the per-packet rows"""
+    if not result:
+        return {}
+    return {group: result[group] for group in ("overview", "analysis") if group in result}
+
+
+def _number(value):
+    return None if value is None or value != value else float(value)
+
+
+class AnalyticsStore:
+    """Embedded SQLite database of analyzed captures for cross-capture queries
+
+    After a capture is analyzed its per-protocol aggregates, the analysis
+    payload and one row of derived metrics per packet (time, protocol,
+    length, latency, jitter, flow) are written in bulk by a background
+    thread, so the analysis itself only pays for queueing the arrays it
+    already holds. Latency and jitter are also recorded into one
+    LogHistogram per protocol and HISTOGRAM_WINDOW of each capture, which
+    percentile queries merge instead of reading packet rows. Captures are
+    keyed by fingerprint, filter and analyzer version and ingested once;
+    past max_captures the oldest are deleted. Several processes can share
+    the database file (WAL mode, writes serialized by SQLite's lock).
+    """
+
+    def __init__(self, path, batch=INGEST_BATCH, max_captures=MAX_CAPTURES):
+        self.path = path
+        self.batch = batch
+        self.max_captures = max_captures
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+        self._jobs = queue.Queue(INGEST_QUEUE)
+        self._worker = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _connect(self):
+        """Connection running one transaction, committed on success and closed afterwards"""
+        db = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+        try:
+            db.execute("PRAGMA foreign_keys=ON")
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    @staticmethod
+    def capture_key(fingerprint, display_filter=None):
+        identity = f"{fingerprint}:{display_filter or ''}:{ANALYZER_VERSION}"
+        return hashlib.sha256(identity.encode()).hexdigest()[:32]
+
+    def ingest(self, pa, result=None, name=None, source=None):
+        """Queue an analyzed PacketAnalyzer (and its payload) for ingest, returns False when dropped
+
+        Called after the analysis, the arrays it computed are reused as is.
+        A full queue drops the capture rather than slowing the response; it
+        is ingested the next time it's analyzed.
+        """
+        display_filter = str(pa.display_filter) if pa.display_filter is not None else None
+        job = {
+            "key": self.capture_key(capture_fingerprint(pa.pcap_file), display_filter),
+            "name": name or os.path.basename(pa.pcap_file),
+            "source": source or pa.source_metadata.get("source", pa.pcap_file),
+            "display_filter": display_filter,
+            "table": pa.get_packet_table(),
+            "metrics": pa.get_packet_metrics(),
+            "summary": _summary_sections(result),
+        }
+        try:
+            self._jobs.put_nowait(job)
+        except queue.Full:
+            print(f"Analytics store busy, skipped ingesting {job['name']}")
+            return False
+        self._start_worker()
+        return True
+
+    def _start_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="analytics-ingest", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            try:
+                self.write(**job)
+            except Exception as e:
+                print(f"Error ingesting {job['name']} into the analytics store: {str(e)}")
+            finally:
+                self._jobs.task_done()
+
+    def flush(self):
+        """Wait for queued captures to be ingested"""
+        self._jobs.join()
+
+    def write(self, key, name, source, display_filter, table, metrics, summary):
+        """Ingest one capture synchronously, merging summary sections when it's already stored"""
+        started = time.monotonic()
+        with self._connect() as db:
+            row = db.execute("SELECT id, summary FROM captures WHERE capture_key = ?", (key,)).fetchone()
+            if row is not None:
+                if summary:
+                    merged = json.loads(row[1])
+                    for group, sections in summary.items():
+                        merged.setdefault(group, {}).update(sections)
+                    db.execute("UPDATE captures SET summary = ? WHERE id = ?",
+                               (json.dumps(merged, default=_json_default), row[0]))
+                return row[0]
+
+            n = len(table)
+            times = np.asarray(table.time)
+            capture_id = db.execute(
+                "INSERT INTO captures (capture_key, name, source, display_filter, analyzer_version, ingested_at,"
+                " start_time, end_time, packets, bytes, summary) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, name, source, display_filter, ANALYZER_VERSION, time.time(),
+                 float(times.min()) if n else None, float(times.max()) if n else None,
+                 n, int(np.asarray(table.length, dtype=np.int64).sum()),
+                 json.dumps(summary, default=_json_default))).lastrowid
+
+            protocol_ids = self._protocol_ids(db)
+            codes = np.asarray(metrics["protocol"])
+            self._write_protocols(db, capture_id, table, metrics, codes, protocol_ids)
+            columns = (protocol_ids[codes], times, np.asarray(table.length, dtype=np.int64),
+                       np.asarray(metrics["latency_ms"], dtype=np.float64),
+                       np.asarray(metrics["jitter_ms"], dtype=np.float64),
+                       np.asarray(metrics["flow_id"], dtype=np.int64))
+            for start in range(0, n, self.batch):
+                # NaN binds as NULL, which the aggregates skip
+                rows = zip(repeat(capture_id), *(column[start:start + self.batch].tolist() for column in columns))
+                db.executemany("INSERT INTO packet_metrics VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._write_histograms(db, capture_id, times, metrics, columns[0])
+            if self.max_captures:
+                # Foreign keys cascade the delete to the capture's rows in the other tables
+                db.execute("DELETE FROM captures WHERE id IN (SELECT id FROM captures"
+                           " ORDER BY ingested_at DESC, id DESC LIMIT -1 OFFSET ?)", (self.max_captures,))
+        print(f"Ingested {name} into the analytics store ({n} packets, {time.monotonic() - started:.2f}s)")
+        return capture_id
+
+    def _protocol_ids(self, db):
+        """Database id of each PROTOCOL_NAMES code, as an array indexed by code"""
+        db.executemany("INSERT OR IGNORE INTO protocols (name) VALUES (?)", [(p,) for p in PROTOCOL_NAMES])
+        ids = dict(db.execute("SELECT name, id FROM protocols"))
+        return np.array([ids[p] for p in PROTOCOL_NAMES], dtype=np.int64)
+
+    def _write_protocols(self, db, capture_id, table, metrics, codes, protocol_ids):
+        lengths = np.asarray(table.length, dtype=np.int64)
+        latency = np.asarray(metrics["latency_ms"], dtype=np.float64)
+        jitter = np.asarray(metrics["jitter_ms"], dtype=np.float64)
+        rows = []
+        for code in np.unique(codes).tolist():
+            mask = codes == code
+            lat = latency[mask]
+            lat = lat[~np.isnan(lat)]
+            jit = jitter[mask]
+            jit = jit[~np.isnan(jit)]
+            rows.append((capture_id, int(protocol_ids[code]), int(mask.sum()), int(lengths[mask].sum()),
+                         len(lat), float(lat.sum()), float(lat.min()) if len(lat) else None,
+                         float(lat.max()) if len(lat) else None,
+                         len(jit), float(jit.sum()), float(jit.max()) if len(jit) else None))
+        db.executemany("INSERT INTO capture_protocols VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    @staticmethod
+    def _write_histograms(db, capture_id, times, metrics, protocol_ids):
+        """One LogHistogram of each metric per protocol and HISTOGRAM_WINDOW"""
+        windows = np.floor(times / HISTOGRAM_WINDOW).astype(np.int64)
+        rows = []
+        for metric in METRICS:
+            values = np.asarray(metrics[metric], dtype=np.float64)
+            has = np.flatnonzero(~np.isnan(values))
+            if len(has) == 0:
+                continue
+            groups, inverse = np.unique(np.stack([protocol_ids[has], windows[has]]), axis=1, return_inverse=True)
+            inverse = inverse.reshape(-1)
+            order = np.argsort(inverse, kind="stable")
+            bounds = np.searchsorted(inverse[order], np.arange(groups.shape[1] + 1))
+            for g, (protocol_id, window) in enumerate(groups.T.tolist()):
+                histogram = LogHistogram().record(values[has[order[bounds[g]:bounds[g + 1]]]])
+                rows.append((capture_id, protocol_id, metric, window * HISTOGRAM_WINDOW,
+                             json.dumps(histogram.to_dict())))
+        db.executemany("INSERT INTO metric_histograms VALUES (?, ?, ?, ?, ?)", rows)
+
+    @staticmethod
+    def _time_filter(column_start, column_end, start, end, params):
+        clauses = []
+        if start is not None:
+            clauses.append(f"{column_end} >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append(f"{column_start} <= ?")
+            params.append(end)
+        return clauses
+
+    def captures(self, start=None, end=None):
+        """Stored captures overlapping start..end (epoch seconds), most recent first"""
+        params = []
+        clauses = self._time_filter("start_time", "end_time", start, end, params)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT id, name, source, display_filter, analyzer_version, ingested_at, start_time, end_time,"
+                f" packets, bytes FROM captures {where} ORDER BY start_time DESC", params).fetchall()
+        keys = ("id", "name", "source", "display_filter", "analyzer_version", "ingested_at",
+                "start_time", "end_time", "packets", "bytes")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def capture_summary(self, capture_id):
+        """Stored analysis payload of one capture, None when unknown"""
+        with self._connect() as db:
+            row = db.execute("SELECT summary FROM captures WHERE id = ?", (capture_id,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def protocol_stats(self, start=None, end=None, protocol=None):
+        """Per-protocol totals over the captures overlapping start..end, from the per-capture aggregates"""
+        params = []
+        clauses = self._time_filter("c.start_time", "c.end_time", start, end, params)
+        if protocol is not None:
+            clauses.append("p.name = ?")
+            params.append(protocol)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT p.name, COUNT(*), SUM(cp.packets), SUM(cp.bytes),"
+                " SUM(cp.latency_count), SUM(cp.latency_sum), MIN(cp.latency_min), MAX(cp.latency_max),"
+                " SUM(cp.jitter_count), SUM(cp.jitter_sum), MAX(cp.jitter_max)"
+                " FROM capture_protocols cp JOIN captures c ON c.id = cp.capture_id"
+                f" JOIN protocols p ON p.id = cp.protocol_id {where}"
+                " GROUP BY p.name ORDER BY SUM(cp.packets) DESC", params).fetchall()
+        return [{
+            "protocol": name,
+            "captures": captures,
+            "packets": packets,
+            "bytes": nbytes,
+            "latency": {"count": lat_n, "mean": lat_sum / lat_n if lat_n else None,
+                        "min": _number(lat_min), "max": _number(lat_max)},
+            "jitter": {"count": jit_n, "mean": jit_sum / jit_n if jit_n else None, "max": _number(jit_max)},
+        } for name, captures, packets, nbytes, lat_n, lat_sum, lat_min, lat_max, jit_n, jit_sum, jit_max in rows]
+
+    def metric_percentiles(self, metric="latency_ms", protocol=None, start=None, end=None,
+                           percentiles=PERCENTILES):
+        """Percentiles of a per-packet metric across the stored packets in start..end
+
+        Merged from the stored histograms, so memory stays bounded by the
+        histogram size however many packets are stored. Values are within
+        the histograms' precision (3 significant digits), and start/end
+        select whole HISTOGRAM_WINDOW windows.
+        """
+        if metric not in METRICS:
+            raise StoreError(f"metric must be one of {', '.join(METRICS)}")
+        params = [metric]
+        clauses = ["h.metric = ?"]
+        if protocol is not None:
+            clauses.append("h.protocol_id = (SELECT id FROM protocols WHERE name = ?)")
+            params.append(protocol)
+        if start is not None:
+            clauses.append("h.window_start > ?")
+            params.append(start - HISTOGRAM_WINDOW)
+        if end is not None:
+            clauses.append("h.window_start <= ?")
+            params.append(end)
+        merged = LogHistogram()
+        capture_ids = set()
+        with self._connect() as db:
+            # Iterating the cursor streams the rows, one histogram in memory at a time
+            for capture_id, histogram in db.execute(
+                    f"SELECT h.capture_id, h.histogram FROM metric_histograms h WHERE {' AND '.join(clauses)}",
+                    params):
+                merged.merge(LogHistogram.from_dict(json.loads(histogram)))
+                capture_ids.add(capture_id)
+        return {"metric": metric, "protocol": protocol, "captures": len(capture_ids),
+                **merged.summary(percentiles)}
+
+
+def _json_default(value):
+    if hasattr(value, "item"):
+        return value.item()
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
@@ -0,0 +1,202 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from werkzeug.datastructures import Headers
+from werkzeug.test import EnvironBuilder, run_wsgi_app
+from main import app as flask_app
+
+# Async serving: uvicorn asgi:app --port 8000
+#
+# The event loop only moves bytes. Every route except INLINE_ROUTES runs the
+# regular Flask handler from main.py in a worker process, so parsing and
+# analysis never block the loop and trivial routes stay fast under load.
+
+# Processes in the analysis pool
+ASGI_WORKERS = int(os.environ.get("ASGI_WORKERS", os.cpu_count() or 1))
+# Requests running in the pool at once, further ones wait for a slot
+ASGI_MAX_CONCURRENCY = int(os.environ.get("ASGI_MAX_CONCURRENCY", ASGI_WORKERS * 2))
+# Requests allowed to wait for a slot before new ones get 503
+ASGI_MAX_QUEUE = int(os.environ.get("ASGI_MAX_QUEUE", 64))
+
+# Cheap routes answered on the event loop without a round trip to the pool
+INLINE_ROUTES = {"/", "/api/data", "/api/submit"}
+
+# Server-Sent Events routes, relayed chunk by chunk from the worker
+STREAMING_ROUTES = {"/api/analyzeOverviewStream"}
+
+
+def _run_wsgi(method, path, query_string, headers, body, client):
+    builder = EnvironBuilder(path=path, method=method, query_string=query_string.decode("latin-1"),
+                             headers=Headers(headers), data=body)
+    environ = builder.get_environ()
+    if client:
+        environ["REMOTE_ADDR"] = client
+    app_iter, status, response_headers = run_wsgi_app(flask_app.wsgi_app, environ)
+    return app_iter, int(status.split(" ", 1)[0]), list(response_headers.items())
+
+
+def handle_request(method, path, query_string, headers, body, client=None):
+    """Run one request through the Flask app, returns (status, headers, body)"""
+    app_iter, status, response_headers = _run_wsgi(method, path, query_string, headers, body, client)
+    try:
+        data = b"".join(app_iter)
+    finally:
+        if hasattr(app_iter, "close"):
+            app_iter.close()
+    return status, response_headers, data
+
+
+def stream_request(chunks, method, path, query_string, headers, body, client=None):
+    """Run one request through the Flask app, putting (status, headers) then each body chunk on chunks
+
+    None marks the end of the response.
+    """
+    try:
+        app_iter, status, response_headers = _run_wsgi(method, path, query_string, headers, body, client)
+        chunks.put((status, response_headers))
+        try:
+            for data in app_iter:
+                chunks.put(data)
+        finally:
+            if hasattr(app_iter, "close"):
+                app_iter.close()
+    finally:
+        chunks.put(None)
+
+
+class Dispatcher:
+    """Process pool plus the admission limits in front of it"""
+
+    def __init__(self, workers=ASGI_WORKERS, max_concurrency=ASGI_MAX_CONCURRENCY, max_queue=ASGI_MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._waiting = 0
+        # Queues for streamed responses, created on the first one
+        self._manager = None
+        # spawn, forking a process that runs an event loop and threads is unsafe
+        self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        # Threads waiting on streamed chunks, one per request holding a slot, so relays
+        # never tie up the loop's default executor
+        self._relays = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="sse-relay")
+
+    def busy(self):
+        return self._slots.locked() and self._waiting >= self.max_queue
+
+    async def _acquire(self):
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+
+    async def run(self, *request):
+        await self._acquire()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, handle_request, *request)
+        finally:
+            self._slots.release()
+
+    async def stream(self, *request):
+        """Async iterator over the (status, headers) then body chunks of a streamed response"""
+        await self._acquire()
+        try:
+            loop = asyncio.get_running_loop()
+            if self._manager is None:
+                self._manager = multiprocessing.get_context("spawn").Manager()
+            chunks = self._manager.Queue()
+            done = loop.run_in_executor(self._pool, stream_request, chunks, *request)
+            while True:
+                item = await loop.run_in_executor(self._relays, chunks.get)
+                if item is None:
+                    break
+                yield item
+            await done
+        finally:
+            self._slots.release()
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._relays.shutdown(wait=False, cancel_futures=True)
+        if self._manager is not None:
+            self._manager.shutdown()
+
+
+_dispatcher = None
+
+
+def _get_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = Dispatcher()
+    return _dispatcher
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            dispatcher = _get_dispatcher()
+            print(f"Analysis pool: {dispatcher.workers} workers, {ASGI_MAX_CONCURRENCY} concurrent requests")
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if _dispatcher is not None:
+                _dispatcher.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    body = await _read_body(receive)
+    headers = [(k.decode("latin-1"), v.decode("latin-1")) for k, v in scope["headers"]]
+    client = scope["client"][0] if scope.get("client") else None
+    request = (scope["method"], scope["path"], scope["query_string"], headers, body, client)
+
+    if scope["path"] in INLINE_ROUTES:
+        status, response_headers, data = handle_request(*request)
+    else:
+        dispatcher = _get_dispatcher()
+        if dispatcher.busy():
+            status, response_headers, data = 503, [("Content-Type", "application/json"), ("Retry-After", "1")], \
+                b'{"error": "Server busy, try again shortly"}'
+        elif scope["path"] in STREAMING_ROUTES:
+            return await _send_stream(send, dispatcher.stream(*request))
+        else:
+            status, response_headers, data = await dispatcher.run(*request)
+
+    await _send_start(send, status, response_headers)
+    await send({"type": "http.response.body", "body": data})
+
+
+async def _send_start(send, status, headers):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+    })
+
+
+async def _send_stream(send, chunks):
+    started = False
+    async for item in chunks:
+        if not started:
+            await _send_start(send, *item)
+            started = True
+        else:
+            await send({"type": "http.response.body", "body": item, "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
@@ -0,0 +1,43 @@
+import threading
+from collections import OrderedDict
+from test import ANALYZER_VERSION, capture_fingerprint
+from singleflight import SingleFlight
+
+MAX_ENTRIES = 16
+
+
+class CaptureCache:
+    """LRU of structures derived from a capture (rollups, search indexes)
+
+    Entries are keyed by kind and the capture's fingerprint, so a file that
+    changes on disk gets rebuilt instead of served stale. Concurrent misses on
+    the same key wait for one build.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = SingleFlight()
+
+    def get(self, kind, pcap_file, build):
+        """Cached value for (kind, pcap_file), calling build() on a miss"""
+        key = (kind, capture_fingerprint(pcap_file), ANALYZER_VERSION)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        value = self._inflight.do(key, build)
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+capture_cache = CaptureCache()
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+from contextlib import contextmanager
+from packet_table import PacketTable
+from responses import json_default
+from test import ANALYZER_VERSION, capture_fingerprint
+
+try:
+    import fcntl
+except ImportError:  # no flock on Windows, workers may then decode the same capture concurrently
+    fcntl = None
+
+METRIC_COLUMNS = ("protocol", "latency_ms", "jitter_ms", "flow_id")
+
+# Bytes the store may hold before the least recently used captures are evicted
+MAX_BYTES = 4 << 30
+
+
+def check_private(path):
+    """Raise PermissionError unless path is owned by this user and not writable by anyone else
+
+    Whoever can write to the store can plant entries the workers load, so a
+    shared or pre-created directory is refused.
+    """
+    st = os.stat(path)
+    if hasattr(os, "getuid") and st.st_uid != os.getuid():
+        raise PermissionError(f"{path} is owned by uid {st.st_uid}, not by this user")
+    if st.st_mode & 0o022:
+        raise PermissionError(f"{path} is writable by group or others (mode {st.st_mode & 0o777:o})")
+
+
+class CaptureStore:
+    """Decoded captures and analysis results published once on disk, shared by every worker
+
+    Each capture gets a directory named after its fingerprint holding one .npy
+    file per PacketTable column and per-packet metric. Workers open the
+    columns with np.load(mmap_mode="r"), so the pages live once in the OS
+    page cache no matter how many processes attach, and memory stays flat as
+    the worker count grows. A per-capture file lock makes the first worker
+    decode while the others wait and then attach to its result.
+
+    Entries are written to a temporary directory and renamed into place, so a
+    reader never sees a half-written capture. Past max_bytes the least
+    recently used captures are evicted along with their results.
+    """
+
+    def __init__(self, root, max_bytes=MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, mode=0o700, exist_ok=True)
+        check_private(root)
+
+    def key(self, pcap_file):
+        identity = f"{capture_fingerprint(pcap_file)}:{ANALYZER_VERSION}"
+        return hashlib.sha256(identity.encode()).hexdigest()[:32]
+
+    def _path(self, key, *parts):
+        return os.path.join(self.root, key, *parts)
+
+    @contextmanager
+    def _locked(self, name):
+        """Exclusive cross-process lock on root/name.lock"""
+        with open(os.path.join(self.root, f"{name}.lock"), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def attach(self, pcap_file, decode):
+        """(table, metrics) for a capture, read-only memory maps of the published columns
+
+        decode() is called only when the capture isn't in the store yet and
+        must return (PacketTable, metrics dict) for the whole capture.
+        """
+        key = self.key(pcap_file)
+        if not os.path.exists(self._path(key, "meta.json")):
+            with self._locked(key):
+                # Another worker may have published it while we waited for the lock
+                if not os.path.exists(self._path(key, "meta.json")):
+                    table, metrics = decode()
+                    self._publish(key, pcap_file, table, metrics)
+            self.evict(keep=key)
+        else:
+            self._touch(self._path(key, "meta.json"))
+        return self._load(key)
+
+    def _publish(self, key, pcap_file, table, metrics):
+        tmp = self._path(f".{key}.{os.getpid()}.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name, _ in PacketTable.COLUMNS:
+            np.save(os.path.join(tmp, f"{name}.npy"), getattr(table, name))
+        for name in METRIC_COLUMNS:
+            np.save(os.path.join(tmp, f"metric_{name}.npy"), metrics[name])
+        with open(os.path.join(tmp, "addresses.json"), "w") as f:
+            json.dump(table.addresses.tolist(), f)
+        # meta.json last, its presence marks a complete entry
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({"source": pcap_file, "packets": len(table), "analyzer_version": ANALYZER_VERSION}, f)
+        try:
+            os.rename(tmp, self._path(key))
+        except OSError:
+            # Published by another worker in the meantime (only possible without flock)
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        print(f"Published {pcap_file} to capture store ({len(table)} packets)")
+
+    def _load(self, key):
+        columns = {name: np.load(self._path(key, f"{name}.npy"), mmap_mode="r") for name, _ in PacketTable.COLUMNS}
+        with open(self._path(key, "addresses.json")) as f:
+            addresses = json.load(f)
+        metrics = {name: np.load(self._path(key, f"metric_{name}.npy"), mmap_mode="r") for name in METRIC_COLUMNS}
+        return PacketTable(columns, addresses), metrics
+
+    def result(self, name, pcap_file, build, arrays=False):
+        """Analysis result published once per capture, build() runs in the first worker to ask
+
+        Results are stored as JSON under the capture's key, so a capture that
+        changes on disk gets fresh results, and what comes back is the JSON
+        form of what build() returned. With arrays, build() returns a dict of
+        numpy arrays, stored with np.savez and returned as a dict again.
+        """
+        key = self.key(pcap_file)
+        os.makedirs(self._path(f"{key}.results"), mode=0o700, exist_ok=True)
+        digest = hashlib.sha256(name.encode()).hexdigest()[:32]
+        path = self._path(f"{key}.results", f"{digest}.npz" if arrays else f"{digest}.json")
+        if not os.path.exists(path):
+            # One lock per result, apart from the capture's since build() usually attaches it
+            with self._locked(os.path.join(f"{key}.results", digest)):
+                if not os.path.exists(path):
+                    value = build()
+                    tmp = f"{path}.{os.getpid()}.tmp"
+                    with open(tmp, "wb") as f:
+                        if arrays:
+                            np.savez(f, **value)
+                        else:
+                            body = json.dumps(value, default=json_default)
+                            f.write(body.encode("utf-8"))
+                            # Same form the other workers will load
+                            value = json.loads(body)
+                    os.replace(tmp, path)
+                    self.evict(keep=key)
+                    return value
+        self._touch(path)
+        if arrays:
+            with np.load(path, allow_pickle=False) as data:
+                return {name: data[name] for name in data.files}
+        with open(path, "rb") as f:
+            return json.load(f)
+
+    @staticmethod
+    def _touch(path):
+        """Mark an entry as used, eviction goes by modification time"""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _entries(self):
+        """{key: (last use, bytes)} of the published captures and their results"""
+        entries = {}
+        for entry in os.listdir(self.root):
+            path = os.path.join(self.root, entry)
+            if entry.startswith(".") or not os.path.isdir(path):
+                continue  # temporaries being written, lock files
+            key = entry.split(".", 1)[0]
+            used, size = entries.get(key, (0.0, 0))
+            for dirpath, _, files in os.walk(path):
+                for name in files:
+                    try:
+                        st = os.stat(os.path.join(dirpath, name))
+                    except OSError:
+                        continue  # evicted or replaced meanwhile
+                    used, size = max(used, st.st_mtime), size + st.st_size
+            entries[key] = (used, size)
+        return entries
+
+    def evict(self, keep=None):
+        """Remove the least recently used captures until the store fits in max_bytes
+
+        keep, the capture just published or used, is never evicted. Workers
+        that still map an evicted capture keep reading it, the files go away
+        once they close them.
+        """
+        if not self.max_bytes:
+            return
+        with self._locked("evict"):
+            entries = self._entries()
+            total = sum(size for _, size in entries.values())
+            for key in sorted(entries, key=lambda k: entries[k][0]):
+                if total <= self.max_bytes:
+                    break
+                if key == keep:
+                    continue
+                shutil.rmtree(self._path(key), ignore_errors=True)
+                shutil.rmtree(self._path(f"{key}.results"), ignore_errors=True)
+                total -= entries[key][1]
+                print(f"Evicted {key} from capture store")
+
+    def clear(self):
+        """Remove every published capture"""
+        for entry in os.listdir(self.root):
+            path = os.path.join(self.root, entry)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.unlink(path)
@@ -0,0 +1,114 @@
+import numpy as np
+from packet_table import PacketTable, PROTOCOL_NAMES
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.feather as feather
+except ImportError:  # optional, only needed for columnar export/import
+    pa = None
+
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+ARROW_EXTENSIONS = (".arrow", ".feather", ".ipc")
+COLUMNAR_EXTENSIONS = PARQUET_EXTENSIONS + ARROW_EXTENSIONS
+
+# Columns that hold indexes into the address dictionary
+ADDRESS_COLUMNS = ("src", "dst")
+
+
+def is_columnar_file(path):
+    return path.lower().endswith(COLUMNAR_EXTENSIONS)
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is required for Parquet/Arrow export, install it with `pip install pyarrow`")
+
+
+def build_arrow_table(table, metrics=None, metadata=None):
+    """Build a pyarrow Table from a PacketTable and optional per-packet metrics
+
+    Addresses and protocol names are written as dictionary columns, so the file
+    stays small and the data team sees plain strings.
+    """
+    _require_pyarrow()
+    arrays = {}
+    addresses = pa.array(table.addresses.tolist(), type=pa.string())
+    for name, _ in PacketTable.COLUMNS:
+        column = getattr(table, name)
+        if name in ADDRESS_COLUMNS:
+            arrays[name] = pa.DictionaryArray.from_arrays(pa.array(column, type=pa.int32()), addresses)
+        else:
+            arrays[name] = pa.array(column)
+
+    if metrics is not None:
+        names = pa.array(list(PROTOCOL_NAMES), type=pa.string())
+        arrays["protocol"] = pa.DictionaryArray.from_arrays(
+            pa.array(metrics["protocol"].astype(np.int32), type=pa.int32()), names)
+        arrays["latency_ms"] = pa.array(metrics["latency_ms"])
+        arrays["jitter_ms"] = pa.array(metrics["jitter_ms"])
+        arrays["flow_id"] = pa.array(metrics["flow_id"])
+
+    result = pa.table(arrays)
+    if metadata:
+        result = result.replace_schema_metadata({str(k): str(v) for k, v in metadata.items()})
+    return result
+
+
+def write_capture(path, table, metrics=None, metadata=None):
+    """Write the decoded packet table (and metrics) to Parquet or Arrow IPC, chosen by extension"""
+    arrow_table = build_arrow_table(table, metrics, metadata)
+    if path.lower().endswith(PARQUET_EXTENSIONS):
+        pq.write_table(arrow_table, path, compression="zstd")
+    elif path.lower().endswith(ARROW_EXTENSIONS):
+        feather.write_feather(arrow_table, path, compression="zstd")
+    else:
+        raise ValueError(f"Unknown columnar file type: {path}")
+    return path
+
+
+def _read_arrow_table(path):
+    _require_pyarrow()
+    if path.lower().endswith(PARQUET_EXTENSIONS):
+        return pq.read_table(path)
+    # memory_map lets the OS page the column buffers in instead of copying the file
+    return feather.read_table(path, memory_map=True)
+
+
+def _decode_addresses(columns):
+    """Turn the src/dst dictionary columns back into codes sharing one address list with "" at 0"""
+    addresses = [""]
+    index = {"": 0}
+    codes = {}
+    for name in ADDRESS_COLUMNS:
+        column = columns[name].combine_chunks()
+        if not pa.types.is_dictionary(column.type):
+            column = column.dictionary_encode()
+        dictionary = column.dictionary.to_pylist()
+        remap = np.empty(len(dictionary), dtype=np.int32)
+        for i, addr in enumerate(dictionary):
+            addr = addr or ""
+            if addr not in index:
+                index[addr] = len(addresses)
+                addresses.append(addr)
+            remap[i] = index[addr]
+        indices = column.indices.fill_null(0).to_numpy(zero_copy_only=False)
+        codes[name] = remap[indices] if len(remap) else np.zeros(len(indices), dtype=np.int32)
+    return codes, addresses
+
+
+def read_capture(path):
+    """Load a PacketTable written by write_capture, returns (table, metadata)"""
+    arrow_table = _read_arrow_table(path)
+    columns = {name: arrow_table.column(name) for name in arrow_table.column_names}
+    codes, addresses = _decode_addresses(columns)
+
+    data = {}
+    for name, dtype in PacketTable.COLUMNS:
+        if name in ADDRESS_COLUMNS:
+            data[name] = codes[name]
+        else:
+            data[name] = columns[name].to_numpy().astype(dtype, copy=False)
+
+    metadata = {k.decode(): v.decode() for k, v in (arrow_table.schema.metadata or {}).items()}
+    return PacketTable(data, addresses), metadata
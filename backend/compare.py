@@ -0,0 +1,162 @@
+import contextlib
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from test import PacketAnalyzer
+from capture_store import CaptureStore
+
+# Captures of one sweep, used when no files are given
+DEFAULT_SWEEP = [
+    "./pcapngFiles/28-1-25-bro-laptp-20ms.pcapng",
+    "./pcapngFiles/28-1-25-bro-laptp-40ms.pcapng",
+    "./pcapngFiles/28-1-25-bro-laptp-60ms.pcapng",
+]
+
+PERCENTILES = (50, 90, 95, 99)
+
+# Upper edge of the shared grid, as a percentile of all values, so a few outliers don't flatten every curve
+GRID_PERCENTILE = 99.5
+
+# Worker processes for comparisons, one per CPU
+COMPARE_WORKERS = os.cpu_count() or 1
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """Worker processes are started once and reused, spawning them per request costs more than the analysis"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, forking a threaded server is unsafe
+            _pool = ProcessPoolExecutor(max_workers=COMPARE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _series_stats(values):
+    if len(values) == 0:
+        return None
+    stats = {
+        "avg": float(np.mean(values)),
+        "min": float(np.min(values)),
+        "max": float(np.max(values)),
+        "std": float(np.std(values)),
+        "count": int(len(values)),
+    }
+    for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        stats[f"p{p}"] = float(v)
+    return stats
+
+
+def summarize_capture(pcap_file, reader="scapy", display_filter=None, store_dir=None):
+    """Analyze one capture and return its per-protocol summary and raw series (runs in a worker)"""
+    # analyze_delays prints debug output for every capture, keep workers quiet
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Eviction is left to the web workers, which know the configured size cap
+        store = CaptureStore(store_dir, max_bytes=0) if store_dir else None
+        pa = PacketAnalyzer(pcap_file, reader=reader, display_filter=display_filter, store=store)
+        stats = pa.basic_statistics()
+        pa.analyze_delays()
+        loss = pa.calculate_packet_loss()
+
+    protocols = {}
+    series = {}
+    for proto, latencies in pa.latencies.items():
+        latency = np.asarray(latencies, dtype=np.float32)
+        jitter = np.asarray(pa.jitter_values.get(proto, []), dtype=np.float32)
+        protocols[proto] = {
+            "latency": _series_stats(latency),
+            "jitter": _series_stats(jitter),
+            "loss": loss["per_protocol"].get(proto),
+        }
+        series[proto] = {"latency": latency, "jitter": jitter}
+
+    return {
+        "pcap_file": pcap_file,
+        "name": os.path.basename(pcap_file),
+        "total_packets": stats["total_packets"],
+        "capture_duration": stats["capture_duration"],
+        "packet_loss": loss["overall"],
+        "protocols": protocols,
+        "series": series,
+    }
+
+
+def density_on_grid(values, grid):
+    """Gaussian KDE (Scott's bandwidth) evaluated on an evenly spaced grid
+
+    Values are binned onto the grid and convolved with the kernel, so the cost
+    is linear in the number of values instead of values x grid points.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) < 2:
+        return np.zeros(len(grid))
+    step = grid[1] - grid[0]
+    bandwidth = max(float(np.std(values, ddof=1)) * len(values) ** (-1 / 5), step)
+    counts, _ = np.histogram(values, bins=len(grid), range=(grid[0] - step / 2, grid[-1] + step / 2))
+    half_width = int(np.ceil(4 * bandwidth / step))
+    offsets = np.arange(-half_width, half_width + 1) * step
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2)
+    density = np.convolve(counts, kernel, mode="full")[half_width:half_width + len(grid)]
+    return density / (len(values) * bandwidth * np.sqrt(2 * np.pi))
+
+
+def _shared_distributions(summaries, metric, grid_points):
+    """Overlay every capture's per-protocol KDE for metric on one grid"""
+    all_values = [s["series"][proto][metric] for s in summaries for proto in s["series"]]
+    all_values = [v for v in all_values if len(v)]
+    if not all_values:
+        return {"x": [], "captures": [{} for _ in summaries]}
+    upper = float(np.percentile(np.concatenate(all_values), GRID_PERCENTILE))
+    grid = np.linspace(0, upper if upper > 0 else 1.0, grid_points)
+
+    # One entry per capture, in the order the captures were given (names may repeat)
+    captures = [
+        {
+            proto: density_on_grid(data[metric], grid).tolist()
+            for proto, data in s["series"].items()
+            if len(data[metric]) > 1
+        }
+        for s in summaries
+    ]
+    return {"x": grid.tolist(), "captures": captures}
+
+
+def compare_captures(pcap_files, grid_points=200, reader="scapy", display_filter=None,
+                     store_dir=None):
+    """Analyze captures concurrently and line up their summaries and distributions
+
+    Each capture is analyzed in its own worker process, so the total time is
+    close to the slowest capture rather than the sum. With store_dir the
+    workers attach decoded captures from that CaptureStore.
+    """
+    pool = _get_pool()
+    n = len(pcap_files)
+    summaries = list(pool.map(summarize_capture, pcap_files, [reader] * n, [display_filter] * n, [store_dir] * n))
+
+    protocols = []
+    for s in summaries:
+        protocols.extend(p for p in s["protocols"] if p not in protocols)
+
+    # protocol -> one entry per capture, in the order the captures were given
+    aligned = {
+        proto: [s["protocols"].get(proto) for s in summaries]
+        for proto in protocols
+    }
+
+    return {
+        "captures": [
+            {k: v for k, v in s.items() if k not in ("series", "protocols")}
+            for s in summaries
+        ],
+        "protocols": protocols,
+        "summary": aligned,
+        "distributions": {
+            "latency": _shared_distributions(summaries, "latency", grid_points),
+            "jitter": _shared_distributions(summaries, "jitter", grid_points),
+        },
+    }
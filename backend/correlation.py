@@ -0,0 +1,117 @@
+import numpy as np
+from delay_events import groups_in_order
+
+# Size bucket edges in bytes, the last bucket holds everything above 1518 (jumbo/reassembled)
+SIZE_EDGES = (0, 64, 128, 256, 512, 1024, 1518)
+
+TIME_BUCKET = 10.0  # seconds
+
+PERCENTILES = (50, 90, 99)
+
+
+def _finite(value):
+    """Plain float, or None where the statistic is undefined (JSON has no NaN)"""
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+def rank(values):
+    """Ranks starting at 1, ties share their average rank"""
+    values = np.asarray(values)
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    # Average of the positions a run of ties occupies in sorted order
+    ends = np.cumsum(counts)
+    average = ends - (counts - 1) / 2
+    return average[inverse]
+
+
+def pearson(x, y):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if len(x) < 2:
+        return None
+    dx = x - x.mean()
+    dy = y - y.mean()
+    denominator = np.sqrt(np.dot(dx, dx) * np.dot(dy, dy))
+    if denominator == 0:
+        return None
+    return _finite(np.dot(dx, dy) / denominator)
+
+
+def spearman(x, y):
+    if len(x) < 2:
+        return None
+    return pearson(rank(x), rank(y))
+
+
+def _bucket_table(buckets, values, n_buckets):
+    """count/mean/percentiles of values per bucket index, as column lists"""
+    order = np.argsort(buckets, kind="stable")
+    buckets = buckets[order]
+    values = values[order]
+    counts = np.bincount(buckets, minlength=n_buckets)
+    table = {"count": counts.tolist(), "mean": []}
+    for p in PERCENTILES:
+        table[f"p{p}"] = []
+    for chunk in np.split(values, np.cumsum(counts)[:-1]):
+        table["mean"].append(_finite(chunk.mean()) if len(chunk) else None)
+        stats = np.percentile(chunk, PERCENTILES) if len(chunk) else [None] * len(PERCENTILES)
+        for p, v in zip(PERCENTILES, stats):
+            table[f"p{p}"].append(None if v is None else float(v))
+    return table
+
+
+def size_buckets(sizes, delays, edges=SIZE_EDGES):
+    """Delay distribution conditional on packet size, one row per size bucket"""
+    edges = np.asarray(edges)
+    buckets = np.clip(np.searchsorted(edges, sizes, side="right") - 1, 0, len(edges) - 1)
+    table = _bucket_table(buckets, np.asarray(delays, dtype=np.float64), len(edges))
+    table["min_size"] = edges.tolist()
+    table["max_size"] = edges[1:].tolist() + [None]
+    return table
+
+
+def time_buckets(times, delays, start, width=TIME_BUCKET):
+    """Delay trend over the capture, one row per time bucket of width seconds"""
+    times = np.asarray(times, dtype=np.float64)
+    delays = np.asarray(delays, dtype=np.float64)
+    if len(times) == 0:
+        return {"start": [], "count": [], "mean": [], **{f"p{p}": [] for p in PERCENTILES}}
+    buckets = ((times - start) // width).astype(np.int64)
+    n_buckets = int(buckets.max()) + 1
+    table = _bucket_table(buckets, delays, n_buckets)
+    table["start"] = (np.arange(n_buckets) * width).tolist()
+    return table
+
+
+def trend_slope(times, delays):
+    """Least-squares delay change per second over the capture"""
+    times = np.asarray(times, dtype=np.float64)
+    if len(times) < 2 or np.ptp(times) == 0:
+        return None
+    return _finite(np.polyfit(times - times[0], delays, 1)[0])
+
+
+def delay_correlations(groups, labels, sizes, delays, times, size_edges=SIZE_EDGES, time_bucket=TIME_BUCKET):
+    """Per-group size/delay correlation, size-conditional percentiles and time trend
+
+    groups holds a group code per packet and labels maps codes to names. All
+    inputs are parallel arrays, each group is summarized from array slices so the
+    output is a few small tables per protocol regardless of capture size.
+    """
+    sizes = np.asarray(sizes)
+    delays = np.asarray(delays, dtype=np.float64)
+    times = np.asarray(times, dtype=np.float64)
+    start = float(times.min()) if len(times) else 0.0
+    results = {}
+    for code, members in groups_in_order(groups):
+        s, d, t = sizes[members], delays[members], times[members]
+        results[labels[code]] = {
+            "count": int(len(members)),
+            "pearson": pearson(s, d),
+            "spearman": spearman(s, d),
+            "trend_per_second": trend_slope(t, d),
+            "size_buckets": size_buckets(s, d, size_edges),
+            "time_buckets": time_buckets(t, d, start, time_bucket),
+        }
+    return results
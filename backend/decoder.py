@@ -0,0 +1,259 @@
+import socket
+import struct
+from packet_table import L3_OTHER, L3_IPV4, L3_ARP, L3_IPV6, L3_LLC, L4_NONE, L4_TCP, L4_UDP
+
+# pcapng / pcap link types (https://www.tcpdump.org/linktypes.html)
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW_BSD = 12
+LINKTYPE_RAW_OPENBSD = 14
+LINKTYPE_RAW = 101
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_ARP = 0x0806
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = 0x8100
+ETHERTYPE_QINQ = 0x88A8
+ETHERTYPE_QINQ_OLD = 0x9100
+VLAN_ETHERTYPES = frozenset((ETHERTYPE_VLAN, ETHERTYPE_QINQ, ETHERTYPE_QINQ_OLD))
+# Linux cooked capture protocol for 802.2 LLC frames, also standing in for 802.3 length fields
+ETHERTYPE_LLC = 0x0004
+
+IP_VERSIONS = {4: ETHERTYPE_IPV4, 6: ETHERTYPE_IPV6}
+# BSD loopback address families: AF_INET, then AF_INET6 on NetBSD/OpenBSD, FreeBSD and macOS
+LOOPBACK_FAMILIES = {2: ETHERTYPE_IPV4, 24: ETHERTYPE_IPV6, 28: ETHERTYPE_IPV6, 30: ETHERTYPE_IPV6}
+
+# IPv6 extension headers sized (hdr_ext_len + 1) * 8 bytes: hop-by-hop,
+# routing, destination options, mobility, HIP, shim6
+IPV6_EXTENSION_HEADERS = frozenset((0, 43, 60, 135, 139, 140))
+IPV6_FRAGMENT_HEADER = 44
+
+# Decoded row layout:
+# (l3, l4, ip_proto, src, dst, sport, dport, seq, ack, tcp_flags, window, payload_len)
+EMPTY_ROW = (L3_OTHER, L4_NONE, -1, "", "", -1, -1, 0, 0, 0, 0, 0)
+LLC_ROW = (L3_LLC, L4_NONE, -1, "", "", -1, -1, 0, 0, 0, 0, 0)
+
+_u16 = struct.Struct("!H").unpack_from
+_u32_le = struct.Struct("<I").unpack_from
+_u32_be = struct.Struct("!I").unpack_from
+_tcp = struct.Struct("!HHIIBBH").unpack_from
+_udp = struct.Struct("!HHH").unpack_from
+
+
+def decode_frame(linktype, data):
+    """Decode the header fields PacketTable needs from a raw frame
+
+    network_layer() finds the network header through the link type and
+    ethertype tables, so VLAN tags, Linux cooked headers and raw IP all end
+    up in the same IPv4/IPv6 decoders. Follows scapy's dissection rules (no
+    transport header for non-first fragments, payload length counting any
+    trailing Ethernet padding like len(pkt[TCP].payload) does) so tables
+    built from raw frames match PacketTable.from_packets.
+    """
+    found = network_layer(linktype, data)
+    if found is None:
+        return EMPTY_ROW
+    ethertype, off = found
+    handler = NETWORK_HANDLERS.get(ethertype)
+    if handler is None:
+        return EMPTY_ROW
+    return handler(data, off)
+
+
+def network_layer(linktype, data):
+    """(ethertype, offset) of the network header of a raw frame, None when there's none to find
+
+    VLAN tags are skipped, 802.3 frames come back as ETHERTYPE_LLC.
+    """
+    locate = LINKTYPE_HANDLERS.get(linktype)
+    if locate is None:
+        return None
+    found = locate(data)
+    if found is None or found[0] is None:
+        return None
+    ethertype, off = found
+    while ethertype in VLAN_ETHERTYPES:
+        # 802.1Q / 802.1ad tag: 2 bytes TCI, then the encapsulated ethertype (another tag for QinQ)
+        if len(data) < off + 4:
+            return None
+        ethertype = _u16(data, off + 2)[0]
+        off += 4
+    if ethertype <= 1500:
+        # 802.3 length field, payload is LLC
+        ethertype = ETHERTYPE_LLC
+    return ethertype, off
+
+
+def tcp_payload(linktype, data):
+    """TCP payload of a raw frame without link-layer padding, None for anything but a TCP segment"""
+    found = network_layer(linktype, data)
+    if found is None:
+        return None
+    ethertype, off = found
+    if ethertype == ETHERTYPE_IPV4:
+        if len(data) < off + 20 or data[off + 9] != 6 or _u16(data, off + 6)[0] & 0x1FFF:
+            return None
+        start = off + (data[off] & 0x0F) * 4
+        # A zero total length comes from segmentation offload, the frame then ends the packet
+        end = off + (_u16(data, off + 2)[0] or len(data))
+    elif ethertype == ETHERTYPE_IPV6:
+        if len(data) < off + 40:
+            return None
+        nh, start, transport = _ipv6_upper_layer(data, off)
+        if not transport or nh != 6:
+            return None
+        end = off + 40 + (_u16(data, off + 4)[0] or len(data))
+    else:
+        return None
+    end = min(end, len(data))
+    if end - start < 20:
+        return None
+    return data[start + (data[start + 12] >> 4) * 4:end]
+
+
+def _locate_ethernet(data):
+    if len(data) < 14:
+        return None
+    return _u16(data, 12)[0], 14
+
+
+def _locate_linux_sll(data):
+    # packet type, ARPHRD type, address length, 8 address bytes, protocol
+    if len(data) < 16:
+        return None
+    return _u16(data, 14)[0], 16
+
+
+def _locate_linux_sll2(data):
+    # protocol, reserved, interface index, ARPHRD type, packet type, address length, 8 address bytes
+    if len(data) < 20:
+        return None
+    return _u16(data, 0)[0], 20
+
+
+def _locate_raw(data):
+    # No link header, the IP version nibble tells IPv4 from IPv6
+    if not len(data):
+        return None
+    return IP_VERSIONS.get(data[0] >> 4), 0
+
+
+def _locate_null(data):
+    # Address family in the capturing host's byte order
+    if len(data) < 4:
+        return None
+    family = _u32_le(data, 0)[0]
+    if family > 0xFFFF:
+        family = _u32_be(data, 0)[0]
+    return LOOPBACK_FAMILIES.get(family), 4
+
+
+def _locate_loop(data):
+    # Address family always in network byte order
+    if len(data) < 4:
+        return None
+    return LOOPBACK_FAMILIES.get(_u32_be(data, 0)[0]), 4
+
+
+def _decode_ipv4(data, off):
+    if len(data) < off + 20:
+        return EMPTY_ROW
+    ihl = (data[off] & 0x0F) * 4
+    frag = _u16(data, off + 6)[0] & 0x1FFF
+    proto = data[off + 9]
+    src = socket.inet_ntoa(data[off + 12:off + 16])
+    dst = socket.inet_ntoa(data[off + 16:off + 20])
+    if frag:
+        return (L3_IPV4, L4_NONE, proto, src, dst, -1, -1, 0, 0, 0, 0, 0)
+    return _decode_transport(data, off + ihl, L3_IPV4, proto, src, dst)
+
+
+def _decode_ipv6(data, off):
+    if len(data) < off + 40:
+        return EMPTY_ROW
+    src = socket.inet_ntop(socket.AF_INET6, data[off + 8:off + 24])
+    dst = socket.inet_ntop(socket.AF_INET6, data[off + 24:off + 40])
+    nh, start, transport = _ipv6_upper_layer(data, off)
+    if not transport:
+        return (L3_IPV6, L4_NONE, nh, src, dst, -1, -1, 0, 0, 0, 0, 0)
+    return _decode_transport(data, start, L3_IPV6, nh, src, dst)
+
+
+def _ipv6_upper_layer(data, off):
+    """(upper-layer protocol, its offset, whether its header is there) past the extension headers
+
+    The header isn't there in non-first fragments or when the chain runs off the frame.
+    """
+    nh = data[off + 6]
+    start = off + 40
+    while nh in IPV6_EXTENSION_HEADERS or nh == IPV6_FRAGMENT_HEADER:
+        if len(data) < start + 8:
+            return nh, start, False
+        if nh == IPV6_FRAGMENT_HEADER:
+            nh = data[start]
+            if _u16(data, start + 2)[0] >> 3:
+                return nh, start + 8, False
+            start += 8
+        else:
+            nh, start = data[start], start + (data[start + 1] + 1) * 8
+    return nh, start, True
+
+
+def _decode_transport(data, start, l3, proto, src, dst):
+    avail = len(data) - start
+    if proto == 6 and avail >= 20:
+        sport, dport, seq, ack, offset_byte, flags, window = _tcp(data, start)
+        header_len = (offset_byte >> 4) * 4
+        flags |= (offset_byte & 0x01) << 8
+        return (l3, L4_TCP, proto, src, dst, sport, dport, seq, ack, flags, window, max(0, avail - header_len))
+    if proto == 17 and avail >= 8:
+        sport, dport, _ = _udp(data, start)
+        return (l3, L4_UDP, proto, src, dst, sport, dport, 0, 0, 0, 0, avail - 8)
+    return (l3, L4_NONE, proto, src, dst, -1, -1, 0, 0, 0, 0, 0)
+
+
+def _decode_arp(data, off):
+    if len(data) < off + 8:
+        return (L3_ARP, L4_NONE, -1, "", "", -1, -1, 0, 0, 0, 0, 0)
+    hwlen = data[off + 4]
+    plen = data[off + 5]
+    psrc_at = off + 8 + hwlen
+    pdst_at = psrc_at + plen + hwlen
+    if plen == 4 and len(data) >= pdst_at + 4:
+        src = socket.inet_ntoa(data[psrc_at:psrc_at + 4])
+        dst = socket.inet_ntoa(data[pdst_at:pdst_at + 4])
+    else:
+        src = dst = ""
+    return (L3_ARP, L4_NONE, -1, src, dst, -1, -1, 0, 0, 0, 0, 0)
+
+
+def _decode_llc(data, off):
+    return LLC_ROW
+
+
+# Link type -> locate(data) returning (ethertype, offset) of what follows the link header
+LINKTYPE_HANDLERS = {
+    LINKTYPE_NULL: _locate_null,
+    LINKTYPE_ETHERNET: _locate_ethernet,
+    LINKTYPE_RAW_BSD: _locate_raw,
+    LINKTYPE_RAW_OPENBSD: _locate_raw,
+    LINKTYPE_RAW: _locate_raw,
+    LINKTYPE_LOOP: _locate_loop,
+    LINKTYPE_LINUX_SLL: _locate_linux_sll,
+    LINKTYPE_IPV4: lambda data: (ETHERTYPE_IPV4, 0),
+    LINKTYPE_IPV6: lambda data: (ETHERTYPE_IPV6, 0),
+    LINKTYPE_LINUX_SLL2: _locate_linux_sll2,
+}
+
+# Ethertype -> decoder(data, offset of the network header)
+NETWORK_HANDLERS = {
+    ETHERTYPE_IPV4: _decode_ipv4,
+    ETHERTYPE_ARP: _decode_arp,
+    ETHERTYPE_IPV6: _decode_ipv6,
+    ETHERTYPE_LLC: _decode_llc,
+}
@@ -0,0 +1,68 @@
+import numpy as np
+
+# Defaults match the thresholds analyze_delay_types has always used
+QUEUE_THRESHOLD = 0.1     # seconds, a gap longer than this counts as queuing
+CONGESTION_WINDOW = 3     # queuing delays looked at together
+CONGESTION_SUM = 0.5      # seconds the window has to add up to
+JITTER_THRESHOLD = 50     # ms
+
+
+def groups_in_order(groups):
+    """Split positions by group value, returns [(group, positions)] in order of first appearance"""
+    groups = np.asarray(groups)
+    if len(groups) == 0:
+        return []
+    order = np.argsort(groups, kind="stable")
+    ordered = groups[order]
+    starts = np.flatnonzero(ordered[1:] != ordered[:-1]) + 1
+    members = np.split(order, starts)
+    members.sort(key=lambda m: m[0])
+    return [(groups[m[0]], m) for m in members]
+
+
+def window_sums(values, window):
+    """Sum of every run of window consecutive values
+
+    Terms are added left to right, like sum() over a list slice, so results are
+    bit-identical to the per-packet loop this replaced.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values) - window + 1
+    if n <= 0:
+        return np.zeros(0)
+    sums = values[:n].copy()
+    for k in range(1, window):
+        sums += values[k:k + n]
+    return sums
+
+
+def detect_congestion(groups, delays, queue_threshold=QUEUE_THRESHOLD,
+                      window=CONGESTION_WINDOW, sum_limit=CONGESTION_SUM):
+    """Congestion events as (positions, average delays)
+
+    Delays above queue_threshold are queuing delays. At every position the
+    last `window` queuing delays of its group seen so far are checked and an
+    event is raised when they add up to more than sum_limit.
+    """
+    delays = np.asarray(delays, dtype=np.float64)
+    queued = delays > queue_threshold
+    event = np.zeros(len(delays), dtype=bool)
+    average = np.zeros(len(delays))
+    for _, members in groups_in_order(groups):
+        in_queue = queued[members]
+        seen = np.cumsum(in_queue)
+        sums = window_sums(delays[members][in_queue], window)
+        ready = seen >= window
+        # Window ending at the latest queuing delay seen at each ready position
+        totals = sums[seen[ready] - window]
+        event[members[ready]] = totals > sum_limit
+        average[members[ready]] = totals / window
+    positions = np.flatnonzero(event)
+    return positions, average[positions]
+
+
+def detect_jitter(jitter, threshold=JITTER_THRESHOLD):
+    """High-jitter events as (positions, jitter values), NaN never counts"""
+    jitter = np.asarray(jitter, dtype=np.float64)
+    positions = np.flatnonzero(jitter > threshold)
+    return positions, jitter[positions]
@@ -0,0 +1,64 @@
+from bisect import bisect_right
+from collections import Counter
+import numpy as np
+from rollups import sketch_bin, sketch_values
+
+# Inter-arrival histogram edges in seconds, the last bucket holds everything above 60s
+INTERARRIVAL_EDGES = (0.0, 0.001, 0.01, 0.1, 1.0, 10.0, 60.0)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class DeviceAggregate:
+    """Running transmission statistics of one device, updated packet by packet
+
+    Memory is fixed per device: counters per packet type, byte totals, an
+    inter-arrival histogram over INTERARRIVAL_EDGES and a log-bin sketch of
+    packet sizes (the same 1% relative-error bins as the rollup latency
+    sketch), instead of a record per packet.
+    """
+
+    __slots__ = ("types", "bytes", "first_time", "last_time", "interarrival", "size_sketch")
+
+    def __init__(self):
+        self.types = Counter()
+        self.bytes = 0
+        self.first_time = None
+        self.last_time = None
+        self.interarrival = [0] * len(INTERARRIVAL_EDGES)
+        self.size_sketch = Counter()
+
+    def add(self, time, size, kind):
+        self.types[kind] += 1
+        self.bytes += size
+        if self.last_time is not None:
+            gap = max(0.0, time - self.last_time)
+            self.interarrival[bisect_right(INTERARRIVAL_EDGES, gap) - 1] += 1
+        else:
+            self.first_time = time
+        self.last_time = time
+        self.size_sketch[sketch_bin(size)] += 1
+
+    def size_quantiles(self, quantiles=QUANTILES):
+        """Packet size quantiles from the sketch, None without packets"""
+        if not self.size_sketch:
+            return {f"p{round(q * 100)}": None for q in quantiles}
+        bins = np.array(sorted(self.size_sketch))
+        cumulative = np.cumsum([self.size_sketch[b] for b in bins.tolist()])
+        at = np.searchsorted(cumulative, np.asarray(quantiles) * cumulative[-1], side="left")
+        values = sketch_values(bins[np.minimum(at, len(bins) - 1)])
+        return {f"p{round(q * 100)}": float(v) for q, v in zip(quantiles, values)}
+
+    def summary(self):
+        small = self.types["small"]
+        bundled = self.types["bundle"]
+        return {
+            "small_packets": small,
+            "bundled_packets": bundled,
+            "total": small + bundled,
+            "bytes": self.bytes,
+            "first_seen": self.first_time,
+            "last_seen": self.last_time,
+            "interarrival": {"edges": list(INTERARRIVAL_EDGES), "counts": list(self.interarrival)},
+            "bundle_size": self.size_quantiles(),
+        }
@@ -0,0 +1,388 @@
+import ipaddress
+import re
+from typing import NamedTuple
+import numpy as np
+from packet_table import (PROTOCOL_CODES, L3_IPV4, L3_ARP, L3_IPV6, L4_TCP, L4_UDP,
+                          TCP_FLAG_FIN, TCP_FLAG_SYN, TCP_FLAG_RST, TCP_FLAG_PSH, TCP_FLAG_ACK, TCP_FLAG_URG,
+                          classify_protocols)
+
+
+class FilterError(ValueError):
+    pass
+
+
+# AST nodes
+class Compare(NamedTuple):
+    field: str
+    op: str
+    value: str
+
+
+class Member(NamedTuple):
+    field: str
+    values: tuple
+
+
+class Exists(NamedTuple):
+    name: str
+
+
+class Not(NamedTuple):
+    operand: tuple
+
+
+class And(NamedTuple):
+    left: tuple
+    right: tuple
+
+
+class Or(NamedTuple):
+    left: tuple
+    right: tuple
+
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<string>"(?:[^"\\]|\\.)*")
+      | (?P<op>==|!=|>=|<=|>|<|&&|\|\||!|\(|\)|\{|\}|,)
+      | (?P<word>[A-Za-z0-9_.:/\-]+)
+    )""", re.VERBOSE)
+
+_WORD_OPS = {"eq": "==", "ne": "!=", "gt": ">", "lt": "<", "ge": ">=", "le": "<=",
+             "and": "&&", "or": "||", "not": "!"}
+
+COMPARISONS = ("==", "!=", ">", "<", ">=", "<=")
+
+# Escapes inside quoted values: \" and \\, any other backslash is kept as is
+_ESCAPE = re.compile(r'\\([\\"])')
+
+
+def tokenize(text):
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = _TOKEN.match(text, pos)
+        if not m or m.end() == pos:
+            raise FilterError(f"Unexpected character {text[pos:].lstrip()[:1]!r} at position {pos}")
+        pos = m.end()
+        if m.group("string") is not None:
+            tokens.append(("value", _ESCAPE.sub(r"\1", m.group("string")[1:-1])))
+        elif m.group("op") is not None:
+            tokens.append(("op", m.group("op")))
+        else:
+            word = m.group("word")
+            if word.lower() in _WORD_OPS:
+                tokens.append(("op", _WORD_OPS[word.lower()]))
+            elif word.lower() == "in":
+                tokens.append(("op", "in"))
+            else:
+                tokens.append(("word", word))
+    return tokens
+
+
+class _Parser:
+    """Recursive descent: or -> and -> not -> primary, the usual precedence"""
+
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, value=None):
+        token = self.peek()
+        if token[0] is None or (kind and token[0] != kind) or (value and token[1] != value):
+            expected = value or kind or "more input"
+            found = token[1] if token[0] else "end of filter"
+            raise FilterError(f"Expected {expected} but found {found!r}")
+        self.pos += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise FilterError("Empty filter")
+        node = self.parse_or()
+        if self.pos != len(self.tokens):
+            raise FilterError(f"Unexpected {self.peek()[1]!r}")
+        return node
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self.peek() == ("op", "||"):
+            self.take()
+            node = Or(node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_not()
+        while self.peek() == ("op", "&&"):
+            self.take()
+            node = And(node, self.parse_not())
+        return node
+
+    def parse_not(self):
+        if self.peek() == ("op", "!"):
+            self.take()
+            return Not(self.parse_not())
+        return self.parse_primary()
+
+    def parse_primary(self):
+        if self.peek() == ("op", "("):
+            self.take()
+            node = self.parse_or()
+            self.take("op", ")")
+            return node
+        name = self.take("word")[1].lower()
+        kind, op = self.peek()
+        if kind == "op" and op in COMPARISONS:
+            self.take()
+            return Compare(name, op, self.take_value())
+        if kind == "op" and op == "in":
+            self.take()
+            self.take("op", "{")
+            values = []
+            while self.peek() != ("op", "}"):
+                if self.peek() == ("op", ","):
+                    self.take()
+                    continue
+                values.append(self.take_value())
+            self.take("op", "}")
+            if not values:
+                raise FilterError(f"Empty set for {name}")
+            return Member(name, tuple(values))
+        return Exists(name)
+
+    def take_value(self):
+        kind, value = self.peek()
+        if kind not in ("word", "value"):
+            raise FilterError(f"Expected a value but found {value if kind else 'end of filter'!r}")
+        self.pos += 1
+        return value
+
+
+def parse(text):
+    """Parse a display filter into its AST"""
+    return _Parser(text).parse()
+
+
+# Field kinds decide how a value literal is read
+INT, FLOAT, ADDRESS, BOOL = "int", "float", "address", "bool"
+
+
+def _layer(name):
+    return {
+        "frame": lambda t: np.ones(len(t), dtype=bool),
+        "ip": lambda t: t.l3 == L3_IPV4,
+        "ipv6": lambda t: t.l3 == L3_IPV6,
+        "arp": lambda t: t.l3 == L3_ARP,
+        "tcp": lambda t: t.l4 == L4_TCP,
+        "udp": lambda t: t.l4 == L4_UDP,
+    }[name]
+
+
+def _flag(bit):
+    return lambda t: (t.tcp_flags & bit) != 0
+
+
+# field -> (kind, layer, [column getters]); fields with several getters (tcp.port,
+# ip.addr) match when any of them does, like Wireshark
+FIELDS = {
+    "frame.len": (INT, "frame", [lambda t: t.length]),
+    "frame.number": (INT, "frame", [lambda t: np.arange(1, len(t) + 1)]),
+    "frame.time_epoch": (FLOAT, "frame", [lambda t: t.time]),
+    "frame.time_relative": (FLOAT, "frame", [lambda t: t.time - (t.time.min() if len(t) else 0)]),
+    "ip.src": (ADDRESS, "ip", [lambda t: t.src]),
+    "ip.dst": (ADDRESS, "ip", [lambda t: t.dst]),
+    "ip.addr": (ADDRESS, "ip", [lambda t: t.src, lambda t: t.dst]),
+    "ip.proto": (INT, "ip", [lambda t: t.ip_proto]),
+    "ipv6.src": (ADDRESS, "ipv6", [lambda t: t.src]),
+    "ipv6.dst": (ADDRESS, "ipv6", [lambda t: t.dst]),
+    "ipv6.addr": (ADDRESS, "ipv6", [lambda t: t.src, lambda t: t.dst]),
+    "ipv6.nxt": (INT, "ipv6", [lambda t: t.ip_proto]),
+    "arp.src.proto_ipv4": (ADDRESS, "arp", [lambda t: t.src]),
+    "arp.dst.proto_ipv4": (ADDRESS, "arp", [lambda t: t.dst]),
+    "tcp.srcport": (INT, "tcp", [lambda t: t.sport]),
+    "tcp.dstport": (INT, "tcp", [lambda t: t.dport]),
+    "tcp.port": (INT, "tcp", [lambda t: t.sport, lambda t: t.dport]),
+    "tcp.seq": (INT, "tcp", [lambda t: t.seq]),
+    "tcp.ack": (INT, "tcp", [lambda t: t.ack]),
+    "tcp.len": (INT, "tcp", [lambda t: t.payload_len]),
+    "tcp.window_size_value": (INT, "tcp", [lambda t: t.window]),
+    "tcp.flags": (INT, "tcp", [lambda t: t.tcp_flags]),
+    "tcp.flags.fin": (BOOL, "tcp", [_flag(TCP_FLAG_FIN)]),
+    "tcp.flags.syn": (BOOL, "tcp", [_flag(TCP_FLAG_SYN)]),
+    "tcp.flags.reset": (BOOL, "tcp", [_flag(TCP_FLAG_RST)]),
+    "tcp.flags.push": (BOOL, "tcp", [_flag(TCP_FLAG_PSH)]),
+    "tcp.flags.ack": (BOOL, "tcp", [_flag(TCP_FLAG_ACK)]),
+    "tcp.flags.urg": (BOOL, "tcp", [_flag(TCP_FLAG_URG)]),
+    "udp.srcport": (INT, "udp", [lambda t: t.sport]),
+    "udp.dstport": (INT, "udp", [lambda t: t.dport]),
+    "udp.port": (INT, "udp", [lambda t: t.sport, lambda t: t.dport]),
+    "udp.length": (INT, "udp", [lambda t: t.payload_len + 8]),
+}
+
+# Application protocols usable as bare words (mqtt, dns, https, ...)
+PROTOCOL_WORDS = {name.lower(): code for name, code in PROTOCOL_CODES.items()}
+LAYER_WORDS = ("frame", "ip", "ipv6", "arp", "tcp", "udp")
+
+_OPERATORS = {
+    "==": np.equal, "!=": np.not_equal, ">": np.greater,
+    "<": np.less, ">=": np.greater_equal, "<=": np.less_equal,
+}
+
+
+def _field(name):
+    if name not in FIELDS:
+        raise FilterError(f"Unknown field {name!r}")
+    return FIELDS[name]
+
+
+def _number(kind, name, value):
+    try:
+        if kind == BOOL:
+            lowered = value.lower()
+            if lowered in ("1", "true"):
+                return 1
+            if lowered in ("0", "false"):
+                return 0
+            raise ValueError
+        if kind == INT:
+            return int(value, 0)
+        return float(value)
+    except ValueError:
+        raise FilterError(f"{value!r} is not a valid value for {name}")
+
+
+def _address(name, value):
+    try:
+        if "/" in value:
+            return ipaddress.ip_network(value, strict=False)
+        return ipaddress.ip_address(value)
+    except ValueError:
+        raise FilterError(f"{value!r} is not a valid address for {name}")
+
+
+class DisplayFilter:
+    """A compiled display filter, e.g. ``ip.src == 10.0.0.5 && tcp.port == 1883 && frame.len > 500``
+
+    The expression is parsed and checked once; mask(table) evaluates it over
+    whole PacketTable columns, so the cost is a handful of numpy operations per
+    clause rather than a Python call per packet. Address clauses are decided
+    once per distinct address and broadcast through the address codes.
+    """
+
+    def __init__(self, text):
+        self.text = text.strip()
+        self.ast = parse(self.text)
+        self._check(self.ast)
+
+    def __repr__(self):
+        return f"DisplayFilter({self.text!r})"
+
+    def __str__(self):
+        return self.text
+
+    def _check(self, node):
+        """Reject unknown fields and bad literals before any packet is touched"""
+        if isinstance(node, (And, Or)):
+            self._check(node.left)
+            self._check(node.right)
+        elif isinstance(node, Not):
+            self._check(node.operand)
+        elif isinstance(node, Exists):
+            if node.name not in FIELDS and node.name not in LAYER_WORDS and node.name not in PROTOCOL_WORDS:
+                raise FilterError(f"Unknown field or protocol {node.name!r}")
+        else:
+            kind = _field(node.field)[0]
+            values = [node.value] if isinstance(node, Compare) else node.values
+            for value in values:
+                if kind == ADDRESS:
+                    _address(node.field, value)
+                elif isinstance(node, Member) and kind == INT and ".." in value:
+                    for part in value.split("..", 1):
+                        _number(kind, node.field, part)
+                else:
+                    _number(kind, node.field, value)
+
+    def mask(self, table):
+        """Boolean mask of the packets in table matching the filter"""
+        return self._eval(self.ast, table, {})
+
+    def _eval(self, node, table, cache):
+        if isinstance(node, And):
+            return self._eval(node.left, table, cache) & self._eval(node.right, table, cache)
+        if isinstance(node, Or):
+            return self._eval(node.left, table, cache) | self._eval(node.right, table, cache)
+        if isinstance(node, Not):
+            return ~self._eval(node.operand, table, cache)
+        if isinstance(node, Exists):
+            if node.name in FIELDS:
+                return _layer(FIELDS[node.name][1])(table)
+            if node.name in LAYER_WORDS:
+                return _layer(node.name)(table)
+            if "protocols" not in cache:
+                cache["protocols"] = classify_protocols(table)
+            return cache["protocols"] == PROTOCOL_WORDS[node.name]
+        if isinstance(node, Member):
+            kind = FIELDS[node.field][0]
+            result = np.zeros(len(table), dtype=bool)
+            for value in node.values:
+                if kind == INT and ".." in value:
+                    low, high = value.split("..", 1)
+                    result |= (self._compare(node.field, ">=", low, table, cache)
+                               & self._compare(node.field, "<=", high, table, cache))
+                else:
+                    result |= self._compare(node.field, "==", value, table, cache)
+            return result
+        return self._compare(node.field, node.op, node.value, table, cache)
+
+    def _compare(self, name, op, value, table, cache):
+        kind, layer, getters = FIELDS[name]
+        present = _layer(layer)(table)
+        if op == "!=":
+            # Wireshark semantics: every occurrence differs, absent fields never match
+            return present & ~self._compare(name, "==", value, table, cache)
+        result = np.zeros(len(table), dtype=bool)
+        for get in getters:
+            if kind == ADDRESS:
+                result |= self._address_match(op, _address(name, value), table, cache)[get(table)]
+            else:
+                result |= _OPERATORS[op](get(table), _number(kind, name, value))
+        return present & result
+
+    def _address_match(self, op, target, table, cache):
+        """Per address code: does the address satisfy op against target"""
+        if "addresses" not in cache:
+            parsed = []
+            for addr in table.addresses.tolist():
+                try:
+                    parsed.append(ipaddress.ip_address(addr))
+                except ValueError:
+                    parsed.append(None)
+            cache["addresses"] = parsed
+        matches = np.zeros(len(table.addresses), dtype=bool)
+        for code, addr in enumerate(cache["addresses"]):
+            if addr is None or addr.version != target.version:
+                continue
+            if isinstance(target, (ipaddress.IPv4Network, ipaddress.IPv6Network)):
+                if op == "==":
+                    matches[code] = addr in target
+                elif op in (">", ">="):
+                    matches[code] = addr >= target.network_address if op == ">=" else addr > target.broadcast_address
+                else:
+                    matches[code] = addr <= target.broadcast_address if op == "<=" else addr < target.network_address
+            else:
+                matches[code] = {"==": addr == target, ">": addr > target, "<": addr < target,
+                                 ">=": addr >= target, "<=": addr <= target}[op]
+        return matches
+
+
+def compile_filter(text):
+    """DisplayFilter for text, or None for an empty / missing filter"""
+    if text is None or isinstance(text, DisplayFilter):
+        return text
+    if not text.strip():
+        return None
+    return DisplayFilter(text)
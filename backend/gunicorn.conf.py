@@ -0,0 +1,27 @@
+import multiprocessing
+import os
+import tempfile
+
+# Production serving: gunicorn -c gunicorn.conf.py main:app
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# The first request for a large capture decodes it, which can take a while
+timeout = 300
+
+
+def private_dir():
+    """Directory only this user can write to: under XDG_RUNTIME_DIR, else a fresh one in tmp"""
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        path = os.path.join(runtime, "iot-analyzer")
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        return path
+    return tempfile.mkdtemp(prefix="iot-analyzer-")
+
+
+if "CAPTURE_STORE_DIR" not in os.environ or "ANALYTICS_DB" not in os.environ:
+    state = private_dir()
+    # Workers attach decoded captures from this store instead of each decoding its own copy
+    os.environ.setdefault("CAPTURE_STORE_DIR", os.path.join(state, "capture-store"))
+    # ...and ingest analyzed captures into one analytics database for cross-capture queries
+    os.environ.setdefault("ANALYTICS_DB", os.path.join(state, "analytics.sqlite"))
@@ -0,0 +1,192 @@
+import math
+import numpy as np
+
+TOP_K = 10
+# Space-Saving counters kept per key, each count is then within total / capacity of the truth
+SPACE_SAVING_CAPACITY = 1024
+# Count-Min estimates exceed the true count by at most EPSILON * total with probability 1 - DELTA
+COUNT_MIN_EPSILON = 0.001
+COUNT_MIN_DELTA = 0.01
+# Rows fed to the sketches at a time, bounding the working memory of a pass
+CHUNK_ROWS = 1 << 16
+
+
+def top_k(counts, k=TOP_K):
+    """Indices of the k largest counts, largest first, ties in index order
+
+    Same order as a stable sort by count descending, but only the k winners
+    get sorted: np.partition finds the k-th largest count in linear time.
+    """
+    counts = np.asarray(counts)
+    n = len(counts)
+    if k <= 0 or n == 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < n:
+        threshold = np.partition(counts, n - k)[n - k]
+        above = np.flatnonzero(counts > threshold)
+        ties = np.flatnonzero(counts == threshold)[:k - len(above)]
+        candidates = np.sort(np.concatenate([above, ties]))
+    else:
+        candidates = np.arange(n)
+    return candidates[np.argsort(-counts[candidates], kind="stable")]
+
+
+class SpaceSaving:
+    """Space-Saving top-k summary in at most capacity counters
+
+    Every count is an overestimate by at most its error, and errors never
+    exceed total / capacity, so any key seen more often than that is in the
+    summary. Updates come in weighted batches (distinct keys of a chunk and
+    their counts); a key not in a full summary takes over the smallest
+    counter, inheriting its count as error, as in the one-at-a-time
+    algorithm.
+    """
+
+    def __init__(self, capacity=SPACE_SAVING_CAPACITY):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.errors = np.zeros(0, dtype=np.int64)
+        self.total = 0
+
+    def update(self, keys, counts=None):
+        """Add keys (integers), weighted by counts, one occurrence each by default"""
+        keys = np.asarray(keys, dtype=np.int64)
+        if counts is None:
+            keys, counts = np.unique(keys, return_counts=True)
+        else:
+            keys, inverse = np.unique(keys, return_inverse=True)
+            counts = np.bincount(inverse, weights=counts, minlength=len(keys)).astype(np.int64)
+        if len(keys) == 0:
+            return self
+        self.total += int(counts.sum())
+        floor = int(self.counts.min()) if len(self.counts) >= self.capacity else 0
+        at = np.searchsorted(self.keys, keys)
+        known = at < len(self.keys)
+        known[known] = self.keys[at[known]] == keys[known]
+        counts_now = self.counts.copy()
+        np.add.at(counts_now, at[known], counts[known])
+        new = ~known
+        all_keys = np.concatenate([self.keys, keys[new]])
+        all_counts = np.concatenate([counts_now, counts[new] + floor])
+        all_errors = np.concatenate([self.errors, np.full(int(new.sum()), floor, dtype=np.int64)])
+        keep = top_k(all_counts, self.capacity)
+        order = np.argsort(all_keys[keep], kind="stable")
+        keep = keep[order]
+        self.keys, self.counts, self.errors = all_keys[keep], all_counts[keep], all_errors[keep]
+        return self
+
+    def top(self, k=TOP_K):
+        """[(key, count, error)] of the k largest counters, largest first"""
+        picked = top_k(self.counts, k)
+        return list(zip(self.keys[picked].tolist(), self.counts[picked].tolist(), self.errors[picked].tolist()))
+
+
+class CountMinSketch:
+    """Count-Min frequency sketch of integer keys
+
+    depth rows of width counters (width rounded up to a power of two), each
+    row indexed by its own multiply-add-shift hash. An estimate is the
+    smallest of a key's counters: never below the true count, and above it
+    by at most epsilon * total with probability 1 - delta.
+    """
+
+    def __init__(self, epsilon=COUNT_MIN_EPSILON, delta=COUNT_MIN_DELTA, seed=0):
+        if not 0 < epsilon < 1 or not 0 < delta < 1:
+            raise ValueError("epsilon and delta must be between 0 and 1")
+        self._bits = max(1, math.ceil(math.log2(math.e / epsilon)))
+        self.width = 1 << self._bits
+        self.depth = math.ceil(math.log(1 / delta))
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(0, 1 << 63, size=(self.depth, 1), dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 1 << 63, size=(self.depth, 1), dtype=np.uint64)
+        self.total = 0
+
+    def _columns(self, keys):
+        keys = np.asarray(keys, dtype=np.int64).astype(np.uint64)
+        with np.errstate(over="ignore"):
+            return ((self._a * keys + self._b) >> np.uint64(64 - self._bits)).astype(np.int64)
+
+    def update(self, keys, counts=None):
+        """Add keys (integers), weighted by counts, one occurrence each by default"""
+        keys = np.asarray(keys, dtype=np.int64)
+        if counts is None:
+            keys, counts = np.unique(keys, return_counts=True)
+        counts = np.asarray(counts, dtype=np.int64)
+        if len(keys) == 0:
+            return self
+        columns = self._columns(keys)
+        for row in range(self.depth):
+            np.add.at(self.table[row], columns[row], counts)
+        self.total += int(counts.sum())
+        return self
+
+    def estimate(self, keys):
+        """Estimated count of each key"""
+        columns = self._columns(keys)
+        return self.table[np.arange(self.depth)[:, None], columns].min(axis=0)
+
+
+def _first_appearance(values, keys, size):
+    """Index of the first occurrence of each key in values (keys all occur, below size)"""
+    slot = np.full(size, -1, dtype=np.int64)
+    slot[keys] = np.arange(len(keys))
+    slots = slot[values]
+    hits = np.flatnonzero(slots >= 0)
+    first = np.full(len(keys), len(values), dtype=np.int64)
+    np.minimum.at(first, slots[hits], hits)
+    return first
+
+
+def exact_top(values, k=TOP_K):
+    """[(value, count, 0)] of the k most frequent values (non-negative integers), ties in order of first appearance
+
+    Values are dense codes or ports, so np.bincount counts them in one pass
+    and top_k partitions the counts; nothing of size N is sorted. First
+    appearance is only looked up for the winners and the values tied with
+    the last of them.
+    """
+    values = np.asarray(values)
+    if len(values) == 0 or k <= 0:
+        return []
+    counts = np.bincount(values)
+    picked = top_k(counts, k)
+    picked = picked[counts[picked] > 0]
+    threshold = counts[picked[-1]]
+    above = picked[counts[picked] > threshold]
+    tied = np.flatnonzero(counts == threshold)
+    first = _first_appearance(values, np.concatenate([above, tied]), len(counts))
+    first_above, first_tied = first[:len(above)], first[len(above):]
+    chosen = top_k(-first_tied, k - len(above))
+    winners = np.concatenate([above, tied[chosen]])
+    order = np.lexsort((np.concatenate([first_above, first_tied[chosen]]), -counts[winners]))
+    winners = winners[order]
+    return [(value, count, 0) for value, count in zip(winners.tolist(), counts[winners].tolist())]
+
+
+def sketch_top(values, k=TOP_K, capacity=SPACE_SAVING_CAPACITY, mask=None, chunk_rows=CHUNK_ROWS):
+    """[(value, count, error)] of the heaviest values through Space-Saving, in bounded memory
+
+    values (integers, rows where mask is set when given) are read chunk by
+    chunk. Space-Saving counts are tightened with a Count-Min sketch: both
+    overestimate, so the smaller one is kept, and count - error remains a
+    guaranteed lower bound.
+    """
+    summary = SpaceSaving(capacity)
+    sketch = CountMinSketch()
+    for start in range(0, len(values), chunk_rows):
+        chunk = np.asarray(values[start:start + chunk_rows], dtype=np.int64)
+        if mask is not None:
+            chunk = chunk[mask[start:start + chunk_rows]]
+        keys, counts = np.unique(chunk, return_counts=True)
+        summary.update(keys, counts)
+        sketch.update(keys, counts)
+    if len(summary.keys) == 0:
+        return []
+    counts = np.minimum(summary.counts, sketch.estimate(summary.keys))
+    errors = summary.errors - (summary.counts - counts)
+    picked = top_k(counts, k)
+    return list(zip(summary.keys[picked].tolist(), counts[picked].tolist(), errors[picked].tolist()))
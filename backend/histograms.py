@@ -0,0 +1,197 @@
+import numpy as np
+
+# Values are recorded as whole multiples of the unit, 1 µs for delays in ms
+UNIT_MS = 0.001
+# Decimal digits every recorded value keeps, as in HdrHistogram
+SIGNIFICANT_DIGITS = 3
+MIN_DIGITS = 1
+MAX_DIGITS = 5
+
+PERCENTILES = (50, 90, 95, 99, 99.9)
+
+
+class HistogramError(ValueError):
+    pass
+
+
+class LogHistogram:
+    """HDR-style log-linear histogram of non-negative values
+
+    Values are stored as integer multiples of unit. Each power-of-two range
+    is split into linear sub-buckets, enough for significant_digits decimal
+    digits of precision, so the relative error of any value is below
+    10**-significant_digits whatever its magnitude, and the bucket count only
+    grows with the logarithm of the range. Histograms with the same unit and
+    precision merge by adding counts, which is exact: merging per-chunk or
+    per-capture histograms gives the same counts as recording everything
+    into one.
+    """
+
+    def __init__(self, significant_digits=SIGNIFICANT_DIGITS, unit=UNIT_MS):
+        if not MIN_DIGITS <= significant_digits <= MAX_DIGITS:
+            raise HistogramError(f"significant_digits must be between {MIN_DIGITS} and {MAX_DIGITS}")
+        self.significant_digits = significant_digits
+        self.unit = unit
+        self.sub_bucket_count = 1 << int(np.ceil(np.log2(2 * 10 ** significant_digits)))
+        self.half_count = self.sub_bucket_count // 2
+        self._half_magnitude = self.half_count.bit_length() - 1
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.total = 0
+        # Exact integer statistics in units, so they survive merging unchanged
+        self.min_units = None
+        self.max_units = None
+        self.sum_units = 0
+
+    def _indices(self, units):
+        """Bucket index of each value (non-negative integer units)"""
+        bits = np.frexp(units.astype(np.float64))[1]  # bit length, exact below 2**53
+        magnitude = np.maximum(bits - (self._half_magnitude + 1), 0)
+        return magnitude * self.half_count + (units >> magnitude)
+
+    def _bounds(self, indices):
+        """(lowest, highest) value in units of each bucket index"""
+        indices = np.asarray(indices, dtype=np.int64)
+        magnitude = np.where(indices < self.sub_bucket_count, 0, (indices - self.sub_bucket_count) // self.half_count + 1)
+        lowest = (indices - magnitude * self.half_count) << magnitude
+        return lowest, lowest + (np.int64(1) << magnitude) - 1
+
+    def record(self, values):
+        """Add values (in the histogram's unit scale, e.g. ms), NaN and inf are skipped, negatives count as 0"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return self
+        units = np.round(np.maximum(values, 0) / self.unit).astype(np.int64)
+        indices = self._indices(units)
+        counts = np.bincount(indices)
+        self._add_counts(np.flatnonzero(counts), counts[counts > 0])
+        self.total += len(units)
+        self.sum_units += int(units.sum())
+        low, high = int(units.min()), int(units.max())
+        self.min_units = low if self.min_units is None else min(self.min_units, low)
+        self.max_units = high if self.max_units is None else max(self.max_units, high)
+        return self
+
+    def _add_counts(self, indices, counts):
+        if len(indices) == 0:
+            return
+        size = int(indices.max()) + 1
+        if size > len(self.counts):
+            grown = np.zeros(size, dtype=np.int64)
+            grown[:len(self.counts)] = self.counts
+            self.counts = grown
+        np.add.at(self.counts, indices, counts)
+
+    def _check_compatible(self, other):
+        if other.significant_digits != self.significant_digits or other.unit != self.unit:
+            raise HistogramError("Histograms with different precision or unit can't be merged exactly")
+
+    def merge(self, other):
+        """Add other's counts into this histogram"""
+        self._check_compatible(other)
+        nonzero = np.flatnonzero(other.counts)
+        self._add_counts(nonzero, other.counts[nonzero])
+        self.total += other.total
+        self.sum_units += other.sum_units
+        for attr, pick in (("min_units", min), ("max_units", max)):
+            mine, theirs = getattr(self, attr), getattr(other, attr)
+            setattr(self, attr, theirs if mine is None else mine if theirs is None else pick(mine, theirs))
+        return self
+
+    def percentiles(self, percentiles=PERCENTILES):
+        """Value at each percentile, the highest value equivalent to the bucket it falls in (None when empty)
+
+        Like HdrHistogram, results are within the histogram's precision of the
+        true value and never beyond the recorded min/max.
+        """
+        if self.total == 0:
+            return {_label(p): None for p in percentiles}
+        nonzero = np.flatnonzero(self.counts)
+        cumulative = np.cumsum(self.counts[nonzero])
+        ranks = np.maximum(np.ceil(np.asarray(percentiles, dtype=np.float64) / 100 * self.total), 1)
+        at = np.minimum(np.searchsorted(cumulative, ranks, side="left"), len(nonzero) - 1)
+        _, highest = self._bounds(nonzero[at])
+        values = np.clip(highest, self.min_units, self.max_units) * self.unit
+        return {_label(p): float(v) for p, v in zip(percentiles, values)}
+
+    def summary(self, percentiles=PERCENTILES):
+        if self.total == 0:
+            return {"count": 0, "min": None, "max": None, "mean": None, "percentiles": self.percentiles(percentiles)}
+        return {
+            "count": self.total,
+            "min": self.min_units * self.unit,
+            "max": self.max_units * self.unit,
+            "mean": self.sum_units / self.total * self.unit,
+            "percentiles": self.percentiles(percentiles),
+        }
+
+    def to_dict(self):
+        """Serialized form, sparse (bucket index, count) pairs plus the exact statistics"""
+        nonzero = np.flatnonzero(self.counts)
+        return {
+            "significant_digits": self.significant_digits,
+            "unit": self.unit,
+            "count": self.total,
+            "min_units": self.min_units,
+            "max_units": self.max_units,
+            "sum_units": self.sum_units,
+            "indices": nonzero.tolist(),
+            "counts": self.counts[nonzero].tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        try:
+            hist = cls(int(data["significant_digits"]), float(data["unit"]))
+            indices = np.asarray(data["indices"], dtype=np.int64)
+            counts = np.asarray(data["counts"], dtype=np.int64)
+            if indices.shape != counts.shape or (len(indices) and (indices.min() < 0 or counts.min() < 0)):
+                raise HistogramError("indices and counts must be matching lists of non-negative integers")
+            hist._add_counts(indices, counts)
+            hist.total = int(data["count"])
+            hist.min_units = None if data["min_units"] is None else int(data["min_units"])
+            hist.max_units = None if data["max_units"] is None else int(data["max_units"])
+            hist.sum_units = int(data["sum_units"])
+        except (KeyError, TypeError, ValueError) as e:
+            if isinstance(e, HistogramError):
+                raise
+            raise HistogramError(f"Invalid histogram: {e}") from e
+        if hist.total != int(counts.sum()):
+            raise HistogramError("Histogram count doesn't match its bucket counts")
+        return hist
+
+
+def _label(p):
+    return f"p{p:g}"
+
+
+def merge_serialized(histograms):
+    """Merge serialized histograms (dicts from to_dict) into one LogHistogram, None for an empty list"""
+    merged = None
+    for data in histograms:
+        hist = LogHistogram.from_dict(data)
+        merged = hist if merged is None else merged.merge(hist)
+    return merged
+
+
+def histogram_groups(series, significant_digits=SIGNIFICANT_DIGITS):
+    """{group: {name: serialized histogram}} for {group: {name: values}}"""
+    return {group: {name: LogHistogram(significant_digits).record(values).to_dict()
+                    for name, values in named.items()}
+            for group, named in series.items()}
+
+
+def merge_groups(results, percentiles=PERCENTILES):
+    """Merge histogram_groups() outputs of several captures/chunks, with a summary next to each histogram"""
+    grouped = {}
+    for result in results:
+        for group, named in result.items():
+            for name, data in named.items():
+                grouped.setdefault(group, {}).setdefault(name, []).append(data)
+    merged = {}
+    for group, named in grouped.items():
+        merged[group] = {}
+        for name, parts in named.items():
+            hist = merge_serialized(parts)
+            merged[group][name] = {**hist.summary(percentiles), "histogram": hist.to_dict()}
+    return merged
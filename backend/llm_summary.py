@@ -0,0 +1,248 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from send_to_llm import GeminiClient
+except ImportError:
+    GeminiClient = None
+
+DEFAULT_MODEL = "gemini-2.0-flash"
+MAX_TOKENS = 256
+TEMPERATURE = 0.1
+
+# Calls in flight at once, further requests queue for a slot
+MAX_CONCURRENCY = 4
+# Seconds a summary may take, waiting for a slot included
+TIMEOUT = 30.0
+# Seconds a summary stays cached, and how many are kept
+CACHE_TTL = 3600.0
+CACHE_ENTRIES = 256
+
+# Digest shape: items kept per list, significant digits kept per number
+DIGEST_ITEMS = 5
+DIGEST_DIGITS = 3
+# Per-packet rows and absolute timestamps say nothing a summary needs
+DIGEST_SKIP = frozenset(("packets", "time_range"))
+
+PROMPT = (
+    "You are a network engineer reviewing an IoT packet capture. In a short paragraph, "
+    "summarize the traffic mix, latency, jitter and packet loss below and point out anything "
+    "abnormal. Numbers are rounded, delays are in milliseconds.\n\n{digest}"
+)
+
+
+class SummaryError(RuntimeError):
+    pass
+
+
+class SummaryTimeout(SummaryError):
+    pass
+
+
+def _compact(value, items, digits):
+    if isinstance(value, dict):
+        return {str(k): _compact(v, items, digits) for k, v in value.items() if k not in DIGEST_SKIP}
+    if isinstance(value, (list, tuple)):
+        if len(value) > items and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value):
+            # Long numeric series become their shape
+            return {"count": len(value), "min": _compact(min(value), items, digits),
+                    "max": _compact(max(value), items, digits),
+                    "mean": _compact(sum(value) / len(value), items, digits)}
+        compacted = [_compact(v, items, digits) for v in value[:items]]
+        if len(value) > items:
+            compacted.append(f"... {len(value) - items} more")
+        return compacted
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if hasattr(value, "item"):
+        value = value.item()  # numpy scalar
+    if isinstance(value, float):
+        return float(f"{value:.{digits}g}") if value == value else None
+    return value
+
+
+def analysis_digest(result, items=DIGEST_ITEMS, digits=DIGEST_DIGITS):
+    """Compact, deterministic text of an analysis result to prompt with
+
+    Lists are cut to their first items (the API already sorts them),
+    numbers rounded to digits significant digits, per-packet rows dropped.
+    Keys are sorted, so equal results give byte-identical digests and share
+    a cache entry.
+    """
+    return json.dumps(_compact(result, items, digits), sort_keys=True, separators=(",", ":"), default=str)
+
+
+def cache_key(digest, backend, model, max_tokens, temperature):
+    params = json.dumps([backend, model, max_tokens, temperature])
+    return hashlib.sha256(f"{params}\n{digest}".encode()).hexdigest()
+
+
+class TtlCache:
+    """LRU of at most max_entries values, each expiring ttl seconds after it was stored"""
+
+    def __init__(self, max_entries=CACHE_ENTRIES, ttl=CACHE_TTL, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= self.clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            now = self.clock()
+            for stale in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+                del self._entries[stale]
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class StubBackend:
+    """Offline backend answering from the prompt itself, for tests and development without an API key
+
+    Replies are deterministic; delay simulates a slow model.
+    """
+
+    name = "stub"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    async def generate(self, prompt, model, max_tokens, temperature):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        digest = prompt.rsplit("\n\n", 1)[-1]
+        words = digest.replace(",", ", ").split()
+        return f"[{model} stub] " + " ".join(words[:max_tokens])
+
+
+class GeminiBackend:
+    """Google Gemini through send_to_llm.GeminiClient's async API"""
+
+    name = "gemini"
+
+    def __init__(self, api_key):
+        if GeminiClient is None:
+            raise SummaryError("google-genai is not installed")
+        if not api_key:
+            raise SummaryError("No Gemini API key configured")
+        self.client = GeminiClient(api_key)
+
+    async def generate(self, prompt, model, max_tokens, temperature):
+        return await self.client.agenerate_content(prompt, model=model, max_tokens=max_tokens,
+                                                   temperature=temperature)
+
+
+class SummaryService:
+    """LLM-written summaries of analysis results, cached and rate-limited
+
+    Calls run on an event loop owned by the service (in a daemon thread), so
+    any number of request threads can submit work while at most
+    max_concurrency calls reach the backend. Each summary has timeout seconds
+    from submission, after which the call is cancelled. Results are cached by
+    digest and model parameters for ttl seconds, and concurrent requests for
+    the same summary share one call.
+    """
+
+    def __init__(self, backend, max_concurrency=MAX_CONCURRENCY, timeout=TIMEOUT,
+                 ttl=CACHE_TTL, max_entries=CACHE_ENTRIES):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.cache = TtlCache(max_entries, ttl)
+        self._loop = None
+        self._slots = None
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _event_loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._slots = asyncio.Semaphore(self.max_concurrency)
+                threading.Thread(target=loop.run_forever, name="llm-summaries", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def submit(self, result, model=DEFAULT_MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE):
+        """concurrent.futures.Future of the summary of result (see summarize)"""
+        digest = analysis_digest(result)
+        return asyncio.run_coroutine_threadsafe(
+            self._summarize(digest, model, max_tokens, temperature), self._event_loop())
+
+    def summarize(self, result, model=DEFAULT_MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE):
+        """{"summary", "digest", "model", "backend", "cached"} for an analysis result
+
+        Raises SummaryTimeout past the deadline and SummaryError when the backend fails.
+        """
+        return self.submit(result, model, max_tokens, temperature).result()
+
+    async def _summarize(self, digest, model, max_tokens, temperature):
+        key = cache_key(digest, self.backend.name, model, max_tokens, temperature)
+        summary = {"digest": hashlib.sha256(digest.encode()).hexdigest(), "model": model,
+                   "backend": self.backend.name}
+        text = self.cache.get(key)
+        if text is not None:
+            return {"summary": text, **summary, "cached": True}
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(
+                self._generate(key, digest, model, max_tokens, temperature))
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded so a waiter giving up doesn't cancel the call for the others
+        text = await asyncio.shield(task)
+        return {"summary": text, **summary, "cached": False}
+
+    async def _generate(self, key, digest, model, max_tokens, temperature):
+        try:
+            text = await asyncio.wait_for(
+                self._call(PROMPT.format(digest=digest), model, max_tokens, temperature), self.timeout)
+        except asyncio.TimeoutError as e:
+            raise SummaryTimeout(f"No summary from {self.backend.name} within {self.timeout:g}s") from e
+        except SummaryError:
+            raise
+        except Exception as e:
+            raise SummaryError(f"{self.backend.name} failed: {e}") from e
+        if not text:
+            raise SummaryError(f"{self.backend.name} returned an empty summary")
+        self.cache.put(key, text)
+        return text
+
+    async def _call(self, prompt, model, max_tokens, temperature):
+        async with self._slots:
+            return await self.backend.generate(prompt, model, max_tokens, temperature)
+
+
+def make_backend(name, api_key=None):
+    """Summary backend called name, gemini or stub"""
+    if name == "gemini":
+        return GeminiBackend(api_key)
+    if name == "stub":
+        return StubBackend()
+    raise SummaryError(f"Unknown LLM backend {name!r}")
@@ -0,0 +1,57 @@
+import numpy as np
+
+SEQ_MODULO = 1 << 32
+MAX_GAP = 10000  # bytes, larger jumps are treated as a new stream rather than loss
+
+
+def detect_sequence_gaps(flows, seqs, payloads, reorder_window=0, max_gap=MAX_GAP):
+    """Sequence gaps in TCP segments, returns (positions, expected_seq, bytes_lost)
+
+    flows, seqs and payloads are parallel arrays in capture order. Segments
+    are grouped by flow (stable, so capture order is kept within a flow) and
+    each one is compared with where the previous segment of its flow ended, all
+    in modulo 2^32 arithmetic. A segment with payload is a loss when it
+    neither continues nor retransmits that position and skips fewer than
+    max_gap bytes.
+
+    With reorder_window > 0 a gap is forgiven when one of the next
+    reorder_window segments of the flow starts inside it, i.e. the missing
+    bytes just arrived late.
+    """
+    flows = np.asarray(flows)
+    seqs = np.asarray(seqs, dtype=np.int64)
+    payloads = np.asarray(payloads, dtype=np.int64)
+    if len(flows) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+
+    order = np.argsort(flows, kind="stable")
+    flow = flows[order]
+    seq = seqs[order]
+    payload = payloads[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = flow[1:] != flow[:-1]
+
+    # Where the previous segment of the flow ended, a flow's first segment is its own start
+    prev_end = seq.copy()
+    prev_end[1:] = np.where(first[1:], seq[1:], (seq[:-1] + payload[:-1]) % SEQ_MODULO)
+
+    expected = (prev_end + payload) % SEQ_MODULO
+    missing = (seq - expected) % SEQ_MODULO
+    loss = (payload > 0) & (seq != expected) & (seq != prev_end) & (missing > 0) & (missing < max_gap)
+
+    if reorder_window > 0:
+        gap = (seq - prev_end) % SEQ_MODULO
+        same_flow = np.ones(len(order), dtype=bool)
+        for offset in range(1, reorder_window + 1):
+            # Still in the same flow offset segments later
+            same_flow[:-offset] &= ~first[offset:]
+            same_flow[-offset:] = False
+            later = np.zeros(len(order), dtype=np.int64)
+            later[:-offset] = seq[offset:]
+            filled = same_flow & ((later - prev_end) % SEQ_MODULO < gap)
+            loss &= ~filled
+
+    positions = order[loss]
+    ordered = np.argsort(positions, kind="stable")
+    return positions[ordered], expected[loss][ordered], missing[loss][ordered]
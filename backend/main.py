@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
@@ -6,14 +6,157 @@ from matplotlib import pyplot as plt
 import pyshark
 import os
 import json
+import io
+import copy
 import tempfile
-from datetime import datetime
-from scapy.all import IP, TCP, UDP
-from test import PacketAnalyzer
+import threading
+import queue
+import time
+from test import PacketAnalyzer, capture_fingerprint
+from mqtt import MAX_MESSAGES
+from columnar import is_columnar_file
+from analytics_store import (AnalyticsStore, StoreError, PERCENTILES as STORE_PERCENTILES,
+                             MAX_CAPTURES as STORE_MAX_CAPTURES)
+from llm_summary import (SummaryService, SummaryError, SummaryTimeout, make_backend, DEFAULT_MODEL,
+                         MAX_TOKENS as SUMMARY_MAX_TOKENS, MAX_CONCURRENCY, TIMEOUT, CACHE_TTL)
+from histograms import (SIGNIFICANT_DIGITS, MIN_DIGITS, MAX_DIGITS, PERCENTILES as HISTOGRAM_PERCENTILES,
+                        HistogramError, merge_groups)
+from packet_table import packet_summaries
+from compare import compare_captures, DEFAULT_SWEEP
+from rollups import ALL_PROTOCOLS, MAX_BUCKETS, RollupPyramid
+from capture_cache import capture_cache
+from capture_store import CaptureStore, MAX_BYTES as CAPTURE_STORE_MAX
+from singleflight import SingleFlight
+from display_filter import compile_filter, FilterError
+from stages import StageGraph
+from search_index import SearchIndex, SORT_KEYS, PAGE_SIZE
+from responses import encode_response, event_stream, capture_etag, etag_matches, not_modified
 
 app = Flask(__name__)
 CORS(app)
 
+# "mmap" reads captures through the zero-copy pcapng reader instead of scapy's rdpcap
+PCAP_READER = os.environ.get("PCAP_READER", "scapy")
+
+# Multi-worker serving: decoded captures and results are published here once and
+# memory-mapped by every worker (see gunicorn.conf.py)
+CAPTURE_STORE_DIR = os.environ.get("CAPTURE_STORE_DIR")
+CAPTURE_STORE_MAX_BYTES = int(os.environ.get("CAPTURE_STORE_MAX_BYTES", CAPTURE_STORE_MAX))
+capture_store = CaptureStore(CAPTURE_STORE_DIR, CAPTURE_STORE_MAX_BYTES) if CAPTURE_STORE_DIR else None
+
+# Counters of the Space-Saving sketches behind the top IPs/ports, 0 counts every address and port exactly
+HEAVY_HITTER_CAPACITY = int(os.environ.get("HEAVY_HITTER_CAPACITY", 0))
+
+# Analyzed captures are ingested into this SQLite database for the cross-capture /api/stored* queries
+ANALYTICS_DB = os.environ.get("ANALYTICS_DB")
+ANALYTICS_MAX_CAPTURES = int(os.environ.get("ANALYTICS_MAX_CAPTURES", STORE_MAX_CAPTURES))
+analytics_store = AnalyticsStore(ANALYTICS_DB, max_captures=ANALYTICS_MAX_CAPTURES) if ANALYTICS_DB else None
+
+# LLM summaries of analyses: Gemini when an API key is configured, the offline stub otherwise
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "gemini" if os.environ.get("GEMMA_API_KEY") else "stub")
+summary_service = SummaryService(make_backend(LLM_BACKEND, os.environ.get("GEMMA_API_KEY")),
+                                 max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", MAX_CONCURRENCY)),
+                                 timeout=float(os.environ.get("LLM_TIMEOUT", TIMEOUT)),
+                                 ttl=float(os.environ.get("LLM_CACHE_TTL", CACHE_TTL)))
+
+
+def open_analyzer(pcap_file, display_filter=None, progress=None):
+    """PacketAnalyzer for a capture served by the API, attached to the capture store when configured"""
+    return PacketAnalyzer(pcap_file, reader=PCAP_READER, display_filter=display_filter, store=capture_store,
+                          progress=progress)
+
+
+# Analyses currently running in this process, keyed by capture identity and analysis
+inflight = SingleFlight()
+
+
+def coalesced(name, pcap_file, build):
+    """build() run once for all concurrent requests of the same analysis of the same capture"""
+    return inflight.do((capture_fingerprint(pcap_file), name), build)
+
+
+def shared_result(name, pcap_file, build, arrays=False):
+    """Coalesced build(), and with the capture store on computed once across all workers
+
+    With the store on the result comes back in its JSON form, or with arrays
+    as the dict of numpy arrays build() returned (see CaptureStore.result).
+    """
+    if capture_store is None:
+        return coalesced(name, pcap_file, build)
+    return coalesced(name, pcap_file, lambda: capture_store.result(name, pcap_file, build, arrays=arrays))
+
+
+def request_filter():
+    """Compiled ?filter= display filter, None when absent (a bad filter is answered with 400)"""
+    return compile_filter(request.args.get('filter'))
+
+
+# Payload fields of analyzeOverview/upload, in payload order, and the section computing each
+OVERVIEW_FIELDS = ("Protocol", "Packet", "stats", "time_range", "ip_stats", "port_stats")
+ANALYSIS_FIELDS = ("packet_loss", "latency", "jitter", "delay_categories", "iot_metrics")
+DISTRIBUTION_FIELDS = ("data_distribution", "packet_size_distribution", "delay_correlation",
+                       "latency_timeline", "jitter_distribution")
+TOP_LEVEL_FIELDS = ("packets",) + DISTRIBUTION_FIELDS
+FIELD_SECTIONS = {
+    "Protocol": "protocols", "Packet": "protocols",
+    "stats": "stats", "time_range": "stats",
+    "ip_stats": "ip_port_stats", "port_stats": "ip_port_stats",
+    "packet_loss": "packet_loss", "latency": "latency", "jitter": "jitter",
+    "delay_categories": "delay_categories", "iot_metrics": "iot_metrics",
+    "packets": "packets",
+    "data_distribution": "data_distribution", "packet_size_distribution": "packet_size_distribution",
+    "latency_timeline": "latency_timeline", "jitter_distribution": "jitter_distribution",
+    "delay_correlation": None,  # not computed, kept empty for the upload payload layout
+}
+EMPTY_FIELDS = {
+    "Protocol": [], "Packet": [], "stats": {}, "time_range": {},
+    "ip_stats": {"top_sources": [], "top_destinations": []},
+    "port_stats": {"top_sources": [], "top_destinations": []},
+    "packet_loss": {}, "latency": {}, "jitter": {}, "delay_categories": {},
+    "iot_metrics": {"bundle_sizes": [], "aggregation_intervals": [], "device_patterns": {}},
+    "packets": [],
+    "data_distribution": [], "packet_size_distribution": [], "delay_correlation": [],
+    "latency_timeline": [], "jitter_distribution": [],
+}
+OVERVIEW_DEFAULT_FIELDS = OVERVIEW_FIELDS + ANALYSIS_FIELDS + ("packets",)
+UPLOAD_DEFAULT_FIELDS = OVERVIEW_DEFAULT_FIELDS + DISTRIBUTION_FIELDS
+
+# Sections in the order they are computed and streamed
+OVERVIEW_SECTIONS = ("stats", "protocols", "ip_port_stats")
+SECTION_ORDER = OVERVIEW_SECTIONS + ("delay_categories", "latency", "jitter", "packet_loss", "iot_metrics",
+                                     "data_distribution", "packet_size_distribution", "latency_timeline",
+                                     "jitter_distribution", "packets")
+
+
+def sections_for(fields):
+    return {FIELD_SECTIONS[f] for f in fields if FIELD_SECTIONS[f]}
+
+
+class FieldError(ValueError):
+    pass
+
+
+def request_fields(default):
+    """Payload fields asked for with ?fields= (or ?sections=), comma separated, default when absent"""
+    value = request.args.get('fields') or request.args.get('sections')
+    if not value:
+        return default
+    fields = [f.strip() for f in value.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in FIELD_SECTIONS]
+    if unknown:
+        raise FieldError(", ".join(unknown))
+    return tuple(fields)
+
+
+@app.errorhandler(FieldError)
+def invalid_fields(e):
+    return jsonify({"error": f"Unknown fields: {e}", "fields": list(FIELD_SECTIONS)}), 400
+
+
+@app.errorhandler(FilterError)
+def invalid_filter(e):
+    return jsonify({"error": f"Invalid filter: {e}"}), 400
+
 
 @app.route("/")
 def index():
@@ -25,21 +168,31 @@ def latency_distribution():
     print("REQUEST ARGUMENTS:", dict(request.args))
     print("PCAP_FILE_NAME: ", pcap_file)
     
+    display_filter = request_filter()
     if not os.path.exists(pcap_file):
         return jsonify({"error": "PCAP file not found"}), 404
+
+    etag = capture_etag(pcap_file)
+    if etag_matches(etag):
+        return not_modified(etag)
     try:
-        pa = PacketAnalyzer(pcap_file)
-        pa.analyze_delays()
-        distribution_data = pa.get_latency_distribution()
+        distribution_data = shared_result(f"latencyDistribution:{display_filter or ''}", pcap_file,
+                                          lambda: latency_distribution_data(pcap_file, display_filter))
         
-        return jsonify({
+        return encode_response({
             "status": "success",
             "data": distribution_data
-        })
+        }, etag=etag)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def latency_distribution_data(pcap_file, display_filter):
+    pa = open_analyzer(pcap_file, display_filter)
+    pa.analyze_delays()
+    return pa.get_latency_distribution()
+
+
 @app.route("/api/upload", methods=["POST"])
 def upload_file():
     if "file" not in request.files:
@@ -54,270 +207,36 @@ def upload_file():
     if not file.filename.lower().endswith(".pcapng"):
         return jsonify({"error": "Only PCAPNG files are allowed"}), 400
 
+    display_filter = request_filter()
+    fields = request_fields(UPLOAD_DEFAULT_FIELDS)
+    temp_path = None
+    pa = None
     try:
         # Create a temporary file
         with tempfile.NamedTemporaryFile(suffix=".pcapng", delete=False) as temp:
+            temp_path = temp.name
             # Save the uploaded file to the temporary location
             file.save(temp.name)
-            temp_path = temp.name
-
-        # Process the file with the PacketAnalyzer
-        pa = PacketAnalyzer(temp_path)
-        
-        # Get basic statistics and overview
-        stats = pa.basic_statistics()
-        pa.analyze_delays()
-        total_packets = stats['total_packets']
-        capture_duration = stats['capture_duration']
-        overview = pa.get_capture_overview()
-        
-        # Create data structure to hold results - matches data.json format
-        result = {
-            "overview": {
-                "Protocol": [],
-                "Packet": [],
-                "stats": {
-                    "total_packets": total_packets,
-                    "avg_packet_size": stats['avg_packet_size'],
-                    "max_packet_size": stats['max_packet_size'],
-                    "min_packet_size": stats['min_packet_size'],
-                    "capture_duration": capture_duration,
-                    "packets_per_second": total_packets / capture_duration if capture_duration > 0 else 0
-                },
-                "time_range": overview.get('time_range', {"start": 0, "end": 0}),
-                "ip_stats": {
-                    "top_sources": [],
-                    "top_destinations": []
-                },
-                "port_stats": {
-                    "top_sources": [],
-                    "top_destinations": []
-                }
-            },
-            "analysis": {
-                "packet_loss": {},
-                "latency": {},
-                "jitter": {},
-                "delay_categories": {},
-                "iot_metrics": {
-                    "bundle_sizes": [],
-                    "aggregation_intervals": [],
-                    "device_patterns": {}
-                }
-            },
-            "packets": [],
-            "data_distribution" : [],
-            "packet_size_distribution" : [],
-            "delay_correlation" : [],
-            "latency_timeline" : [],
-            "jitter_distribution" : []
-        }
-
-        distribution_data = pa.get_latency_distribution()
-        result["data_distribution"] = distribution_data
-
-        packet_size_distribution = pa.get_packet_size_distribution()
-        result["packet_size_distribution"] = packet_size_distribution
-
-        # delay_correlation = pa.get_delay_correlation()
-        # result["delay_correlation"] = delay_correlation
 
-        latency_timeline = pa.get_latency_timeline()
-        result["latency_timeline"] = latency_timeline
+        # Process the file with the PacketAnalyzer, running only the stages the fields need
+        pa = PacketAnalyzer(temp_path, reader=PCAP_READER, display_filter=display_filter)
+        result = analysis_payload(pa, fields)
+        if analytics_store is not None:
+            analytics_store.ingest(pa, result, name=file.filename, source="upload")
 
-        jitter_distribution = pa.get_jitter_distribution()
-        result["jitter_distribution"] = jitter_distribution
-
-        
-        # Fill in protocol data
-        for proto, count in sorted(overview['protocols'].items(), key=lambda x: x[1], reverse=True):
-            percentage = (count / total_packets) * 100
-            result["overview"]["Protocol"].append({
-                "name": proto,
-                "packets": count,
-                "percentage": percentage
-            })
-
-        # Fill in packet type data
-        for pkt_type, count in sorted(overview['packet_counts'].items(), key=lambda x: x[1], reverse=True):
-            percentage = (count / total_packets) * 100
-            result["overview"]["Packet"].append({
-                "name": pkt_type,
-                "packets": count,
-                "percentage": percentage
-            })
-
-        # Add IP stats if available
-        if 'ip_stats' in overview:
-            # Top IP sources
-            for ip, count in sorted(overview['ip_stats'].get('sources', {}).items(), key=lambda x: x[1], reverse=True)[:10]:
-                percentage = (count / total_packets) * 100
-                result["overview"]["ip_stats"]["top_sources"].append({
-                    "ip": ip,
-                    "packets": count,
-                    "percentage": percentage
-                })
-            
-            # Top IP destinations
-            for ip, count in sorted(overview['ip_stats'].get('destinations', {}).items(), key=lambda x: x[1], reverse=True)[:10]:
-                percentage = (count / total_packets) * 100
-                result["overview"]["ip_stats"]["top_destinations"].append({
-                    "ip": ip,
-                    "packets": count,
-                    "percentage": percentage
-                })
-
-        # Add port stats if available
-        if 'port_stats' in overview:
-            # Top source ports
-            for port, count in sorted(overview['port_stats'].get('sources', {}).items(), key=lambda x: x[1], reverse=True)[:10]:
-                percentage = (count / total_packets) * 100
-                result["overview"]["port_stats"]["top_sources"].append({
-                    "port": port,
-                    "packets": count,
-                    "percentage": percentage
-                })
-            
-            # Top destination ports
-            for port, count in sorted(overview['port_stats'].get('destinations', {}).items(), key=lambda x: x[1], reverse=True)[:10]:
-                percentage = (count / total_packets) * 100
-                result["overview"]["port_stats"]["top_destinations"].append({
-                    "port": port,
-                    "packets": count,
-                    "percentage": percentage
-                })
-
-        # Perform analysis if the methods are available in PacketAnalyzer
-        try:
-            pa.analyze_delays()
-            
-            # Add delay categories if available
-            if hasattr(pa, 'delay_categories'):
-                for category, delays in pa.delay_categories.items():
-                    if delays:
-                        values = [d['delay'] for d in delays]
-                        result["analysis"]["delay_categories"][category] = {
-                            "avg": float(np.mean(values)),
-                            "max": float(max(values)),
-                            "count": len(values)
-                        }
-            
-            # Add latency statistics if available
-            if hasattr(pa, 'latencies'):
-                for proto in pa.latencies:
-                    if pa.latencies[proto]:
-                        result["analysis"]["latency"][proto] = {
-                            "avg": float(np.mean(pa.latencies[proto])),
-                            "max": float(max(pa.latencies[proto])),
-                            "min": float(min(pa.latencies[proto])),
-                            "std": float(np.std(pa.latencies[proto])),
-                            "count": len(pa.latencies[proto])
-                        }
-            
-            # Add jitter statistics if available
-            if hasattr(pa, 'jitter_values'):
-                for proto in pa.jitter_values:
-                    if pa.jitter_values[proto]:
-                        result["analysis"]["jitter"][proto] = {
-                            "avg": float(np.mean(pa.jitter_values[proto])),
-                            "max": float(max(pa.jitter_values[proto])),
-                            "min": float(min(pa.jitter_values[proto])),
-                            "std": float(np.std(pa.jitter_values[proto])),
-                            "count": len(pa.jitter_values[proto])
-                        }
-            
-            # Add packet loss statistics if available
-            if hasattr(pa, 'calculate_packet_loss'):
-                loss_stats = pa.calculate_packet_loss()
-                result["analysis"]["packet_loss"] = loss_stats
-            
-            # Add IoT metrics if available
-            if hasattr(pa, 'iot_metrics'):
-                # Add bundle sizes
-                if pa.iot_metrics.get('bundle_sizes'):
-                    result["analysis"]["iot_metrics"]["bundle_sizes"] = pa.iot_metrics['bundle_sizes']
-                
-                # Add aggregation intervals
-                if pa.iot_metrics.get('aggregation_intervals'):
-                    result["analysis"]["iot_metrics"]["aggregation_intervals"] = pa.iot_metrics['aggregation_intervals']
-                
-                # Add device patterns
-                if pa.iot_metrics.get('device_patterns'):
-                    for device, patterns in pa.iot_metrics['device_patterns'].items():
-                        small_pkts = sum(1 for p in patterns if p.get('type') == 'small')
-                        bundle_pkts = sum(1 for p in patterns if p.get('type') == 'bundle')
-                        result["analysis"]["iot_metrics"]["device_patterns"][device] = {
-                            "small_packets": small_pkts,
-                            "bundled_packets": bundle_pkts,
-                            "total": len(patterns)
-                        }
-                
-            # Add packet list as well
-            all_packets = pa.getAllPackets()
-            packet_list = []
-            for i, pkt in enumerate(all_packets):
-                packet_info = {
-                    "number": i + 1,
-                    "time": str(datetime.fromtimestamp(float(pkt.time))),
-                    "length": len(pkt),
-                    "protocol": "Unknown",
-                    "source": "",
-                    "destination": "",
-                    "info": ""
-                }
-                
-                # Extract common fields if available
-                if IP in pkt:
-                    packet_info["source"] = pkt[IP].src
-                    packet_info["destination"] = pkt[IP].dst
-                    
-                    # Determine protocol
-                    if TCP in pkt:
-                        packet_info["protocol"] = "TCP"
-                        src_port = pkt[TCP].sport
-                        dst_port = pkt[TCP].dport
-                        packet_info["info"] = f"TCP {src_port} → {dst_port} [SYN: {pkt[TCP].flags.S}, ACK: {pkt[TCP].flags.A}, FIN: {pkt[TCP].flags.F}]"
-                    elif UDP in pkt:
-                        packet_info["protocol"] = "UDP"
-                        src_port = pkt[UDP].sport
-                        dst_port = pkt[UDP].dport
-                        packet_info["info"] = f"UDP {src_port} → {dst_port} Len={len(pkt[UDP].payload)}"
-                    else:
-                        packet_info["protocol"] = "IP"
-                        packet_info["info"] = f"IP Protocol: {pkt[IP].proto}"
-                
-                # If we couldn't determine protocol from IP, try other common protocols
-                elif 'ARP' in pkt:
-                    packet_info["protocol"] = "ARP"
-                    if hasattr(pkt.getlayer('ARP'), 'psrc') and hasattr(pkt.getlayer('ARP'), 'pdst'):
-                        packet_info["source"] = pkt.getlayer('ARP').psrc
-                        packet_info["destination"] = pkt.getlayer('ARP').pdst
-                        packet_info["info"] = f"Who has {pkt.getlayer('ARP').pdst}? Tell {pkt.getlayer('ARP').psrc}"
-                elif 'IPv6' in pkt:
-                    packet_info["protocol"] = "IPv6"
-                    if hasattr(pkt.getlayer('IPv6'), 'src') and hasattr(pkt.getlayer('IPv6'), 'dst'):
-                        packet_info["source"] = pkt.getlayer('IPv6').src
-                        packet_info["destination"] = pkt.getlayer('IPv6').dst
-                        packet_info["info"] = f"IPv6 {pkt.getlayer('IPv6').nh}"
-                
-                packet_list.append(packet_info)
-            
-            result["packets"] = packet_list
-
-            
-        except Exception as analysis_err:
-            print(f"Error during analysis: {analysis_err}")
-            # Continue with basic data even if analysis fails
-
-        # Delete the temporary file after processing
-        os.unlink(temp_path)
-
-        return jsonify(result)
+        return encode_response(result)
 
     except Exception as e:
         print(f"Error processing file: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+    finally:
+        # Unmap the capture before deleting it (Windows can't delete a mapped file), even on errors
+        if pa is not None:
+            pa.close()
+        if temp_path is not None:
+            os.unlink(temp_path)
+
 
 @app.route("/api/getOverview", methods=["GET"])
 def get_overview():
@@ -329,14 +248,26 @@ def get_overview():
         data = request.get_json()
         pcap_file = data.get('pcap_file', "./pcapngFiles/28-1-25-bro-laptp-20ms.pcapng")
     
+    display_filter = request_filter()
     if not os.path.exists(pcap_file):
         return jsonify({"error": "PCAP file not found"}), 404
-    
-    pa = PacketAnalyzer(pcap_file)
+
+    etag = capture_etag(pcap_file)
+    if etag_matches(etag):
+        return not_modified(etag)
+
+    data = shared_result(f"getOverview:{display_filter or ''}", pcap_file,
+                         lambda: overview_breakdown(pcap_file, display_filter))
+    return encode_response(data, etag=etag)
+
+
+def overview_breakdown(pcap_file, display_filter):
+    """Protocol and packet type breakdown of /api/getOverview"""
+    pa = open_analyzer(pcap_file, display_filter)
     stats = pa.basic_statistics()
     total_packets = stats['total_packets']
 
-    overview = pa.get_capture_overview()
+    overview = pa.get_capture_overview(address_stats=False)
     data = {
         "Protocol" : [],
         "Packet" : []
@@ -364,75 +295,95 @@ def get_overview():
         })
     
     data["total_packets"] = total_packets
-    return jsonify(data)
+    return data
 
 @app.route("/api/getAllPackets", methods=["GET"])
 def get_all_packets():
     # For GET requests, use a default file or get from query params
     pcap_file = request.args.get('pcap_file', "./pcapngFiles/28-1-25-bro-laptp-20ms.pcapng")
     
+    display_filter = request_filter()
     if not os.path.exists(pcap_file):
         return jsonify({"error": "PCAP file not found"}), 404
+
+    etag = capture_etag(pcap_file)
+    if etag_matches(etag):
+        return not_modified(etag)
     
     try:
-        pa = PacketAnalyzer(pcap_file)
-        all_packets = pa.getAllPackets()
-        
-        # Convert Scapy packets to a serializable format
-        packet_list = []
-        for i, pkt in enumerate(all_packets):
-            packet_info = {
-                "number": i + 1,
-                "time": str(datetime.fromtimestamp(float(pkt.time))),
-                "length": len(pkt),
-                "protocol": "Unknown",
-                "source": "",
-                "destination": "",
-                "info": ""
-            }
-            
-            # Extract common fields if available
-            if IP in pkt:
-                packet_info["source"] = pkt[IP].src
-                packet_info["destination"] = pkt[IP].dst
-                
-                # Determine protocol
-                if TCP in pkt:
-                    packet_info["protocol"] = "TCP"
-                    src_port = pkt[TCP].sport
-                    dst_port = pkt[TCP].dport
-                    packet_info["info"] = f"TCP {src_port} → {dst_port} [SYN: {pkt[TCP].flags.S}, ACK: {pkt[TCP].flags.A}, FIN: {pkt[TCP].flags.F}]"
-                elif UDP in pkt:
-                    packet_info["protocol"] = "UDP"
-                    src_port = pkt[UDP].sport
-                    dst_port = pkt[UDP].dport
-                    packet_info["info"] = f"UDP {src_port} → {dst_port} Len={len(pkt[UDP].payload)}"
-                else:
-                    packet_info["protocol"] = "IP"
-                    packet_info["info"] = f"IP Protocol: {pkt[IP].proto}"
-            
-            # If we couldn't determine protocol from IP, try other common protocols
-            elif 'ARP' in pkt:
-                packet_info["protocol"] = "ARP"
-                if hasattr(pkt.getlayer('ARP'), 'psrc') and hasattr(pkt.getlayer('ARP'), 'pdst'):
-                    packet_info["source"] = pkt.getlayer('ARP').psrc
-                    packet_info["destination"] = pkt.getlayer('ARP').pdst
-                    packet_info["info"] = f"Who has {pkt.getlayer('ARP').pdst}? Tell {pkt.getlayer('ARP').psrc}"
-            elif 'IPv6' in pkt:
-                packet_info["protocol"] = "IPv6"
-                if hasattr(pkt.getlayer('IPv6'), 'src') and hasattr(pkt.getlayer('IPv6'), 'dst'):
-                    packet_info["source"] = pkt.getlayer('IPv6').src
-                    packet_info["destination"] = pkt.getlayer('IPv6').dst
-                    packet_info["info"] = f"IPv6 {pkt.getlayer('IPv6').nh}"
-            
-            packet_list.append(packet_info)
+        packet_list = coalesced(f"getAllPackets:{display_filter or ''}", pcap_file,
+                                lambda: all_packets(pcap_file, display_filter))
         
-        return jsonify({"AllPackets": packet_list})
+        return encode_response({"AllPackets": packet_list}, etag=etag)
         
     except Exception as e:
         print(f"Error retrieving packets: {str(e)}")
         return jsonify({"error": str(e), "AllPackets": []}), 500
 
+def all_packets(pcap_file, display_filter):
+    pa = open_analyzer(pcap_file, display_filter)
+    return packet_summaries(pa.get_packet_table(), pa.get_frame_numbers())
+
+
+def build_search_index(pcap_file, display_filter):
+    pa = open_analyzer(pcap_file, display_filter)
+    return SearchIndex(pa.get_packet_table(), pa.get_frame_numbers())
+
+
+@app.route("/api/searchPackets", methods=["GET"])
+def search_packets():
+    pcap_file = request.args.get('pcap_file', "./pcapngFiles/28-1-25-bro-laptp-20ms.pcapng")
+    args = request.args
+    try:
+        filters = {
+            "protocol": args.get('protocol'),
+            "src": args.get('src'),
+            "dst": args.get('dst'),
+            "ip": args.get('ip'),
+            "sport": args.get('sport', type=int),
+            "dport": args.get('dport', type=int),
+            "port": args.get('port', type=int),
+            "start": args.get('start', type=float),
+            "end": args.get('end', type=float),
+            "min_length": args.get('min_length', type=int),
+            "max_length": args.get('max_length', type=int),
+            "q": args.get('q'),
+        }
+        page = int(args.get('page', 1))
+        page_size = int(args.get('page_size', PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "page and page_size must be integers"}), 400
+    if not all(v is None or np.isfinite(v) for v in (filters["start"], filters["end"])):
+        return jsonify({"error": "start and end must be finite numbers"}), 400
+    sort = args.get('sort', 'number')
+    if sort not in SORT_KEYS:
+        return jsonify({"error": "sort must be one of: " + ", ".join(SORT_KEYS)}), 400
+
+    display_filter = request_filter()
+    if not os.path.exists(pcap_file):
+        return jsonify({"error": "PCAP file not found"}), 404
+
+    etag = capture_etag(pcap_file)
+    if etag_matches(etag):
+        return not_modified(etag)
+    try:
+        # Indexes are built on the first search of a capture and reused afterwards
+        index = capture_cache.get(f"search:{display_filter or ''}", pcap_file,
+                                  lambda: build_search_index(pcap_file, display_filter))
+        result = index.search(sort=sort, descending=args.get('order', 'asc') == 'desc',
+                              page=page, page_size=page_size, **filters)
+        if args.get('facets', 'false').lower() == 'true':
+            result["facets"] = {
+                "protocols": index.protocols(),
+                "sources": index.sources(),
+                "destinations": index.destinations(),
+            }
+        return encode_response(result, etag=etag)
+    except Exception as e:
+        print(f"Error searching packets: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route("/api/analyzeOverview", methods=["GET"])
 def analyze_overview():
     # For GET requests, use a default file or get from query params
@@ -443,237 +394,611 @@ def analyze_overview():
         data = request.get_json()
         pcap_file = data.get('pcap_file', "./pcapngFiles/28-1-25-bro-laptp-20ms.pcapng")
     
+    display_filter = request_filter()
+    fields = request_fields(OVERVIEW_DEFAULT_FIELDS)
     if not os.path.exists(pcap_file):
         return jsonify({"error": "PCAP file not found"}), 404
-    
-    pa = PacketAnalyzer(pcap_file)
-    
-    # Get basic statistics and overview
-    stats = pa.basic_statistics()
+
+    etag = capture_etag(pcap_file)
+    if etag_matches(etag):
+        return not_modified(etag)
+
+    key = f"analyzeOverview:{display_filter or ''}"
+    if fields != OVERVIEW_DEFAULT_FIELDS:
+        key += f":{','.join(fields)}"
+    result = shared_result(key, pcap_file, lambda: overview_analysis(pcap_file, display_filter, fields))
+    return encode_response(result, etag=etag)
+
+
+def overview_analysis(pcap_file, display_filter, fields=OVERVIEW_DEFAULT_FIELDS):
+    """Analysis payload of /api/analyzeOverview, limited to fields"""
+    pa = open_analyzer(pcap_file, display_filter)
+    result = analysis_payload(pa, fields)
+    if analytics_store is not None:
+        analytics_store.ingest(pa, result)
+    return result
+
+
+def _top_counts(talkers, key, total_packets):
+    top = []
+    for value, count, error in talkers:
+        entry = {key: value, "packets": count, "percentage": (count / total_packets) * 100}
+        if HEAVY_HITTER_CAPACITY:
+            # Sketched counts overestimate by at most this many packets
+            entry["max_error"] = error
+        top.append(entry)
+    return top
+
+
+def _series_summary(values):
+    return {
+        "avg": float(np.mean(values)),
+        "max": float(max(values)),
+        "min": float(min(values)),
+        "std": float(np.std(values)),
+        "count": len(values)
+    }
+
+
+# Stages behind the analyzeOverview/upload payloads. Every section is a stage,
+# so a request only runs what its sections need (Protocol never reaches analyze_delays).
+overview_stages = StageGraph()
+
+
+@overview_stages.stage("basic_stats")
+def _basic_stats_stage(pa):
+    return pa.basic_statistics()
+
+
+@overview_stages.stage("capture_overview")
+def _capture_overview_stage(pa):
+    return pa.get_capture_overview(address_stats=False)
+
+
+@overview_stages.stage("top_talkers")
+def _top_talkers_stage(pa):
+    return pa.get_top_talkers(10, HEAVY_HITTER_CAPACITY or None)
+
+
+@overview_stages.stage("delays")
+def _delays_stage(pa):
+    pa.analyze_delays()
+
+
+@overview_stages.stage("stats", "basic_stats", "capture_overview")
+def _stats_section(pa, stats, overview):
     total_packets = stats['total_packets']
     capture_duration = stats['capture_duration']
-    overview = pa.get_capture_overview()
-    
-    # Create data structure to hold results
-    result = {
-        "overview": {
-            "Protocol": [],
-            "Packet": [],
-            "stats": {
-                "total_packets": total_packets,
-                "avg_packet_size": stats['avg_packet_size'],
-                "max_packet_size": stats['max_packet_size'],
-                "min_packet_size": stats['min_packet_size'],
-                "capture_duration": capture_duration,
-                "packets_per_second": total_packets / capture_duration if capture_duration > 0 else 0
-            },
-            "time_range": overview['time_range'],
-            "ip_stats": {
-                "top_sources": [],
-                "top_destinations": []
-            },
-            "port_stats": {
-                "top_sources": [],
-                "top_destinations": []
-            }
+    return {
+        "stats": {
+            "total_packets": total_packets,
+            "avg_packet_size": stats['avg_packet_size'],
+            "max_packet_size": stats['max_packet_size'],
+            "min_packet_size": stats['min_packet_size'],
+            "capture_duration": capture_duration,
+            "packets_per_second": total_packets / capture_duration if capture_duration > 0 else 0
         },
-        "analysis": {
-            "packet_loss": {},
-            "latency": {},
-            "jitter": {},
-            "delay_categories": {},
-            "iot_metrics": {
-                "bundle_sizes": [],
-                "aggregation_intervals": [],
-                "device_patterns": {}
-            }
+        "time_range": overview['time_range'],
+    }
+
+
+@overview_stages.stage("protocols", "basic_stats", "capture_overview")
+def _protocols_section(pa, stats, overview):
+    total_packets = stats['total_packets']
+    return {
+        "Protocol": [
+            {"name": proto, "packets": count, "percentage": (count / total_packets) * 100}
+            for proto, count in sorted(overview['protocols'].items(), key=lambda x: x[1], reverse=True)
+        ],
+        "Packet": [
+            {"name": pkt_type, "packets": count, "percentage": (count / total_packets) * 100}
+            for pkt_type, count in sorted(overview['packet_counts'].items(), key=lambda x: x[1], reverse=True)
+        ],
+    }
+
+
+@overview_stages.stage("ip_port_stats", "basic_stats", "top_talkers")
+def _ip_port_section(pa, stats, talkers):
+    total_packets = stats['total_packets']
+    ip_stats = talkers['ip_stats']
+    port_stats = talkers['port_stats']
+    return {
+        "ip_stats": {
+            "top_sources": _top_counts(ip_stats['sources'], "ip", total_packets),
+            "top_destinations": _top_counts(ip_stats['destinations'], "ip", total_packets)
+        },
+        "port_stats": {
+            "top_sources": _top_counts(port_stats['sources'], "port", total_packets),
+            "top_destinations": _top_counts(port_stats['destinations'], "port", total_packets)
         },
-        "packets": []
     }
 
-    all_packets = pa.getAllPackets()
-        
-        # Convert Scapy packets to a serializable format
-    packet_list = []
-    for i, pkt in enumerate(all_packets):
-        packet_info = {
-            "number": i + 1,
-            "time": str(datetime.fromtimestamp(float(pkt.time))),
-            "length": len(pkt),
-            "protocol": "Unknown",
-            "source": "",
-            "destination": "",
-            "info": ""
-        }
-        
-        # Extract common fields if available
-        if IP in pkt:
-            packet_info["source"] = pkt[IP].src
-            packet_info["destination"] = pkt[IP].dst
-            
-            # Determine protocol
-            if TCP in pkt:
-                packet_info["protocol"] = "TCP"
-                src_port = pkt[TCP].sport
-                dst_port = pkt[TCP].dport
-                packet_info["info"] = f"TCP {src_port} → {dst_port} [SYN: {pkt[TCP].flags.S}, ACK: {pkt[TCP].flags.A}, FIN: {pkt[TCP].flags.F}]"
-            elif UDP in pkt:
-                packet_info["protocol"] = "UDP"
-                src_port = pkt[UDP].sport
-                dst_port = pkt[UDP].dport
-                packet_info["info"] = f"UDP {src_port} → {dst_port} Len={len(pkt[UDP].payload)}"
-            else:
-                packet_info["protocol"] = "IP"
-                packet_info["info"] = f"IP Protocol: {pkt[IP].proto}"
-        
-        # If we couldn't determine protocol from IP, try other common protocols
-        elif 'ARP' in pkt:
-            packet_info["protocol"] = "ARP"
-            if hasattr(pkt.getlayer('ARP'), 'psrc') and hasattr(pkt.getlayer('ARP'), 'pdst'):
-                packet_info["source"] = pkt.getlayer('ARP').psrc
-                packet_info["destination"] = pkt.getlayer('ARP').pdst
-                packet_info["info"] = f"Who has {pkt.getlayer('ARP').pdst}? Tell {pkt.getlayer('ARP').psrc}"
-        elif 'IPv6' in pkt:
-            packet_info["protocol"] = "IPv6"
-            if hasattr(pkt.getlayer('IPv6'), 'src') and hasattr(pkt.getlayer('IPv6'), 'dst'):
-                packet_info["source"] = pkt.getlayer('IPv6').src
-                packet_info["destination"] = pkt.getlayer('IPv6').dst
-                packet_info["info"] = f"IPv6 {pkt.getlayer('IPv6').nh}"
-        
-        packet_list.append(packet_info)
-    
-    # Protocol distribution
-    for proto, count in sorted(overview['protocols'].items(), key=lambda x: x[1], reverse=True):
-        percentage = (count / total_packets) * 100
-        result["overview"]["Protocol"].append({
-            "name": proto,
-            "packets": count,
-            "percentage": percentage
-        })
-    
-    # Packet type distribution
-    for pkt_type, count in sorted(overview['packet_counts'].items(), key=lambda x: x[1], reverse=True):
-        percentage = (count / total_packets) * 100
-        result["overview"]["Packet"].append({
-            "name": pkt_type,
-            "packets": count,
-            "percentage": percentage
-        })
-    
-    # Top IP sources
-    if 'ip_stats' in overview and 'sources' in overview['ip_stats']:
-        for ip, count in sorted(overview['ip_stats']['sources'].items(), key=lambda x: x[1], reverse=True)[:10]:
-            percentage = (count / total_packets) * 100
-            result["overview"]["ip_stats"]["top_sources"].append({
-                "ip": ip,
-                "packets": count,
-                "percentage": percentage
-            })
-    
-    # Top IP destinations
-    if 'ip_stats' in overview and 'destinations' in overview['ip_stats']:
-        for ip, count in sorted(overview['ip_stats']['destinations'].items(), key=lambda x: x[1], reverse=True)[:10]:
-            percentage = (count / total_packets) * 100
-            result["overview"]["ip_stats"]["top_destinations"].append({
-                "ip": ip,
-                "packets": count,
-                "percentage": percentage
-            })
-    
-    # Top source ports
-    if 'port_stats' in overview and 'sources' in overview['port_stats']:
-        for port, count in sorted(overview['port_stats']['sources'].items(), key=lambda x: x[1], reverse=True)[:10]:
-            percentage = (count / total_packets) * 100
-            result["overview"]["port_stats"]["top_sources"].append({
-                "port": port,
-                "packets": count,
-                "percentage": percentage
-            })
-    
-    # Top destination ports
-    if 'port_stats' in overview and 'destinations' in overview['port_stats']:
-        for port, count in sorted(overview['port_stats']['destinations'].items(), key=lambda x: x[1], reverse=True)[:10]:
-            percentage = (count / total_packets) * 100
-            result["overview"]["port_stats"]["top_destinations"].append({
-                "port": port,
-                "packets": count,
-                "percentage": percentage
-            })
 
-    
-    # Perform analysis
+@overview_stages.stage("delay_categories", "delays")
+def _delay_categories_section(pa, _):
+    delay_categories = {}
+    for category, delays in pa.delay_categories.items():
+        if delays:
+            values = [d['delay'] for d in delays]
+            delay_categories[category] = {
+                "avg": float(np.mean(values)),
+                "max": float(max(values)),
+                "count": len(values)
+            }
+    return delay_categories
+
+
+@overview_stages.stage("latency", "delays")
+def _latency_section(pa, _):
+    return {proto: _series_summary(v) for proto, v in pa.latencies.items() if v}
+
+
+@overview_stages.stage("jitter", "delays")
+def _jitter_section(pa, _):
+    return {proto: _series_summary(v) for proto, v in pa.jitter_values.items() if v}
+
+
+@overview_stages.stage("packet_loss", "delays")
+def _packet_loss_section(pa, _):
+    return pa.calculate_packet_loss()
+
+
+@overview_stages.stage("iot_metrics", "delays")
+def _iot_metrics_section(pa, _):
+    return {
+        "bundle_sizes": pa.iot_metrics['bundle_sizes'],
+        "aggregation_intervals": pa.iot_metrics['aggregation_intervals'],
+        "device_patterns": {device: aggregate.summary()
+                            for device, aggregate in pa.iot_metrics['device_patterns'].items()}
+    }
+
+
+@overview_stages.stage("data_distribution", "delays")
+def _latency_distribution_section(pa, _):
+    return pa.get_latency_distribution()
+
+
+@overview_stages.stage("packet_size_distribution", "delays")
+def _packet_size_distribution_section(pa, _):
+    return pa.get_packet_size_distribution()
+
+
+@overview_stages.stage("latency_timeline", "delays")
+def _latency_timeline_section(pa, _):
+    return pa.get_latency_timeline()
+
+
+@overview_stages.stage("jitter_distribution", "delays")
+def _jitter_distribution_section(pa, _):
+    return pa.get_jitter_distribution()
+
+
+@overview_stages.stage("packets")
+def _packets_section(pa):
+    return packet_summaries(pa.get_packet_table(), pa.get_frame_numbers())
+
+
+def overview_sections(pa, sections=SECTION_ORDER):
+    """Yield (section, data) for each requested section as soon as it's ready
+
+    Sections run in SECTION_ORDER, each computing only the stages it needs
+    that haven't run yet. Overview sections come first. A failure in the
+    delay analysis is reported as an "error" section and ends the sequence,
+    keeping what was sent so far.
+    """
+    results = {}
+    for section in [s for s in SECTION_ORDER if s in sections]:
+        if section in OVERVIEW_SECTIONS:
+            yield section, overview_stages.compute(section, results, pa)
+            continue
+        try:
+            data = overview_stages.compute(section, results, pa)
+        except Exception as e:
+            print(f"Error during analysis: {e}")
+            # Continue with the data we have so far
+            yield "error", {"error": str(e)}
+            return
+        yield section, data
+
+
+def analysis_payload(pa, fields):
+    """analyzeOverview/upload payload holding only fields, laid out as the full payload"""
+    payload = {}
+    for group, names in (("overview", OVERVIEW_FIELDS), ("analysis", ANALYSIS_FIELDS)):
+        wanted = [f for f in names if f in fields]
+        if wanted:
+            payload[group] = {f: copy.deepcopy(EMPTY_FIELDS[f]) for f in wanted}
+    for f in TOP_LEVEL_FIELDS:
+        if f in fields:
+            payload[f] = copy.deepcopy(EMPTY_FIELDS[f])
+
+    for section, data in overview_sections(pa, sections_for(fields)):
+        for field, value in (data.items() if section in OVERVIEW_SECTIONS else [(section, data)]):
+            if field not in fields:
+                continue
+            if field in OVERVIEW_FIELDS:
+                payload["overview"][field] = value
+            elif field in ANALYSIS_FIELDS:
+                payload["analysis"][field] = value
+            elif field in TOP_LEVEL_FIELDS:
+                payload[field] = value
+    return payload
+
+
+# Seconds between progress events of /api/analyzeOverviewStream
+PROGRESS_INTERVAL = 0.5
+
+
+def overview_events(pcap_file, display_filter, sections):
+    """(event, data) pairs for the analyzeOverview stream
+
+    The analysis runs in a background thread and hands over each section as
+    it finishes. A progress event goes out every PROGRESS_INTERVAL seconds
+    with the stage ("parse", then "analysis"), bytes parsed so far and the
+    number of sections sent.
+    """
+    events = queue.Queue()
+    state = {"stage": "parse", "done": 0, "total": None}
+    started = time.monotonic()
+
+    def on_progress(stage, done, total):
+        state.update(stage=stage, done=done, total=total)
+
+    def run():
+        try:
+            pa = open_analyzer(pcap_file, display_filter, progress=on_progress)
+            state.update(stage="analysis", done=0, total=None)
+            for section, data in overview_sections(pa, sections):
+                events.put((section, data))
+        except Exception as e:
+            print(f"Error streaming analysis: {e}")
+            events.put(("error", {"error": str(e)}))
+        finally:
+            events.put(None)
+
+    threading.Thread(target=run, daemon=True).start()
+    sent = 0
+    last_progress = None
+    while True:
+        wait = PROGRESS_INTERVAL if last_progress is None else max(0.0, last_progress + PROGRESS_INTERVAL - time.monotonic())
+        try:
+            item = events.get(timeout=wait)
+        except queue.Empty:
+            item = False
+        if item is None:
+            yield "done", {"sections": sent, "elapsed": time.monotonic() - started}
+            return
+        if item:
+            section, data = item
+            sent += 1
+            yield ("error" if section == "error" else "section"), {"section": section, "data": data}
+        if last_progress is None or time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+            last_progress = time.monotonic()
+            yield "progress", dict(state, sections=sent, elapsed=last_progress - started)
+
+
+@app.route("/api/analyzeOverviewStream", methods=["GET"])
+def analyze_overview_stream():
+    pcap_file = request.args.get('pcap_file', "./pcapngFiles/28-1-25-bro-laptp-20ms.pcapng")
+    display_filter = request_filter()
+    fields = request_fields(OVERVIEW_FIELDS + ANALYSIS_FIELDS)
+    if not os.path.exists(pcap_file):
+        return jsonify({"error": "PCAP file not found"}), 404
+    if request.args.get('packets', 'false').lower() == 'true':
+        fields += ("packets",)
+    return event_stream(overview_events(pcap_file, display_filter, sections_for(fields)))
+
+
+EXPORT_MIMETYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+
+
+@app.route("/api/exportCapture", methods=["GET"])
+def export_capture():
+    pcap_file = request.args.get('pcap_file', "./pcapngFiles/28-1-25-bro-laptp-20ms.pcapng")
+    export_format = request.args.get('export_format', 'parquet').lower()
+
+    if export_format not in EXPORT_MIMETYPES:
+        return jsonify({"error": "export_format must be one of: " + ", ".join(EXPORT_MIMETYPES)}), 400
+    display_filter = request_filter()
+    if not os.path.exists(pcap_file):
+        return jsonify({"error": "PCAP file not found"}), 404
+
     try:
-        pa.analyze_delays()
-        
-        # Add delay categories if available
-        if hasattr(pa, 'delay_categories'):
-            for category, delays in pa.delay_categories.items():
-                if delays:
-                    values = [d['delay'] for d in delays]
-                    result["analysis"]["delay_categories"][category] = {
-                        "avg": float(np.mean(values)),
-                        "max": float(max(values)),
-                        "count": len(values)
-                    }
-        
-        # Add latency statistics
-        if hasattr(pa, 'latencies'):
-            for proto in pa.latencies:
-                if pa.latencies[proto]:
-                    result["analysis"]["latency"][proto] = {
-                        "avg": float(np.mean(pa.latencies[proto])),
-                        "max": float(max(pa.latencies[proto])),
-                        "min": float(min(pa.latencies[proto])),
-                        "std": float(np.std(pa.latencies[proto])),
-                        "count": len(pa.latencies[proto])
-                    }
-        
-        # Add jitter statistics
-        if hasattr(pa, 'jitter_values'):
-            for proto in pa.jitter_values:
-                if pa.jitter_values[proto]:
-                    result["analysis"]["jitter"][proto] = {
-                        "avg": float(np.mean(pa.jitter_values[proto])),
-                        "max": float(max(pa.jitter_values[proto])),
-                        "min": float(min(pa.jitter_values[proto])),
-                        "std": float(np.std(pa.jitter_values[proto])),
-                        "count": len(pa.jitter_values[proto])
-                    }
-        
-        # Add packet loss statistics
-        if hasattr(pa, 'calculate_packet_loss'):
-            loss_stats = pa.calculate_packet_loss()
-            result["analysis"]["packet_loss"] = loss_stats
-        
-        # Add IoT metrics
-        if hasattr(pa, 'iot_metrics'):
-            # Bundle sizes
-            if pa.iot_metrics.get('bundle_sizes'):
-                result["analysis"]["iot_metrics"]["bundle_sizes"] = pa.iot_metrics['bundle_sizes']
-            
-            # Aggregation intervals
-            if pa.iot_metrics.get('aggregation_intervals'):
-                result["analysis"]["iot_metrics"]["aggregation_intervals"] = pa.iot_metrics['aggregation_intervals']
-            
-            # Device patterns
-            if pa.iot_metrics.get('device_patterns'):
-                for device, patterns in pa.iot_metrics['device_patterns'].items():
-                    small_pkts = sum(1 for p in patterns if p.get('type') == 'small')
-                    bundle_pkts = sum(1 for p in patterns if p.get('type') == 'bundle')
-                    result["analysis"]["iot_metrics"]["device_patterns"][device] = {
-                        "small_packets": small_pkts,
-                        "bundled_packets": bundle_pkts,
-                        "total": small_pkts + bundle_pkts
-                    }
-            
-            result["packets"] = packet_list
-        
+        pa = open_analyzer(pcap_file, display_filter)
+        with tempfile.NamedTemporaryFile(suffix=f".{export_format}", delete=False) as temp:
+            temp_path = temp.name
+        pa.export_columnar(temp_path)
+        with open(temp_path, "rb") as f:
+            data = f.read()
+        os.unlink(temp_path)
 
+        name = os.path.splitext(os.path.basename(pcap_file))[0]
+        return send_file(io.BytesIO(data), mimetype=EXPORT_MIMETYPES[export_format],
+                         as_attachment=True, download_name=f"{name}.{export_format}")
     except Exception as e:
-        print(f"Error during analysis: {e}")
-        # Continue with the data we have so far
-    
-    return jsonify(result)
+        print(f"Error exporting capture: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/delayCorrelation", methods=["GET"])
+def delay_correlation():
+    pcap_file = request.args.get('pcap_file', "./pcapngFiles/28-1-25-bro-laptp-20ms.pcapng")
+    try:
+        time_bucket = float(request.args.get('time_bucket', 10.0))
+    except ValueError:
+        return jsonify({"error": "time_bucket must be a number"}), 400
+    if time_bucket <= 0:
+        return jsonify({"error": "time_bucket must be positive"}), 400
+
+    display_filter = request_filter()
+    if not os.path.exists(pcap_file):
+        return jsonify({"error": "PCAP file not found"}), 404
+
+    etag = capture_etag(pcap_file)
+    if etag_matches(etag):
+        return not_modified(etag)
+    try:
+        data = shared_result(f"delayCorrelation:{time_bucket}:{display_filter or ''}", pcap_file,
+                             lambda: open_analyzer(pcap_file, display_filter).get_delay_correlations(time_bucket=time_bucket))
+        return encode_response({"status": "success", "data": data}, etag=etag)
+    except Exception as e:
+        print(f"Error computing delay correlation: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/mqttTiming", methods=["GET"])
+def mqtt_timing():
+    pcap_file = request.args.get('pcap_file', "./pcapngFiles/28-1-25-bro-laptp-20ms.pcapng")
+    try:
+        max_messages = int(request.args.get('messages', MAX_MESSAGES))
+    except ValueError:
+        return jsonify({"error": "messages must be an integer"}), 400
+    if max_messages < 0:
+        return jsonify({"error": "messages must not be negative"}), 400
+
+    display_filter = request_filter()
+    if not os.path.exists(pcap_file):
+        return jsonify({"error": "PCAP file not found"}), 404
+    if is_columnar_file(pcap_file):
+        return jsonify({"error": "MQTT timing needs the original capture, columnar files only keep headers"}), 400
+
+    etag = capture_etag(pcap_file)
+    if etag_matches(etag):
+        return not_modified(etag)
+    try:
+        data = shared_result(f"mqttTiming:{max_messages}:{display_filter or ''}", pcap_file,
+                             lambda: open_analyzer(pcap_file, display_filter).get_mqtt_timing(max_messages=max_messages))
+        return encode_response({"status": "success", "data": data}, etag=etag)
+    except Exception as e:
+        print(f"Error computing MQTT timing: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/latencyHistograms", methods=["GET", "POST"])
+def latency_histograms():
+    # GET: repeat pcap_file (?pcap_file=a&pcap_file=b), POST: {"pcap_files": [...], "histograms": [...]}
+    if request.method == "POST":
+        body = request.get_json(silent=True) or {}
+        pcap_files = body.get("pcap_files") or []
+        extra = body.get("histograms") or []
+        digits = body.get("digits", SIGNIFICANT_DIGITS)
+        percentiles = body.get("percentiles", HISTOGRAM_PERCENTILES)
+        display_filter = compile_filter(body.get("filter"))
+    else:
+        pcap_files = request.args.getlist('pcap_file')
+        extra = []
+        digits = request.args.get('digits', SIGNIFICANT_DIGITS)
+        percentiles = request.args.get('percentiles')
+        percentiles = percentiles.split(",") if percentiles else HISTOGRAM_PERCENTILES
+        display_filter = request_filter()
+    pcap_files = pcap_files or DEFAULT_SWEEP
+    if not isinstance(pcap_files, list) or not all(isinstance(f, str) for f in pcap_files):
+        return jsonify({"error": "pcap_files must be a list of paths"}), 400
+    if not isinstance(percentiles, (list, tuple)):
+        return jsonify({"error": "percentiles must be a list of numbers"}), 400
+
+    try:
+        digits = int(digits)
+        percentiles = [float(p) for p in percentiles]
+    except (TypeError, ValueError):
+        return jsonify({"error": "digits must be an integer and percentiles numbers"}), 400
+    if not MIN_DIGITS <= digits <= MAX_DIGITS:
+        return jsonify({"error": f"digits must be between {MIN_DIGITS} and {MAX_DIGITS}"}), 400
+    if not all(0 <= p <= 100 for p in percentiles):
+        return jsonify({"error": "percentiles must be between 0 and 100"}), 400
+    if not isinstance(extra, list) or not all(isinstance(h, dict) and all(isinstance(v, dict) for v in h.values())
+                                              for h in extra):
+        return jsonify({"error": "histograms must be a list of {group: {name: histogram}} objects"}), 400
+
+    missing = [f for f in pcap_files if not os.path.exists(f)]
+    if missing:
+        return jsonify({"error": "PCAP file not found", "missing": missing}), 404
+
+    try:
+        results = [shared_result(f"latencyHistograms:{digits}:{display_filter or ''}", f,
+                                 lambda f=f: open_analyzer(f, display_filter).get_latency_histograms(digits))
+                   for f in pcap_files]
+        merged = merge_groups(results + extra, percentiles=percentiles)
+        return encode_response({"status": "success", "captures": pcap_files, "data": merged})
+    except HistogramError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error building latency histograms: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/analysisSummary", methods=["GET"])
+def analysis_summary():
+    pcap_file = request.args.get('pcap_file', "./pcapngFiles/28-1-25-bro-laptp-20ms.pcapng")
+    model = request.args.get('model', DEFAULT_MODEL)
+    try:
+        max_tokens = int(request.args.get('max_tokens', SUMMARY_MAX_TOKENS))
+    except ValueError:
+        return jsonify({"error": "max_tokens must be an integer"}), 400
+    if max_tokens < 1:
+        return jsonify({"error": "max_tokens must be positive"}), 400
+
+    display_filter = request_filter()
+    if not os.path.exists(pcap_file):
+        return jsonify({"error": "PCAP file not found"}), 404
+
+    # Same analysis (and cache entry) as /api/analyzeOverview?fields=... without the packet rows
+    fields = OVERVIEW_FIELDS + ANALYSIS_FIELDS
+    try:
+        result = shared_result(f"analyzeOverview:{display_filter or ''}:{','.join(fields)}", pcap_file,
+                               lambda: overview_analysis(pcap_file, display_filter, fields))
+        summary = summary_service.summarize(result, model=model, max_tokens=max_tokens)
+        return encode_response({"status": "success", "data": summary})
+    except SummaryTimeout as e:
+        return jsonify({"error": str(e)}), 504
+    except SummaryError as e:
+        print(f"Error summarizing analysis: {str(e)}")
+        return jsonify({"error": str(e)}), 502
+    except Exception as e:
+        print(f"Error summarizing analysis: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+def _store_range():
+    """(start, end) epoch seconds of a stored* query, from start/end or the last `days` days
+
+    Raises ValueError for values that aren't finite numbers and for negative days.
+    """
+    start, end, days = (request.args.get(name) for name in ('start', 'end', 'days'))
+    start, end, days = (None if v is None else float(v) for v in (start, end, days))
+    if not all(v is None or np.isfinite(v) for v in (start, end, days)):
+        raise ValueError("non-finite range")
+    if days is not None:
+        if days < 0:
+            raise ValueError("negative days")
+        start = time.time() - days * 86400
+    return start, end
+
+
+@app.route("/api/storedCaptures", methods=["GET"])
+def stored_captures():
+    if analytics_store is None:
+        return jsonify({"error": "Analytics store is not configured (set ANALYTICS_DB)"}), 503
+    try:
+        capture_id = request.args.get('id')
+        if capture_id is not None:
+            summary = analytics_store.capture_summary(int(capture_id))
+            if summary is None:
+                return jsonify({"error": "Capture not found"}), 404
+            return encode_response({"status": "success", "data": summary})
+        start, end = _store_range()
+    except ValueError:
+        return jsonify({"error": "id must be an integer, start and end finite numbers and days a non-negative number"}), 400
+    return encode_response({"status": "success", "data": analytics_store.captures(start, end)})
+
+
+@app.route("/api/storedProtocolStats", methods=["GET"])
+def stored_protocol_stats():
+    if analytics_store is None:
+        return jsonify({"error": "Analytics store is not configured (set ANALYTICS_DB)"}), 503
+    try:
+        start, end = _store_range()
+    except ValueError:
+        return jsonify({"error": "start and end must be finite numbers and days a non-negative number"}), 400
+    data = analytics_store.protocol_stats(start, end, protocol=request.args.get('protocol'))
+    return encode_response({"status": "success", "data": data})
+
+
+@app.route("/api/storedLatency", methods=["GET"])
+def stored_latency():
+    if analytics_store is None:
+        return jsonify({"error": "Analytics store is not configured (set ANALYTICS_DB)"}), 503
+    try:
+        start, end = _store_range()
+        percentiles = request.args.get('percentiles')
+        percentiles = [float(p) for p in percentiles.split(",")] if percentiles else STORE_PERCENTILES
+    except ValueError:
+        return jsonify({"error": "start, end and percentiles must be finite numbers and days a non-negative number"}), 400
+    if not all(0 <= p <= 100 for p in percentiles):
+        return jsonify({"error": "percentiles must be between 0 and 100"}), 400
+    metric = f"{request.args.get('metric', 'latency')}_ms"
+    try:
+        data = analytics_store.metric_percentiles(metric, protocol=request.args.get('protocol'),
+                                                  start=start, end=end, percentiles=percentiles)
+    except StoreError as e:
+        return jsonify({"error": str(e)}), 400
+    return encode_response({"status": "success", "data": data})
+
+
+@app.route("/api/timeRollups", methods=["GET"])
+def time_rollups():
+    pcap_file = request.args.get('pcap_file', "./pcapngFiles/28-1-25-bro-laptp-20ms.pcapng")
+    protocol = request.args.get('protocol', ALL_PROTOCOLS)
+    try:
+        start = request.args.get('start', type=float)
+        end = request.args.get('end', type=float)
+        max_buckets = int(request.args.get('max_buckets', MAX_BUCKETS))
+    except ValueError:
+        return jsonify({"error": "max_buckets must be an integer"}), 400
+    if max_buckets < 1:
+        return jsonify({"error": "max_buckets must be positive"}), 400
+
+    display_filter = request_filter()
+    if not os.path.exists(pcap_file):
+        return jsonify({"error": "PCAP file not found"}), 404
+
+    etag = capture_etag(pcap_file)
+    if etag_matches(etag):
+        return not_modified(etag)
+    try:
+        # The pyramid is built once per capture, zoom requests only slice it
+        key = f"rollups:{display_filter or ''}"
+        pyramid = capture_cache.get(key, pcap_file, lambda: RollupPyramid.from_arrays(shared_result(
+            key, pcap_file, lambda: open_analyzer(pcap_file, display_filter).get_rollups().to_arrays(), arrays=True)))
+        if protocol not in pyramid.levels:
+            return jsonify({"error": f"Unknown protocol {protocol}", "protocols": pyramid.protocols}), 400
+        data = pyramid.query(start, end, protocol=protocol, max_buckets=max_buckets)
+        data["protocols"] = pyramid.protocols
+        return encode_response({"status": "success", "data": data}, etag=etag)
+    except Exception as e:
+        print(f"Error building time rollups: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/compareCaptures", methods=["GET", "POST"])
+def compare_captures_endpoint():
+    # GET: repeat pcap_file (?pcap_file=a&pcap_file=b), POST: {"pcap_files": [...]}
+    if request.method == "POST":
+        body = request.get_json(silent=True) or {}
+        pcap_files = body.get("pcap_files") or []
+        grid_points = body.get("grid_points", 200)
+        display_filter = compile_filter(body.get("filter"))
+    else:
+        pcap_files = request.args.getlist('pcap_file')
+        grid_points = request.args.get('grid_points', 200)
+        display_filter = request_filter()
+    pcap_files = pcap_files or DEFAULT_SWEEP
+    if not isinstance(pcap_files, list) or not all(isinstance(f, str) for f in pcap_files):
+        return jsonify({"error": "pcap_files must be a list of paths"}), 400
+    if len({os.path.realpath(f) for f in pcap_files}) != len(pcap_files):
+        return jsonify({"error": "Each capture can only be compared once"}), 400
+
+    try:
+        grid_points = int(grid_points)
+    except (TypeError, ValueError):
+        return jsonify({"error": "grid_points must be an integer"}), 400
+    if not 2 <= grid_points <= 2000:
+        return jsonify({"error": "grid_points must be between 2 and 2000"}), 400
+
+    missing = [f for f in pcap_files if not os.path.exists(f)]
+    if missing:
+        return jsonify({"error": "PCAP file not found", "missing": missing}), 404
+
+    try:
+        return encode_response(compare_captures(pcap_files, grid_points=grid_points, reader=PCAP_READER,
+                                                display_filter=display_filter and str(display_filter),
+                                                store_dir=CAPTURE_STORE_DIR))
+    except Exception as e:
+        print(f"Error comparing captures: {str(e)}")
+        return jsonify({"error": str(e)}), 500
 
 
 @app.route("/api/data", methods=["GET"])
@@ -0,0 +1,289 @@
+import struct
+from collections import Counter, defaultdict
+import numpy as np
+from tcp_stream import TcpReassembler, TCP_FIN, TCP_RST
+
+# Broker ports, plain MQTT and the port usually meant for MQTT over TLS (which some brokers serve in clear)
+MQTT_PORTS = (1883, 8883)
+
+MQTT_PACKET_TYPES = {
+    1: "CONNECT", 2: "CONNACK", 3: "PUBLISH", 4: "PUBACK", 5: "PUBREC", 6: "PUBREL", 7: "PUBCOMP",
+    8: "SUBSCRIBE", 9: "SUBACK", 10: "UNSUBSCRIBE", 11: "UNSUBACK", 12: "PINGREQ", 13: "PINGRESP",
+    14: "DISCONNECT", 15: "AUTH",
+}
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC = 1, 2, 3, 4, 5
+# Fixed-header flags required by every type but PUBLISH (the rest must be 0)
+REQUIRED_FLAGS = {6: 2, 8: 2, 10: 2}
+# Types whose variable header starts with a packet identifier
+PACKET_ID_TYPES = (4, 5, 6, 7, 8, 9, 10, 11)
+# Acknowledgement ending a PUBLISH of each QoS (PUBREC is the first step of the QoS 2 handshake)
+PUBLISH_ACKS = {1: PUBACK, 2: PUBREC}
+
+# Leading bytes of a message kept for its variable header, the rest of a large PUBLISH is skipped unbuffered
+MAX_HEADER_BYTES = 4096
+# Message records returned by summarize_mqtt, 0 for all
+MAX_MESSAGES = 1000
+
+PERCENTILES = (50, 95, 99)
+
+_u16 = struct.Struct("!H").unpack_from
+
+
+def _varint(data, pos):
+    """(value, next position) of an MQTT variable byte integer, value None when data ends first"""
+    value = 0
+    for shift in range(0, 28, 7):
+        if pos >= len(data):
+            return None, pos
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+    raise ValueError("variable byte integer longer than 4 bytes")
+
+
+def _string(body, pos):
+    n = _u16(body, pos)[0]
+    return bytes(body[pos + 2:pos + 2 + n]).decode("utf-8", "replace"), pos + 2 + n
+
+
+class MqttStream:
+    """Incremental parser for one direction of an MQTT connection
+
+    Bytes are fed as they come out of the TCP reassembler. Only the fixed
+    header and the first max_header bytes of each message are kept, so a
+    stream is parsed in constant memory however large its PUBLISH payloads.
+    Until a message parses the stream counts as unsynchronized (capture
+    started mid-connection, bytes lost, or not MQTT at all e.g. TLS) and
+    each chunk is tried as the start of a message.
+    """
+
+    def __init__(self, max_header=MAX_HEADER_BYTES):
+        self.max_header = max_header
+        self.synced = False
+        self._reset()
+
+    def _reset(self):
+        self._fixed = bytearray()
+        self._type = None
+        self._left = 0
+        self._size = 0
+        self._body = bytearray()
+
+    def feed(self, data):
+        """(type, flags, size, body) of every message data completes, body truncated to max_header bytes
+
+        data None means bytes were lost, dropping the message in progress.
+        """
+        if data is None:
+            self._reset()
+            self.synced = False
+            return []
+        messages = []
+        view = memoryview(data)
+        pos = 0
+        end = len(view)
+        while True:
+            if self._type is None:
+                if pos >= end:
+                    break
+                pos = self._read_fixed_header(view, pos)
+                if pos is None:
+                    # Not a message boundary, drop the rest of the chunk and retry on the next one
+                    self._reset()
+                    self.synced = False
+                    break
+                if self._type is None:
+                    break
+            n = min(self._left, end - pos)
+            keep = min(n, self.max_header - len(self._body))
+            if keep > 0:
+                self._body += view[pos:pos + keep]
+            self._left -= n
+            pos += n
+            if self._left:
+                break
+            messages.append((self._type, self._flags, self._size, bytes(self._body)))
+            self.synced = True
+            self._reset()
+        return messages
+
+    def _read_fixed_header(self, view, pos):
+        """Consume fixed-header bytes, returns the next position or None when they aren't valid MQTT"""
+        while pos < len(view) and len(self._fixed) < 5:
+            self._fixed.append(view[pos])
+            pos += 1
+            if len(self._fixed) < 2:
+                continue
+            try:
+                remaining, header_len = _varint(self._fixed, 1)
+            except ValueError:
+                return None
+            if remaining is None:
+                continue
+            packet_type, flags = self._fixed[0] >> 4, self._fixed[0] & 0x0F
+            if packet_type not in MQTT_PACKET_TYPES:
+                return None
+            if not self.synced and remaining > self.max_header:
+                # Don't let a misread length swallow the stream before we know where messages start
+                return None
+            if packet_type == PUBLISH:
+                if (flags >> 1) & 3 == 3:
+                    return None
+            elif flags != REQUIRED_FLAGS.get(packet_type, 0):
+                return None
+            self._type, self._flags = packet_type, flags
+            self._left = remaining
+            self._size = header_len + remaining
+            return pos
+        return pos
+
+
+def message_record(packet_type, flags, size, body):
+    """JSON-friendly fields of one message, raises ValueError for a truncated variable header"""
+    record = {"type": MQTT_PACKET_TYPES[packet_type], "size": size}
+    try:
+        if packet_type == PUBLISH:
+            qos = (flags >> 1) & 3
+            record["topic"], pos = _string(body, 0)
+            record["qos"] = qos
+            record["retain"] = bool(flags & 1)
+            record["dup"] = bool(flags & 8)
+            if qos:
+                record["packet_id"] = _u16(body, pos)[0]
+        elif packet_type == CONNECT:
+            record["protocol"], pos = _string(body, 0)
+            record["protocol_level"] = body[pos]
+            pos += 4  # level, connect flags, keep alive
+            if record["protocol_level"] >= 5:
+                properties, pos = _varint(body, pos)
+                pos += properties
+            record["client_id"], _ = _string(body, pos)
+        elif packet_type == CONNACK:
+            record["return_code"] = body[1]
+        elif packet_type in PACKET_ID_TYPES:
+            record["packet_id"] = _u16(body, 0)[0]
+    except (struct.error, IndexError, TypeError) as e:
+        raise ValueError(f"Truncated {record['type']}") from e
+    return record
+
+
+def _endpoint(addr, port):
+    return f"[{addr}]:{port}" if ":" in addr else f"{addr}:{port}"
+
+
+def mqtt_messages(segments, ports=MQTT_PORTS, max_header=MAX_HEADER_BYTES):
+    """Reassemble TCP segments and parse them as MQTT, yielding one record per message
+
+    segments yields (time, src, sport, dst, dport, seq, flags, payload) in
+    capture order. Connections are keyed with the broker on the side whose
+    port is in ports. Each record carries time (when its last byte arrived),
+    client, broker and from_client besides the message fields.
+    """
+    reassembler = TcpReassembler()
+    streams = {}
+    for time, src, sport, dst, dport, seq, flags, payload in segments:
+        from_client = dport in ports
+        if from_client:
+            client, broker = _endpoint(src, sport), _endpoint(dst, dport)
+        else:
+            client, broker = _endpoint(dst, dport), _endpoint(src, sport)
+        key = (client, broker, from_client)
+        for chunk_time, data in reassembler.feed(key, time, seq, flags, payload):
+            stream = streams.get(key)
+            if stream is None:
+                stream = streams[key] = MqttStream(max_header)
+            for packet_type, msg_flags, size, body in stream.feed(data):
+                try:
+                    record = message_record(packet_type, msg_flags, size, body)
+                except ValueError:
+                    continue
+                record.update(time=chunk_time, client=client, broker=broker, from_client=from_client)
+                yield record
+        if flags & (TCP_FIN | TCP_RST):
+            # The reassembler forgot the direction, so does the parser
+            streams.pop(key, None)
+
+
+def _latency_stats(values):
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return {"count": 0, "mean_ms": None, "min_ms": None, "max_ms": None,
+                **{f"p{p}_ms": None for p in PERCENTILES}}
+    stats = {"count": len(values), "mean_ms": float(values.mean()),
+             "min_ms": float(values.min()), "max_ms": float(values.max())}
+    for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        stats[f"p{p}_ms"] = float(v)
+    return stats
+
+
+def summarize_mqtt(messages, max_messages=MAX_MESSAGES):
+    """Message counts and PUBLISH→acknowledgement latency per topic and device
+
+    A QoS 1 PUBLISH is matched with the PUBACK (QoS 2: PUBREC) carrying its
+    packet id in the other direction of the same connection. The device is the
+    client id from the connection's CONNECT, or the client address when the
+    capture missed it. messages is consumed once; only the first max_messages
+    records are kept (all of them with 0).
+    """
+    counts = Counter()
+    connections = set()
+    client_ids = {}
+    pending = {}
+    per_topic = defaultdict(lambda: {"publishes": 0, "qos": Counter(), "latencies": []})
+    records = []
+    total = 0
+    unmatched_acks = 0
+
+    for record in messages:
+        total += 1
+        if not max_messages or len(records) < max_messages:
+            records.append(record)
+        kind = record["type"]
+        counts[kind] += 1
+        connection = (record["client"], record["broker"])
+        connections.add(connection)
+        if kind == "CONNECT":
+            client_ids[connection] = record["client_id"]
+        elif kind == "PUBLISH":
+            device = client_ids.get(connection) or record["client"].rsplit(":", 1)[0].strip("[]")
+            entry = per_topic[(record["topic"], device, record["from_client"])]
+            entry["publishes"] += 1
+            entry["qos"][record["qos"]] += 1
+            if record["qos"]:
+                pending[(connection, record["from_client"], record["packet_id"])] = (
+                    record["time"], PUBLISH_ACKS[record["qos"]], entry)
+        elif kind in ("PUBACK", "PUBREC"):
+            key = (connection, not record["from_client"], record["packet_id"])
+            waiting = pending.get(key)
+            if waiting is None or MQTT_PACKET_TYPES[waiting[1]] != kind:
+                unmatched_acks += 1
+                continue
+            del pending[key]
+            sent, _, entry = waiting
+            entry["latencies"].append((record["time"] - sent) * 1000)
+
+    publish_latency = []
+    for (topic, device, from_client), entry in per_topic.items():
+        publish_latency.append({
+            "topic": topic,
+            "device": device,
+            # Published by the device, or delivered to it as a subscriber
+            "direction": "publish" if from_client else "deliver",
+            "publishes": entry["publishes"],
+            "qos": {str(q): n for q, n in sorted(entry["qos"].items())},
+            "acknowledged": len(entry["latencies"]),
+            "latency": _latency_stats(entry["latencies"]),
+        })
+    all_latencies = [v for entry in per_topic.values() for v in entry["latencies"]]
+    return {
+        "total_messages": total,
+        "message_types": dict(counts),
+        "connections": len(connections),
+        "unacknowledged": len(pending),
+        "unmatched_acks": unmatched_acks,
+        "publish_latency": publish_latency,
+        "overall_latency": _latency_stats(all_latencies),
+        "messages": records,
+    }
@@ -0,0 +1,433 @@
+from collections.abc import Sequence
+from datetime import datetime
+import numpy as np
+from scapy.all import IP, TCP, UDP, ARP, IPv6, LLC
+from scapy.layers.inet6 import _IPv6ExtHdr
+
+# Network layer codes stored in PacketTable.l3
+L3_OTHER = 0
+L3_IPV4 = 1
+L3_ARP = 2
+L3_IPV6 = 3
+L3_LLC = 4
+
+# Transport layer codes stored in PacketTable.l4 (same numbers as the IP protocol field)
+L4_NONE = 0
+L4_TCP = 6
+L4_UDP = 17
+
+TCP_FLAG_FIN = 0x01
+TCP_FLAG_SYN = 0x02
+TCP_FLAG_RST = 0x04
+TCP_FLAG_PSH = 0x08
+TCP_FLAG_ACK = 0x10
+TCP_FLAG_URG = 0x20
+
+# Service detection tables, checked in order
+TCP_SERVICES = (
+    ("MQTT", (1883, 8883)),
+    ("HTTP", (80, 8080)),
+    ("HTTPS", (443,)),
+    ("FTP", (20, 21)),
+    ("SSH", (22,)),
+    ("SMTP", (25,)),
+    ("DNS-TCP", (53,)),
+    ("Telnet", (23,)),
+)
+UDP_SERVICES = (
+    ("DNS", (53,)),
+    ("DHCP", (67, 68)),
+    ("SNMP", (161,)),
+    ("NTP", (123,)),
+    ("TFTP", (69,)),
+)
+IP_PROTOCOLS = (
+    ("ICMP", 1),
+    ("IGMP", 2),
+    ("ESP", 50),
+    ("AH", 51),
+    ("OSPF", 89),
+    ("PIM", 103),
+)
+
+PROTOCOL_NAMES = (
+    ("Other",)
+    + tuple(name for name, _ in TCP_SERVICES) + ("TCP",)
+    + tuple(name for name, _ in UDP_SERVICES) + ("UDP",)
+    + tuple(name for name, _ in IP_PROTOCOLS)
+    + ("ARP", "IPv6", "LLC")
+)
+PROTOCOL_CODES = {name: code for code, name in enumerate(PROTOCOL_NAMES)}
+
+
+class PacketTable:
+    """Decoded header fields of a capture, one numpy array per field
+
+    Addresses are dictionary encoded: src/dst hold indexes into `addresses`,
+    where index 0 is the empty string for packets without an address. Ports,
+    ip_proto are -1 when the packet doesn't have them.
+    """
+
+    COLUMNS = (
+        ("time", np.float64),
+        ("length", np.int32),
+        ("l3", np.uint8),
+        ("l4", np.uint8),
+        ("ip_proto", np.int16),
+        ("src", np.int32),
+        ("dst", np.int32),
+        ("sport", np.int32),
+        ("dport", np.int32),
+        ("seq", np.uint32),
+        ("ack", np.uint32),
+        ("tcp_flags", np.uint16),
+        ("window", np.uint16),
+        ("payload_len", np.int32),
+    )
+
+    def __init__(self, columns, addresses):
+        for name, dtype in self.COLUMNS:
+            setattr(self, name, np.asarray(columns[name], dtype=dtype))
+        self.addresses = np.asarray(addresses, dtype=object)
+
+    def __len__(self):
+        return len(self.time)
+
+    @classmethod
+    def empty(cls, n):
+        columns = {name: np.zeros(n, dtype=dtype) for name, dtype in cls.COLUMNS}
+        for name in ("ip_proto", "sport", "dport"):
+            columns[name][:] = -1
+        return cls(columns, [""])
+
+    @classmethod
+    def from_packets(cls, packets):
+        """Decode scapy packets into a table with a single pass over the layers"""
+        table = cls.empty(len(packets))
+        addresses = [""]
+        address_index = {"": 0}
+
+        def encode(addr):
+            code = address_index.get(addr)
+            if code is None:
+                code = address_index[addr] = len(addresses)
+                addresses.append(addr)
+            return code
+
+        for i, pkt in enumerate(packets):
+            table.time[i] = float(pkt.time)
+            table.length[i] = len(pkt)
+
+            ip = pkt.getlayer(IP)
+            if ip is not None:
+                table.l3[i] = L3_IPV4
+                table.ip_proto[i] = ip.proto
+                table.src[i] = encode(ip.src)
+                table.dst[i] = encode(ip.dst)
+            elif pkt.haslayer(ARP):
+                arp = pkt[ARP]
+                table.l3[i] = L3_ARP
+                table.src[i] = encode(str(arp.psrc))
+                table.dst[i] = encode(str(arp.pdst))
+                continue
+            elif pkt.haslayer(IPv6):
+                ip6 = pkt[IPv6]
+                table.l3[i] = L3_IPV6
+                # Upper-layer protocol, past any extension headers
+                nh = ip6.nh
+                layer = ip6.payload
+                while isinstance(layer, _IPv6ExtHdr):
+                    nh = layer.nh
+                    layer = layer.payload
+                table.ip_proto[i] = nh
+                table.src[i] = encode(ip6.src)
+                table.dst[i] = encode(ip6.dst)
+            elif pkt.haslayer(LLC):
+                table.l3[i] = L3_LLC
+                continue
+            else:
+                continue
+
+            tcp = pkt.getlayer(TCP)
+            if tcp is not None:
+                table.l4[i] = L4_TCP
+                table.sport[i] = tcp.sport
+                table.dport[i] = tcp.dport
+                table.seq[i] = tcp.seq
+                table.ack[i] = tcp.ack
+                table.tcp_flags[i] = int(tcp.flags)
+                table.window[i] = tcp.window
+                table.payload_len[i] = len(tcp.payload)
+                continue
+
+            udp = pkt.getlayer(UDP)
+            if udp is not None:
+                table.l4[i] = L4_UDP
+                table.sport[i] = udp.sport
+                table.dport[i] = udp.dport
+                table.payload_len[i] = len(udp.payload)
+
+        table.addresses = np.asarray(addresses, dtype=object)
+        return table
+
+    @classmethod
+    def from_frames(cls, frames):
+        """Decode raw frames (e.g. from PcapngReader) without building scapy packets"""
+        from decoder import decode_frame  # decoder imports the layer codes from this module
+
+        times = []
+        lengths = []
+        rows = []
+        for frame in frames:
+            times.append(frame.timestamp)
+            lengths.append(len(frame.data))
+            rows.append(decode_frame(frame.linktype, frame.data))
+
+        table = cls.empty(len(rows))
+        table.time[:] = times
+        table.length[:] = lengths
+        if not rows:
+            return table
+
+        (l3, l4, ip_proto, src, dst, sport, dport, seq, ack, tcp_flags, window, payload_len) = zip(*rows)
+        addresses = [""]
+        address_index = {"": 0}
+        for column, values in (("src", src), ("dst", dst)):
+            codes = getattr(table, column)
+            for i, addr in enumerate(values):
+                code = address_index.get(addr)
+                if code is None:
+                    code = address_index[addr] = len(addresses)
+                    addresses.append(addr)
+                codes[i] = code
+        for name, values in (("l3", l3), ("l4", l4), ("ip_proto", ip_proto), ("sport", sport),
+                             ("dport", dport), ("seq", seq), ("ack", ack), ("tcp_flags", tcp_flags),
+                             ("window", window), ("payload_len", payload_len)):
+            getattr(table, name)[:] = values
+        table.addresses = np.asarray(addresses, dtype=object)
+        return table
+
+    def take(self, indices):
+        """Return a new table with the selected rows (index array or boolean mask)"""
+        columns = {name: getattr(self, name)[indices] for name, _ in self.COLUMNS}
+        return PacketTable(columns, self.addresses)
+
+    def source_addresses(self):
+        return self.addresses[self.src]
+
+    def destination_addresses(self):
+        return self.addresses[self.dst]
+
+
+def ip_mask(table):
+    """IPv4 and IPv6 packets, the ones whose TCP/UDP headers feed flow, latency and loss analysis"""
+    return (table.l3 == L3_IPV4) | (table.l3 == L3_IPV6)
+
+
+def classify_protocols(table):
+    """Protocol of every packet (service by port for TCP/UDP over IPv4 or IPv6), codes into PROTOCOL_NAMES"""
+    ipv4 = table.l3 == L3_IPV4
+    ip = ip_mask(table)
+    tcp = ip & (table.l4 == L4_TCP)
+    udp = ip & (table.l4 == L4_UDP)
+    conditions = []
+    choices = []
+
+    def on_ports(mask, ports):
+        return mask & (np.isin(table.sport, ports) | np.isin(table.dport, ports))
+
+    for name, ports in TCP_SERVICES:
+        conditions.append(on_ports(tcp, ports))
+        choices.append(PROTOCOL_CODES[name])
+    conditions.append(tcp)
+    choices.append(PROTOCOL_CODES["TCP"])
+    for name, ports in UDP_SERVICES:
+        conditions.append(on_ports(udp, ports))
+        choices.append(PROTOCOL_CODES[name])
+    conditions.append(udp)
+    choices.append(PROTOCOL_CODES["UDP"])
+    for name, number in IP_PROTOCOLS:
+        conditions.append(ipv4 & (table.ip_proto == number))
+        choices.append(PROTOCOL_CODES[name])
+    for name, l3 in (("ARP", L3_ARP), ("IPv6", L3_IPV6), ("LLC", L3_LLC)):
+        conditions.append(table.l3 == l3)
+        choices.append(PROTOCOL_CODES[name])
+
+    return np.select(conditions, choices, default=PROTOCOL_CODES["Other"]).astype(np.int16)
+
+
+def flow_ids(table):
+    """Number each directional (src, sport, dst, dport, transport) flow, -1 for non TCP/UDP packets"""
+    ids = np.full(len(table), -1, dtype=np.int32)
+    has_flow = (table.l4 == L4_TCP) | (table.l4 == L4_UDP)
+    if has_flow.any():
+        keys = np.stack([
+            table.src[has_flow].astype(np.int64),
+            table.dst[has_flow].astype(np.int64),
+            table.sport[has_flow].astype(np.int64),
+            table.dport[has_flow].astype(np.int64),
+            table.l4[has_flow].astype(np.int64),
+        ], axis=1)
+        _, inverse = np.unique(keys, axis=0, return_inverse=True)
+        ids[has_flow] = inverse.reshape(-1)
+    return ids
+
+
+def counts_in_order(values):
+    """Count distinct values, returned as (values, counts) in order of first appearance"""
+    values = np.asarray(values)
+    if len(values) == 0:
+        return values[:0], np.zeros(0, dtype=np.int64)
+    unique, first, counts = np.unique(values, return_index=True, return_counts=True)
+    order = np.argsort(first, kind="stable")
+    return unique[order], counts[order]
+
+
+def format_timestamps(times):
+    """Vectorized str(datetime.fromtimestamp(t)) for an array of epoch seconds
+
+    Returns (second_text, second_index, micros): the calendar part is formatted
+    once per distinct second, row i reads second_text[second_index[i]] followed by
+    ".%06d" % micros[i] when micros[i] is non-zero, matching str(datetime).
+    """
+    times = np.asarray(times, dtype=np.float64)
+    if len(times) == 0:
+        return np.array([], dtype=object), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    # Local offset taken at the first packet, captures don't span DST changes in practice
+    offset = datetime.fromtimestamp(float(times[0])).astimezone().utcoffset()
+    total = np.round(times * 1e6).astype(np.int64) + int(offset.total_seconds() * 1e6)
+    seconds, micros = np.divmod(total, 1_000_000)
+    unique_seconds, second_index = np.unique(seconds, return_inverse=True)
+    text = np.datetime_as_string(unique_seconds.astype("datetime64[s]"), unit="s")
+    second_text = np.array([t.replace("T", " ") for t in text.tolist()], dtype=object)
+    return second_text, second_index, micros
+
+
+# Summary protocol labels, indexed by the codes from _summary_protocol_codes
+SUMMARY_PROTOCOLS = np.array(["Unknown", "TCP", "UDP", "IP", "ARP", "IPv6"], dtype=object)
+
+# "[SYN: x, ACK: y, FIN: z]" text indexed by the SYN/ACK/FIN bits packed as (S << 2 | A << 1 | F)
+_FLAG_TEXT = [f"[SYN: {bool(k & 4)}, ACK: {bool(k & 2)}, FIN: {bool(k & 1)}]" for k in range(8)]
+
+
+def _summary_protocol_codes(table):
+    ip = ip_mask(table)
+    return np.select(
+        [
+            ip & (table.l4 == L4_TCP),
+            ip & (table.l4 == L4_UDP),
+            table.l3 == L3_IPV4,
+            table.l3 == L3_ARP,
+            table.l3 == L3_IPV6,
+        ],
+        [1, 2, 3, 4, 5],
+        default=0,
+    )
+
+
+class PacketSummary(Sequence):
+    """Packet list rows (number/time/length/protocol/source/destination/info)
+
+    Columns are computed up front with numpy; the row dicts and info strings are
+    only produced for the rows that are actually read, so slicing a page out of
+    a large capture stays cheap.
+    """
+
+    def __init__(self, table, numbers=None):
+        self.table = table
+        # Frame numbers shown for each row, the original ones when the table was filtered
+        self.numbers = np.arange(1, len(table) + 1) if numbers is None else np.asarray(numbers)
+        self.second_text, self.second_index, self.micros = format_timestamps(table.time)
+        self.protocol_codes = _summary_protocol_codes(table)
+        self.sources = table.source_addresses()
+        self.destinations = table.destination_addresses()
+        flags = table.tcp_flags
+        self.flag_keys = (((flags & TCP_FLAG_SYN) != 0) << 2) | (((flags & TCP_FLAG_ACK) != 0) << 1) | ((flags & TCP_FLAG_FIN) != 0)
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self.rows(i, i + 1)[0] for i in range(start, stop, step)]
+            return self.rows(start, stop)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("packet index out of range")
+        return self.rows(index, index + 1)[0]
+
+    def __iter__(self):
+        # Materialize in chunks so serializing a huge capture doesn't double its memory
+        chunk = 65536
+        for start in range(0, len(self), chunk):
+            yield from self.rows(start, start + chunk)
+
+    def rows(self, start=0, stop=None):
+        """Build the row dicts for packets [start, stop)"""
+        return self.rows_at(np.arange(start, len(self) if stop is None else min(stop, len(self))))
+
+    def rows_at(self, indices):
+        """Build the row dicts for the given packet indexes"""
+        t = self.table
+        codes = self.protocol_codes[indices]
+        info = np.full(len(indices), "", dtype=object)
+
+        # Info strings are formatted per protocol group, only for the requested rows
+        for code, fmt in _INFO_FORMATTERS.items():
+            sel = np.flatnonzero(codes == code)
+            if len(sel):
+                info[sel] = fmt(self, indices[sel])
+
+        seconds = self.second_text[self.second_index[indices]].tolist()
+        times = [f"{sec}.{us:06d}" if us else sec for sec, us in zip(seconds, self.micros[indices].tolist())]
+        return [
+            {
+                "number": number,
+                "time": time,
+                "length": length,
+                "protocol": protocol,
+                "source": src,
+                "destination": dst,
+                "info": text
+            }
+            for number, time, length, protocol, src, dst, text in zip(
+                self.numbers[indices].tolist(), times, t.length[indices].tolist(),
+                SUMMARY_PROTOCOLS[codes].tolist(), self.sources[indices].tolist(),
+                self.destinations[indices].tolist(), info.tolist())
+        ]
+
+
+def _tcp_info(summary, idx):
+    t = summary.table
+    return [f"TCP {s} → {d} {_FLAG_TEXT[k]}" for s, d, k in zip(
+        t.sport[idx].tolist(), t.dport[idx].tolist(), summary.flag_keys[idx].tolist())]
+
+
+def _udp_info(summary, idx):
+    t = summary.table
+    return [f"UDP {s} → {d} Len={n}" for s, d, n in zip(
+        t.sport[idx].tolist(), t.dport[idx].tolist(), t.payload_len[idx].tolist())]
+
+
+def _ip_info(summary, idx):
+    return [f"IP Protocol: {p}" for p in summary.table.ip_proto[idx].tolist()]
+
+
+def _arp_info(summary, idx):
+    return [f"Who has {d}? Tell {s}" for s, d in zip(summary.sources[idx].tolist(), summary.destinations[idx].tolist())]
+
+
+def _ipv6_info(summary, idx):
+    return [f"IPv6 {p}" for p in summary.table.ip_proto[idx].tolist()]
+
+
+# Summary protocol code -> info formatter
+_INFO_FORMATTERS = {1: _tcp_info, 2: _udp_info, 3: _ip_info, 4: _arp_info, 5: _ipv6_info}
+
+
+def packet_summaries(table, numbers=None):
+    """Shared packet-list builder used by the packet endpoints"""
+    return PacketSummary(table, numbers)
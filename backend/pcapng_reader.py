@@ -0,0 +1,205 @@
+import mmap
+import struct
+from collections.abc import Sequence
+from typing import NamedTuple
+import numpy as np
+
+# pcapng block types
+BLOCK_SHB = 0x0A0D0D0A
+BLOCK_IDB = 0x00000001
+BLOCK_OPB = 0x00000002  # obsolete packet block, still written by old tools
+BLOCK_SPB = 0x00000003
+BLOCK_EPB = 0x00000006
+
+BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+OPT_ENDOFOPT = 0
+OPT_IF_TSRESOL = 9
+OPT_IF_TSOFFSET = 14
+
+LINKTYPE_ETHERNET = 1
+
+
+class Interface(NamedTuple):
+    linktype: int
+    snaplen: int
+    ts_divisor: int   # timestamp units per second
+    ts_offset: int    # seconds added to every timestamp
+
+
+class Frame(NamedTuple):
+    timestamp: float
+    interface: int
+    linktype: int
+    data: memoryview  # slice of the mapped file, valid until the reader is closed
+    wirelen: int
+
+
+class PcapngError(ValueError):
+    pass
+
+
+def _tsresol_divisor(value):
+    """Units per second for an if_tsresol byte (MSB set means a power of two)"""
+    if value & 0x80:
+        return 2 ** (value & 0x7F)
+    return 10 ** value
+
+
+class PcapngReader:
+    """Memory-mapped pcapng reader
+
+    Walks the SHB/IDB/EPB/SPB block structure straight out of the mapping and
+    yields Frames whose data is a memoryview into the file, so packet bytes are
+    never copied and the OS page cache does the I/O. Multiple sections and
+    per-interface timestamp resolution/offset are supported.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise PcapngError(f"{path} is empty")
+        self._view = memoryview(self._map)
+        if len(self._map) < 12 or struct.unpack_from("<I", self._map, 0)[0] != BLOCK_SHB:
+            self.close()
+            raise PcapngError(f"{path} is not a pcapng file")
+
+    def close(self):
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            # Frames handed out are still alive, the mapping goes away with them
+            pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def blocks(self):
+        """Yield (endian, block_type, body_offset, body_length) for every block"""
+        buf = self._map
+        size = len(buf)
+        offset = 0
+        endian = "<"
+        while offset + 12 <= size:
+            block_type = struct.unpack_from(endian + "I", buf, offset)[0]
+            if block_type == BLOCK_SHB:
+                magic = struct.unpack_from("<I", buf, offset + 8)[0]
+                if magic == BYTE_ORDER_MAGIC:
+                    endian = "<"
+                elif magic == 0x4D3C2B1A:
+                    endian = ">"
+                else:
+                    raise PcapngError(f"Bad byte-order magic at offset {offset}")
+            block_len = struct.unpack_from(endian + "I", buf, offset + 4)[0]
+            if block_len < 12 or block_len % 4 or offset + block_len > size:
+                raise PcapngError(f"Corrupt block at offset {offset}")
+            yield endian, block_type, offset + 8, block_len - 12
+            offset += block_len
+
+    def _read_interface(self, endian, body, length):
+        linktype, _, snaplen = struct.unpack_from(endian + "HHI", self._map, body)
+        divisor = 10 ** 6
+        ts_offset = 0
+        pos = body + 8
+        end = body + length
+        while pos + 4 <= end:
+            code, opt_len = struct.unpack_from(endian + "HH", self._map, pos)
+            if code == OPT_ENDOFOPT:
+                break
+            if code == OPT_IF_TSRESOL and opt_len >= 1:
+                divisor = _tsresol_divisor(self._map[pos + 4])
+            elif code == OPT_IF_TSOFFSET and opt_len >= 8:
+                ts_offset = struct.unpack_from(endian + "q", self._map, pos + 4)[0]
+            pos += 4 + ((opt_len + 3) & ~3)
+        return Interface(linktype, snaplen, divisor, ts_offset)
+
+    def _packets(self):
+        """Yield (timestamp, interface, linktype, data_offset, caplen, wirelen) for each packet"""
+        interfaces = []
+        last_time = 0.0
+        for endian, block_type, body, length in self.blocks():
+            if block_type == BLOCK_SHB:
+                # Interface ids are scoped to their section
+                interfaces = []
+            elif block_type == BLOCK_IDB:
+                interfaces.append(self._read_interface(endian, body, length))
+            elif block_type == BLOCK_EPB:
+                if_id, ts_high, ts_low, caplen, wirelen = struct.unpack_from(endian + "IIIII", self._map, body)
+                iface = interfaces[if_id]
+                last_time = ((ts_high << 32) | ts_low) / iface.ts_divisor + iface.ts_offset
+                yield last_time, if_id, iface.linktype, body + 20, caplen, wirelen
+            elif block_type == BLOCK_OPB:
+                if_id, _, ts_high, ts_low, caplen, wirelen = struct.unpack_from(endian + "HHIIII", self._map, body)
+                iface = interfaces[if_id]
+                last_time = ((ts_high << 32) | ts_low) / iface.ts_divisor + iface.ts_offset
+                yield last_time, if_id, iface.linktype, body + 20, caplen, wirelen
+            elif block_type == BLOCK_SPB:
+                # Simple packets have no timestamp and always belong to interface 0
+                iface = interfaces[0]
+                wirelen = struct.unpack_from(endian + "I", self._map, body)[0]
+                caplen = min(wirelen, iface.snaplen or wirelen, length - 4)
+                yield last_time, 0, iface.linktype, body + 4, caplen, wirelen
+
+    def __iter__(self):
+        view = self._view
+        for timestamp, if_id, linktype, start, caplen, wirelen in self._packets():
+            yield Frame(timestamp, if_id, linktype, view[start:start + caplen], wirelen)
+
+    def index(self):
+        """Positions of every packet as numpy arrays, for random access with frame()"""
+        rows = list(self._packets())
+        columns = list(zip(*rows)) if rows else [()] * 6
+        return {
+            "time": np.array(columns[0], dtype=np.float64),
+            "interface": np.array(columns[1], dtype=np.int32),
+            "linktype": np.array(columns[2], dtype=np.int32),
+            "offset": np.array(columns[3], dtype=np.int64),
+            "caplen": np.array(columns[4], dtype=np.int64),
+            "wirelen": np.array(columns[5], dtype=np.int64),
+        }
+
+
+class MappedPackets(Sequence):
+    """Scapy packets of a mapped capture, dissected only when accessed
+
+    Keeps PacketAnalyzer.getAllPackets() working for the mmap reader without
+    building a Packet for every frame up front.
+    """
+
+    def __init__(self, reader):
+        self.reader = reader
+        self._index = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = self.reader.index()
+        return self._index
+
+    def __len__(self):
+        return len(self.index["time"])
+
+    def frame(self, i):
+        start = int(self.index["offset"][i])
+        return self.reader._view[start:start + int(self.index["caplen"][i])]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        from scapy.all import conf, Raw
+        if i < 0:
+            i += len(self)
+        cls = conf.l2types.get(int(self.index["linktype"][i]), Raw)
+        pkt = cls(bytes(self.frame(i)))
+        pkt.time = float(self.index["time"][i])
+        pkt.wirelen = int(self.index["wirelen"][i])
+        return pkt
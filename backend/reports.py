@@ -0,0 +1,237 @@
+import hashlib
+import json
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+matplotlib.use("Agg")  # reports are rendered headless, also inside worker processes
+import matplotlib.pyplot as plt
+import numpy as np
+import seaborn as sns
+
+# Bump whenever a chart's rendering changes so cached charts are redrawn
+REPORT_VERSION = "1"
+
+# Input hashes of the charts already in an output directory
+CACHE_FILE = ".report_cache.json"
+
+
+def _write_coordinates(output_dir, name, rows):
+    """Write (protocol, x, y) rows, with a blank line after each protocol, to the txt and csv files in one go"""
+    txt = ["Protocol\tX-coordinate\tY-coordinate\n"]
+    csv = ["Protocol,X-coordinate,Y-coordinate\n"]
+    for proto, xdata, ydata in rows:
+        for x, y in zip(xdata, ydata):
+            if x >= 0:
+                txt.append(f"{proto}\t{x:.6f}\t{y:.6f}\n")
+                csv.append(f"{proto},{x:.6f},{y:.6f}\n")
+        txt.append("\n")
+        csv.append("\n")
+    with open(f'{output_dir}/{name}_coordinates.txt', 'w') as f:
+        f.write("".join(txt))
+    with open(f'{output_dir}/{name}_coordinates.csv', 'w') as f:
+        f.write("".join(csv))
+
+
+def plot_latency_distribution(data, output_dir):
+    plt.figure(figsize=(12, 6))
+    rows = []
+    for proto, latencies in data.items():
+        kde = sns.kdeplot(data=latencies, label=proto)
+        line = kde.lines[-1]
+        rows.append((proto, line.get_xdata(), line.get_ydata()))
+    _write_coordinates(output_dir, "latency_distribution", rows)
+
+    plt.xlabel('Latency (ms)')
+    plt.ylabel('Density')
+    plt.title('Latency Distribution by Protocol')
+    plt.legend()
+    plt.xlim(left=0)  # Force x-axis to start at 0
+    plt.savefig(f'{output_dir}/latency_distribution.png')
+    plt.close()
+
+
+def plot_latency_timeline(data, output_dir):
+    plt.figure(figsize=(15, 7))
+    for proto, (timestamps, latencies) in data.items():
+        plt.plot(timestamps, latencies, label=proto, alpha=0.7, marker='.')
+
+    plt.xlabel('Time (seconds)')
+    plt.ylabel('Latency (ms)')
+    plt.title('Packet Latency Timeline')
+    plt.legend()
+    plt.grid(True)
+    plt.ylim(bottom=0)  # Force y-axis to start at 0
+    plt.savefig(f'{output_dir}/latency_timeline.png')
+    plt.close()
+
+
+def plot_jitter_distribution(data, output_dir):
+    plt.figure(figsize=(12, 6))
+    for proto, jitter_values in data.items():
+        sns.kdeplot(data=jitter_values, label=proto)
+
+    plt.xlabel('Jitter (ms)')
+    plt.ylabel('Density')
+    plt.title('Jitter Distribution by Protocol')
+    plt.legend()
+    plt.xlim(left=0)  # Force x-axis to start at 0
+    plt.savefig(f'{output_dir}/jitter_distribution.png')
+    plt.close()
+
+
+def plot_packet_size_distribution(data, output_dir):
+    plt.figure(figsize=(12, 6))
+    has_data = False
+
+    for proto, sizes in data.items():
+        if len(sizes) > 1 and np.var(sizes) > 0:
+            sns.kdeplot(data=sizes, label=f"{proto} (n={len(sizes)})")
+            has_data = True
+        elif len(sizes) > 0:
+            avg_size = np.mean(sizes)
+            plt.axvline(x=avg_size, label=f"{proto} (constant {avg_size:.0f} bytes, n={len(sizes)})",
+                        linestyle='--')
+            has_data = True
+
+    if has_data:
+        plt.xlabel('Packet Size (bytes)')
+        plt.ylabel('Density')
+        plt.title('Packet Size Distribution by Protocol')
+        plt.legend()
+        plt.xlim(left=0)  # Force x-axis to start at 0
+    else:
+        plt.text(0.5, 0.5, 'No packet size data available',
+                 horizontalalignment='center', verticalalignment='center')
+
+    plt.savefig(f'{output_dir}/packet_size_distribution.png')
+    plt.close()
+
+
+def plot_delay_categories(data, output_dir):
+    """data is a list of (category, delays) in category order, empty categories keep their slot"""
+    plt.figure(figsize=(15, 7))
+    for position, (category, delays) in enumerate(data):
+        if delays:
+            plt.boxplot(delays, positions=[position], labels=[category.replace('_', ' ').title()])
+
+    plt.xlabel('Delay Category')
+    plt.ylabel('Delay (ms)')
+    plt.title('Delay Distribution by Category')
+    plt.xticks(rotation=45)
+    plt.grid(True)
+    plt.ylim(bottom=0)  # Force y-axis to start at 0
+    plt.tight_layout()
+    plt.savefig(f'{output_dir}/delay_categories.png')
+    plt.close()
+
+
+def plot_delay_types_distribution(data, output_dir):
+    plt.figure(figsize=(12, 6))
+    for delay_type, all_delays in data.items():
+        sns.kdeplot(data=all_delays, label=delay_type.replace('_', ' ').title())
+
+    plt.xlabel('Delay (ms)')
+    plt.ylabel('Density')
+    plt.title('Distribution of Different Delay Types')
+    plt.legend()
+    plt.xlim(left=0)
+    plt.savefig(f'{output_dir}/delay_types_distribution.png')
+    plt.close()
+
+
+def plot_delay_patterns_timeline(data, output_dir):
+    plt.figure(figsize=(15, 8))
+    congestion_times, congestion_delays = data['congestion']
+    plt.scatter(congestion_times, congestion_delays, label='Congestion Events', color='red', alpha=0.6)
+    jitter_times, jitter_values = data['jitter']
+    plt.scatter(jitter_times, jitter_values, label='High Jitter Events', color='orange', alpha=0.6)
+
+    plt.xlabel('Time (seconds)')
+    plt.ylabel('Delay/Jitter (ms)')
+    plt.title('Network Events Timeline')
+    plt.legend()
+    plt.grid(True)
+    plt.savefig(f'{output_dir}/delay_patterns_timeline.png')
+    plt.close()
+
+
+def plot_size_delay_correlation(data, output_dir):
+    plt.figure(figsize=(12, 6))
+    for proto, (sizes, delays) in data.items():
+        plt.scatter(sizes, delays, label=proto, alpha=0.5)
+
+    plt.xlabel('Packet Size (bytes)')
+    plt.ylabel('Delay (ms)')
+    plt.title('Packet Size vs Delay Correlation')
+    plt.legend()
+    plt.savefig(f'{output_dir}/size_delay_correlation.png')
+    plt.close()
+
+
+# chart name -> (plot function, files it writes)
+CHARTS = {
+    "latency_distribution": (plot_latency_distribution, (
+        "latency_distribution.png",
+        "latency_distribution_coordinates.txt",
+        "latency_distribution_coordinates.csv")),
+    "latency_timeline": (plot_latency_timeline, ("latency_timeline.png",)),
+    "jitter_distribution": (plot_jitter_distribution, ("jitter_distribution.png",)),
+    "packet_size_distribution": (plot_packet_size_distribution, ("packet_size_distribution.png",)),
+    "delay_categories": (plot_delay_categories, ("delay_categories.png",)),
+    "delay_types_distribution": (plot_delay_types_distribution, ("delay_types_distribution.png",)),
+    "delay_patterns_timeline": (plot_delay_patterns_timeline, ("delay_patterns_timeline.png",)),
+    "size_delay_correlation": (plot_size_delay_correlation, ("size_delay_correlation.png",)),
+}
+
+
+def render_chart(name, data, output_dir):
+    CHARTS[name][0](data, output_dir)
+    return name
+
+
+def data_hash(name, data):
+    return hashlib.sha256(pickle.dumps((REPORT_VERSION, name, data), protocol=4)).hexdigest()
+
+
+def _load_cache(output_dir):
+    try:
+        with open(os.path.join(output_dir, CACHE_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _is_current(name, digest, cache, output_dir):
+    return cache.get(name) == digest and all(
+        os.path.exists(os.path.join(output_dir, filename)) for filename in CHARTS[name][1])
+
+
+def render_charts(charts, output_dir, max_workers=None):
+    """Render {name: data} charts into output_dir, returns (rendered, skipped) chart names
+
+    Charts whose input hash matches the one recorded for output_dir (and whose
+    files still exist) are skipped. The rest are drawn in a process pool, one
+    chart per worker, since each figure is independent.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    cache = _load_cache(output_dir)
+    digests = {name: data_hash(name, data) for name, data in charts.items()}
+    stale = [name for name in charts if not _is_current(name, digests[name], cache, output_dir)]
+    skipped = [name for name in charts if name not in stale]
+
+    workers = min(len(stale), max_workers or os.cpu_count() or 1)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(render_chart, name, charts[name], output_dir) for name in stale]
+            for future in futures:
+                name = future.result()
+                cache[name] = digests[name]
+    else:
+        for name in stale:
+            render_chart(name, charts[name], output_dir)
+            cache[name] = digests[name]
+
+    with open(os.path.join(output_dir, CACHE_FILE), 'w') as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    return stale, skipped
@@ -0,0 +1,244 @@
+import base64
+from collections.abc import Sequence
+import gzip
+import hashlib
+import json
+import numpy as np
+from flask import request, jsonify, Response
+from test import ANALYZER_VERSION, capture_fingerprint
+
+try:
+    import orjson
+except ImportError:  # optional, falls back to the stdlib encoder
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional, only needed for format=msgpack
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # optional, gzip is always available
+    zstandard = None
+
+SERIES_MIMETYPE = "application/vnd.hackenza.series+json"
+
+# format name -> response mimetype
+FORMATS = {
+    "json": "application/json",
+    "fastjson": "application/json",
+    "f32": SERIES_MIMETYPE,
+    "msgpack": "application/msgpack",
+}
+
+ACCEPT_FORMATS = {
+    "application/json": "json",
+    SERIES_MIMETYPE: "f32",
+    "application/msgpack": "msgpack",
+    "application/x-msgpack": "msgpack",
+}
+
+# Shorter numeric lists are left alone, packing them saves nothing
+MIN_SERIES_LENGTH = 16
+
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_SIZE = 1024
+
+# float32 holds every integer up to 2**24 exactly, past that (e.g. epoch timestamps) use float64
+FLOAT32_LIMIT = 2 ** 24
+
+
+def available_formats():
+    """Return the response formats usable with the installed libraries"""
+    formats = ["json", "fastjson", "f32"]
+    if msgpack is not None:
+        formats.append("msgpack")
+    return formats
+
+
+def negotiate_format():
+    """Pick the response format from ?format= or the Accept header, None if unsupported"""
+    fmt = request.args.get("format")
+    if fmt:
+        fmt = fmt.lower()
+        return fmt if fmt in available_formats() else None
+
+    offered = [m for m, f in ACCEPT_FORMATS.items() if f in available_formats()]
+    best = request.accept_mimetypes.best_match(offered, default="application/json")
+    return ACCEPT_FORMATS.get(best, "json")
+
+
+def json_default(obj):
+    """Convert numpy values that the JSON encoders don't understand"""
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        return float(obj)
+    if isinstance(obj, np.bool_):
+        return bool(obj)
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset, range, Sequence)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _as_series(value):
+    """Return value as a float64 array if it is a long purely numeric list, else None"""
+    if isinstance(value, np.ndarray):
+        if value.ndim == 1 and len(value) >= MIN_SERIES_LENGTH and value.dtype.kind in "iuf":
+            return value.astype(np.float64, copy=False)
+        return None
+    if isinstance(value, (list, tuple)) and len(value) >= MIN_SERIES_LENGTH:
+        if all(type(v) in (float, int) or isinstance(v, (np.integer, np.floating)) for v in value):
+            return np.asarray(value, dtype=np.float64)
+    return None
+
+
+def pack_series(values, binary=False):
+    """Pack a numeric series into a typed little-endian buffer
+
+    The result is {"__series__": dtype, "length": n, "data": ...} where data is raw
+    bytes for binary formats and base64 text otherwise.
+    """
+    arr = np.asarray(values, dtype=np.float64)
+    finite = arr[np.isfinite(arr)]
+    if finite.size and np.abs(finite).max() >= FLOAT32_LIMIT:
+        dtype = "float64"
+    else:
+        dtype = "float32"
+    raw = arr.astype("<f8" if dtype == "float64" else "<f4").tobytes()
+    return {
+        "__series__": dtype,
+        "length": int(arr.size),
+        "data": raw if binary else base64.b64encode(raw).decode("ascii"),
+    }
+
+
+def _pack_tree(obj, binary):
+    """Walk a payload replacing long numeric lists with packed series"""
+    series = _as_series(obj)
+    if series is not None:
+        return pack_series(series, binary)
+    if isinstance(obj, dict):
+        return {k: _pack_tree(v, binary) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_pack_tree(v, binary) for v in obj]
+    return obj
+
+
+def _fast_json(payload):
+    if orjson is not None:
+        return orjson.dumps(
+            payload,
+            default=json_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+        )
+    return json.dumps(payload, default=json_default, separators=(",", ":")).encode("utf-8")
+
+
+def _msgpack_default(obj):
+    if isinstance(obj, np.ndarray):
+        return _pack_tree(obj, binary=True)
+    return json_default(obj)
+
+
+def encode_payload(payload, fmt="json"):
+    """Serialize a payload in the given format, returns (body, mimetype)"""
+    if fmt == "json":
+        # Same bytes as Flask's jsonify, which the endpoints returned before
+        body = (json.dumps(payload, default=json_default, sort_keys=True, separators=(",", ":")) + "\n").encode("utf-8")
+    elif fmt == "fastjson":
+        body = _fast_json(payload)
+    elif fmt == "f32":
+        body = _fast_json(_pack_tree(payload, binary=False))
+    elif fmt == "msgpack":
+        if msgpack is None:
+            raise ValueError("msgpack is not installed")
+        body = msgpack.packb(_pack_tree(payload, binary=True), default=_msgpack_default, use_bin_type=True)
+    else:
+        raise ValueError(f"Unknown response format: {fmt}")
+    return body, FORMATS[fmt]
+
+
+def negotiate_encoding():
+    """Pick the content-encoding from Accept-Encoding, None means identity"""
+    offered = ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+    return request.accept_encodings.best_match(offered)
+
+
+def compress_body(body, encoding):
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def capture_etag(pcap_file):
+    """Strong ETag for the current request against pcap_file
+
+    Derived from the capture's identity, the analyzer version and everything that
+    changes the representation (path, query arguments, format and encoding), so it
+    can be checked before doing any analysis work.
+    """
+    h = hashlib.sha256()
+    h.update(capture_fingerprint(pcap_file).encode())
+    h.update(ANALYZER_VERSION.encode())
+    h.update(request.path.encode())
+    for key, value in sorted(request.args.items(multi=True)):
+        h.update(f"{key}={value}&".encode())
+    h.update(f"{negotiate_format()}|{negotiate_encoding()}".encode())
+    return h.hexdigest()[:32]
+
+
+def etag_matches(etag):
+    """True if the client's If-None-Match already covers etag"""
+    return request.if_none_match.contains_weak(etag)
+
+
+def not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.vary.update(["Accept", "Accept-Encoding"])
+    return response
+
+
+def encode_response(payload, status=200, etag=None):
+    """Build a Flask response for payload in the format and encoding the client asked for"""
+    fmt = negotiate_format()
+    if fmt is None:
+        return jsonify({
+            "error": "Unsupported response format",
+            "formats": available_formats()
+        }), 406
+
+    body, mimetype = encode_payload(payload, fmt)
+    encoding = negotiate_encoding() if len(body) >= MIN_COMPRESS_SIZE else None
+    if encoding:
+        body = compress_body(body, encoding)
+
+    response = Response(body, status=status, mimetype=mimetype)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.update(["Accept", "Accept-Encoding"])
+    if etag:
+        response.set_etag(etag)
+        # Clients may reuse the body but must revalidate with If-None-Match
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def sse_event(event, data):
+    """One Server-Sent Events message, data as a single line of JSON"""
+    return f"event: {event}\ndata: {_fast_json(data).decode('utf-8')}\n\n"
+
+
+def event_stream(events):
+    """Streaming text/event-stream response for an iterable of (event, data) pairs"""
+    response = Response((sse_event(event, data) for event, data in events), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    # Keep reverse proxies (nginx) from buffering the stream
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,229 @@
+import math
+import numpy as np
+
+# Bucket widths of the pyramid levels, in seconds
+LEVELS = (0.001, 0.01, 0.1, 1.0, 10.0)
+
+# A zoom query uses the finest level that shows at most this many buckets
+MAX_BUCKETS = 2000
+
+# Quantile sketch: log-spaced latency bins with 1% relative error, values under
+# SKETCH_MIN_MS share bin 0
+SKETCH_ACCURACY = 0.01
+SKETCH_GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+SKETCH_MIN_MS = 1e-3
+_LOG_GAMMA = np.log(SKETCH_GAMMA)
+_MIN_INDEX = int(np.ceil(np.log(SKETCH_MIN_MS) / _LOG_GAMMA))
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+ALL_PROTOCOLS = "All"
+
+
+def sketch_bins(values):
+    """Sketch bin of each latency (ms)"""
+    values = np.asarray(values, dtype=np.float64)
+    bins = np.zeros(len(values), dtype=np.int64)
+    above = values > SKETCH_MIN_MS
+    bins[above] = np.ceil(np.log(values[above]) / _LOG_GAMMA).astype(np.int64) - _MIN_INDEX + 1
+    return bins
+
+
+def sketch_bin(value):
+    """sketch_bins of a single value, for per-packet updates"""
+    if not value > SKETCH_MIN_MS:
+        return 0
+    return math.ceil(math.log(value) / _LOG_GAMMA) - _MIN_INDEX + 1
+
+
+def sketch_values(bins):
+    """Representative latency of each sketch bin, within SKETCH_ACCURACY of any value in it"""
+    bins = np.asarray(bins, dtype=np.int64)
+    index = bins + _MIN_INDEX - 1
+    values = 2 * SKETCH_GAMMA ** index / (SKETCH_GAMMA + 1)
+    return np.where(bins == 0, 0.0, values)
+
+
+class RollupLevel:
+    """Time buckets of one width for one protocol, only non-empty buckets are stored
+
+    Per bucket: packet count, bytes, latency count/min/max/sum and a sparse
+    latency sketch held as CSR arrays (sketch_offsets into sketch_bins/counts).
+    """
+
+    ARRAYS = ("buckets", "count", "bytes", "lat_count", "lat_min", "lat_max", "lat_sum",
+              "sketch_offsets", "sketch_bins", "sketch_counts")
+
+    def __init__(self, width, buckets, count, bytes_, lat_count, lat_min, lat_max, lat_sum,
+                 sketch_offsets, sketch_bins, sketch_counts):
+        self.width = width
+        self.buckets = buckets
+        self.count = count
+        self.bytes = bytes_
+        self.lat_count = lat_count
+        self.lat_min = lat_min
+        self.lat_max = lat_max
+        self.lat_sum = lat_sum
+        self.sketch_offsets = sketch_offsets
+        self.sketch_bins = sketch_bins
+        self.sketch_counts = sketch_counts
+
+    @classmethod
+    def build(cls, width, times, lengths, latencies, start):
+        buckets = np.floor((times - start) / width).astype(np.int64)
+        order = np.argsort(buckets, kind="stable")
+        buckets = buckets[order]
+        lengths = lengths[order]
+        latencies = latencies[order]
+        starts = np.flatnonzero(np.r_[len(buckets) > 0, buckets[1:] != buckets[:-1]])
+
+        has_latency = ~np.isnan(latencies)
+        count = np.diff(np.r_[starts, len(buckets)])
+        bytes_ = np.add.reduceat(lengths.astype(np.int64), starts)
+        lat_count = np.add.reduceat(has_latency.astype(np.int64), starts)
+        lat_sum = np.add.reduceat(np.where(has_latency, latencies, 0.0), starts)
+        # fmin/fmax skip NaN unless the whole bucket is NaN
+        lat_min = np.fmin.reduceat(latencies, starts)
+        lat_max = np.fmax.reduceat(latencies, starts)
+
+        # Sketch entries sorted by (bucket row, bin)
+        row = np.repeat(np.arange(len(starts)), count)[has_latency]
+        bins = sketch_bins(latencies[has_latency])
+        span = int(bins.max()) + 1 if len(bins) else 1
+        keys, sketch_counts = np.unique(row * span + bins, return_counts=True)
+        sketch_rows = keys // span
+        sketch_offsets = np.searchsorted(sketch_rows, np.arange(len(starts) + 1))
+
+        return cls(width, buckets[starts], count, bytes_, lat_count, lat_min, lat_max, lat_sum,
+                   sketch_offsets, keys % span, sketch_counts)
+
+    def window(self, first_bucket, last_bucket):
+        """Row range of the stored buckets between two bucket numbers (inclusive)"""
+        lo = np.searchsorted(self.buckets, first_bucket, side="left")
+        hi = np.searchsorted(self.buckets, last_bucket, side="right")
+        return lo, hi
+
+    def quantiles(self, lo, hi, quantiles=QUANTILES):
+        """Latency quantiles of rows lo..hi from their sketches, NaN for rows without latency"""
+        start, end = self.sketch_offsets[lo], self.sketch_offsets[hi]
+        offsets = self.sketch_offsets[lo:hi + 1] - start
+        bins = self.sketch_bins[start:end]
+        cumulative = np.cumsum(self.sketch_counts[start:end])
+        # Cumulative count before each row, so every row is searched in its own segment
+        base = np.r_[0, cumulative][offsets[:-1]]
+        totals = self.lat_count[lo:hi]
+        result = {}
+        for q in quantiles:
+            rank = base + np.maximum(1, np.ceil(q * totals))
+            at = np.minimum(np.searchsorted(cumulative, rank, side="left"), max(len(bins) - 1, 0))
+            values = sketch_values(bins[at]) if len(bins) else np.zeros(len(totals))
+            result[q] = np.where(totals > 0, values, np.nan)
+        return result
+
+
+def _nan_to_none(values):
+    return [None if v != v else v for v in values.tolist()]
+
+
+class RollupPyramid:
+    """Time-bucket rollups at every level in LEVELS, per protocol and for all packets"""
+
+    def __init__(self, start, end, levels):
+        self.start = start
+        self.end = end
+        self.levels = levels  # {protocol: [RollupLevel per width]}
+
+    @classmethod
+    def build(cls, times, lengths, latencies, protocols, widths=LEVELS):
+        """Build from per-packet arrays: epoch seconds, bytes, latency ms (NaN when unknown), protocol name"""
+        times = np.asarray(times, dtype=np.float64)
+        lengths = np.asarray(lengths)
+        latencies = np.asarray(latencies, dtype=np.float64)
+        protocols = np.asarray(protocols, dtype=object)
+        start = float(times.min()) if len(times) else 0.0
+        end = float(times.max()) if len(times) else 0.0
+
+        groups = {ALL_PROTOCOLS: np.arange(len(times))}
+        names, inverse = np.unique(protocols, return_inverse=True) if len(times) else ([], [])
+        for code, name in enumerate(names):
+            groups[name] = np.flatnonzero(inverse == code)
+
+        levels = {}
+        for name, idx in groups.items():
+            levels[name] = [RollupLevel.build(w, times[idx], lengths[idx], latencies[idx], start) for w in widths]
+        return cls(start, end, levels)
+
+    def to_arrays(self):
+        """The pyramid as a flat {name: array} dict (np.savez-able without pickle), see from_arrays"""
+        arrays = {"range": np.array([self.start, self.end]), "protocols": np.array(self.protocols, dtype=str)}
+        for p, levels in enumerate(self.levels.values()):
+            arrays[f"p{p}_widths"] = np.array([level.width for level in levels], dtype=np.float64)
+            for i, level in enumerate(levels):
+                for name in RollupLevel.ARRAYS:
+                    arrays[f"p{p}_l{i}_{name}"] = getattr(level, name)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        start, end = (float(v) for v in arrays["range"])
+        levels = {}
+        for p, protocol in enumerate(arrays["protocols"].tolist()):
+            levels[protocol] = [RollupLevel(float(width), *(arrays[f"p{p}_l{i}_{name}"] for name in RollupLevel.ARRAYS))
+                                for i, width in enumerate(arrays[f"p{p}_widths"].tolist())]
+        return cls(start, end, levels)
+
+    @property
+    def protocols(self):
+        return list(self.levels)
+
+    def choose_level(self, start, end, max_buckets=MAX_BUCKETS):
+        """Finest level whose buckets over [start, end] fit in max_buckets"""
+        levels = self.levels[ALL_PROTOCOLS]
+        for i, level in enumerate(levels):
+            if (end - start) / level.width <= max_buckets:
+                return i
+        return len(levels) - 1
+
+    def query(self, start=None, end=None, protocol=ALL_PROTOCOLS, max_buckets=MAX_BUCKETS):
+        """Per-bucket throughput, packet rate and latency stats for [start, end] (epoch seconds)
+
+        Only the non-empty buckets inside the window are read, so the cost
+        follows the number of visible buckets rather than the capture size.
+        """
+        if protocol not in self.levels:
+            raise KeyError(protocol)
+        start = self.start if start is None else max(start, self.start)
+        end = self.end if end is None else min(end, self.end)
+        index = self.choose_level(start, end, max_buckets)
+        level = self.levels[protocol][index]
+
+        first = int(np.floor((start - self.start) / level.width))
+        last = int(np.floor((end - self.start) / level.width))
+        lo, hi = level.window(first, last)
+        quantiles = level.quantiles(lo, hi)
+        count = level.count[lo:hi]
+        lat_count = level.lat_count[lo:hi]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            lat_mean = level.lat_sum[lo:hi] / lat_count
+
+        data = {
+            "time": (self.start + level.buckets[lo:hi] * level.width).tolist(),
+            "count": count.tolist(),
+            "bytes": level.bytes[lo:hi].tolist(),
+            "packets_per_second": (count / level.width).tolist(),
+            "throughput_bps": (level.bytes[lo:hi] * 8 / level.width).tolist(),
+            "latency_min": _nan_to_none(level.lat_min[lo:hi]),
+            "latency_max": _nan_to_none(level.lat_max[lo:hi]),
+            "latency_mean": _nan_to_none(lat_mean),
+        }
+        for q, values in quantiles.items():
+            data[f"latency_p{int(q * 100)}"] = _nan_to_none(values)
+        return {
+            "protocol": protocol,
+            "bucket_width": level.width,
+            "start": start,
+            "end": end,
+            "capture_start": self.start,
+            "capture_end": self.end,
+            "buckets": data,
+        }
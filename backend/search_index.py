@@ -0,0 +1,184 @@
+import numpy as np
+from packet_table import packet_summaries, SUMMARY_PROTOCOLS
+
+TIME_BUCKET = 1.0  # seconds per time posting list
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 10000
+
+SORT_KEYS = ("number", "time", "length", "protocol", "source", "destination")
+
+
+class PostingIndex:
+    """Inverted index from small integer keys to sorted row ids, held as CSR arrays"""
+
+    def __init__(self, keys, n_keys):
+        keys = np.asarray(keys, dtype=np.int64)
+        # Stable sort keeps row ids ascending inside every posting list
+        self.rows = np.argsort(keys, kind="stable").astype(np.int64)
+        self.offsets = np.zeros(n_keys + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum(np.bincount(keys, minlength=n_keys))
+
+    def get(self, key):
+        if not 0 <= key < len(self.offsets) - 1:
+            return self.rows[:0]
+        return self.rows[self.offsets[key]:self.offsets[key + 1]]
+
+    def get_any(self, keys):
+        """Rows matching any of keys (posting lists are disjoint, so this is a sorted concat)"""
+        lists = [self.get(k) for k in keys]
+        if not lists:
+            return self.rows[:0]
+        return np.sort(np.concatenate(lists))
+
+
+def _intersect(lists):
+    """Rows present in every list, smallest list first so each step shrinks the candidate set"""
+    lists = sorted(lists, key=len)
+    rows = lists[0]
+    for other in lists[1:]:
+        if len(rows) == 0:
+            break
+        rows = rows[np.isin(rows, other, assume_unique=True)]
+    return rows
+
+
+class SearchIndex:
+    """Inverted indexes over one capture's packet list for server-side search
+
+    Addresses, ports, summary protocol and one-second time buckets each get a
+    posting list per value. A query intersects the posting lists of its filters,
+    then sorts and pages only the matching rows; row dicts are built just for
+    the returned page.
+    """
+
+    def __init__(self, table, numbers=None):
+        self.table = table
+        self.summary = packet_summaries(table, numbers)
+        n_addresses = len(table.addresses)
+        self.addresses = table.addresses
+        self._address_codes = {addr: code for code, addr in enumerate(table.addresses.tolist())}
+
+        self.by_src = PostingIndex(table.src, n_addresses)
+        self.by_dst = PostingIndex(table.dst, n_addresses)
+        # Ports are shifted by one so "no port" (-1) gets key 0
+        self.by_sport = PostingIndex(table.sport + 1, 65537)
+        self.by_dport = PostingIndex(table.dport + 1, 65537)
+        self.by_protocol = PostingIndex(self.summary.protocol_codes, len(SUMMARY_PROTOCOLS))
+
+        self.start = float(table.time.min()) if len(table) else 0.0
+        self.end = float(table.time.max()) if len(table) else 0.0
+        buckets = np.floor((table.time - self.start) / TIME_BUCKET).astype(np.int64)
+        self.by_time = PostingIndex(buckets, int(buckets.max()) + 1 if len(buckets) else 0)
+
+        # Rank of every address in string order, so sorting by address never touches strings
+        address_rank = np.empty(n_addresses, dtype=np.int64)
+        address_rank[np.argsort(table.addresses.astype(str), kind="stable")] = np.arange(n_addresses)
+        self._sort_columns = {
+            "time": table.time,
+            "length": table.length,
+            "protocol": np.argsort(np.argsort(SUMMARY_PROTOCOLS.astype(str)))[self.summary.protocol_codes],
+            "source": address_rank[table.src],
+            "destination": address_rank[table.dst],
+        }
+
+    def __len__(self):
+        return len(self.table)
+
+    def protocols(self):
+        present = np.flatnonzero(np.diff(self.by_protocol.offsets))
+        return sorted(SUMMARY_PROTOCOLS[present].tolist())
+
+    def sources(self):
+        present = np.flatnonzero(np.diff(self.by_src.offsets))
+        return sorted(a for a in self.addresses[present].tolist() if a)
+
+    def destinations(self):
+        present = np.flatnonzero(np.diff(self.by_dst.offsets))
+        return sorted(a for a in self.addresses[present].tolist() if a)
+
+    def _address(self, index, addr):
+        code = self._address_codes.get(addr)
+        return index.get(code) if code is not None else index.rows[:0]
+
+    def _protocol(self, name):
+        matches = [code for code, proto in enumerate(SUMMARY_PROTOCOLS.tolist()) if proto.lower() == name.lower()]
+        return self.by_protocol.get_any(matches)
+
+    def _time_range(self, start, end):
+        t = self.table.time
+        start = self.start if start is None else start
+        end = self.end if end is None else end
+        if end < start:
+            return self.by_time.rows[:0]
+        first = max(0, int(np.floor((start - self.start) / TIME_BUCKET)))
+        # Only walk buckets that exist, a far-off end would otherwise visit every empty one
+        last = min(int(np.floor((end - self.start) / TIME_BUCKET)), len(self.by_time.offsets) - 2)
+        if first > last:
+            return self.by_time.rows[:0]
+        rows = self.by_time.get_any(range(first, last + 1))
+        # Buckets at the edges may hold rows just outside the range
+        return rows[(t[rows] >= start) & (t[rows] <= end)]
+
+    def _text(self, query):
+        """Rows whose address or protocol contains query, or whose port equals it"""
+        query = query.lower()
+        codes = [code for code, addr in enumerate(self.addresses.tolist()) if addr and query in addr.lower()]
+        lists = [self.by_src.get_any(codes), self.by_dst.get_any(codes)]
+        lists.append(self.by_protocol.get_any(
+            [code for code, proto in enumerate(SUMMARY_PROTOCOLS.tolist()) if query in proto.lower()]))
+        if query.isdigit() and int(query) <= 65535:
+            lists += [self.by_sport.get(int(query) + 1), self.by_dport.get(int(query) + 1)]
+        return np.unique(np.concatenate(lists))
+
+    def match(self, protocol=None, src=None, dst=None, ip=None, sport=None, dport=None, port=None,
+              start=None, end=None, min_length=None, max_length=None, q=None):
+        """Sorted row ids matching every given filter"""
+        lists = []
+        if protocol:
+            lists.append(self._protocol(protocol))
+        if src:
+            lists.append(self._address(self.by_src, src))
+        if dst:
+            lists.append(self._address(self.by_dst, dst))
+        if ip:
+            lists.append(np.union1d(self._address(self.by_src, ip), self._address(self.by_dst, ip)))
+        if sport is not None:
+            lists.append(self.by_sport.get(sport + 1))
+        if dport is not None:
+            lists.append(self.by_dport.get(dport + 1))
+        if port is not None:
+            lists.append(np.union1d(self.by_sport.get(port + 1), self.by_dport.get(port + 1)))
+        if start is not None or end is not None:
+            lists.append(self._time_range(start, end))
+        if q:
+            lists.append(self._text(q))
+
+        rows = _intersect(lists) if lists else np.arange(len(self), dtype=np.int64)
+        if min_length is not None or max_length is not None:
+            lengths = self.table.length[rows]
+            keep = np.ones(len(rows), dtype=bool)
+            if min_length is not None:
+                keep &= lengths >= min_length
+            if max_length is not None:
+                keep &= lengths <= max_length
+            rows = rows[keep]
+        return rows
+
+    def search(self, sort="number", descending=False, page=1, page_size=PAGE_SIZE, **filters):
+        """One page of matching packet rows plus the total match count"""
+        if sort not in SORT_KEYS:
+            raise ValueError(f"sort must be one of: {', '.join(SORT_KEYS)}")
+        rows = self.match(**filters)
+        if sort != "number":
+            rows = rows[np.argsort(self._sort_columns[sort][rows], kind="stable")]
+        if descending:
+            rows = rows[::-1]
+        page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+        offset = (max(page, 1) - 1) * page_size
+        return {
+            "total": int(len(rows)),
+            "page": max(page, 1),
+            "page_size": page_size,
+            "packets": self.summary.rows_at(rows[offset:offset + page_size]),
+        }
@@ -32,6 +32,22 @@ class GeminiClient:
         )
         return response.text
 
+    async def agenerate_content(self, prompt, model="gemini-2.0-flash", max_tokens=100, temperature=0.1):
+        """
+        Asynchronous generate_content, cancelling the task cancels the request.
+        
+        Args and return value are the same as generate_content.
+        """
+        response = await self.client.aio.models.generate_content(
+            model=model,
+            contents=prompt,
+            config=types.GenerateContentConfig(
+                max_output_tokens=max_tokens,
+                temperature=temperature
+            )
+        )
+        return response.text
+
 def main():
     """Main function to demonstrate the Gemini client usage."""
     # Replace with your actual API key
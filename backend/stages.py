@@ -0,0 +1,55 @@
+class StageGraph:
+    """Named analysis stages and the stages each one needs, run lazily and at most once
+
+    A stage is a function taking the shared arguments (e.g. a PacketAnalyzer)
+    followed by the results of its dependencies, in the order they were
+    declared. Dependencies must be registered before the stages using them,
+    which keeps the graph acyclic.
+    """
+
+    def __init__(self):
+        self._stages = {}
+
+    def stage(self, name, *deps):
+        """Decorator registering fn as stage name, depending on deps"""
+        def register(fn):
+            unknown = [d for d in deps if d not in self._stages]
+            if unknown:
+                raise ValueError(f"Stage {name!r} depends on unknown stages: {', '.join(unknown)}")
+            self._stages[name] = (deps, fn)
+            return fn
+        return register
+
+    def __contains__(self, name):
+        return name in self._stages
+
+    def plan(self, targets):
+        """Every stage needed for targets, dependencies first"""
+        order = []
+        seen = set()
+
+        def visit(name):
+            if name in seen:
+                return
+            if name not in self._stages:
+                raise KeyError(name)
+            seen.add(name)
+            for dep in self._stages[name][0]:
+                visit(dep)
+            order.append(name)
+
+        for target in targets:
+            visit(target)
+        return order
+
+    def compute(self, name, results, *args):
+        """Result of stage name, running whatever it needs that isn't in results yet
+
+        results maps stage names to their values and is filled in place, so
+        stages shared between targets run once.
+        """
+        for stage in self.plan([name]):
+            if stage not in results:
+                deps, fn = self._stages[stage]
+                results[stage] = fn(*args, *(results[d] for d in deps))
+        return results[name]
@@ -0,0 +1,109 @@
+SEQ_MODULO = 1 << 32
+# Out-of-order bytes held per direction before giving up on the hole and skipping it
+MAX_OUT_OF_ORDER = 256 * 1024
+
+TCP_SYN = 0x02
+TCP_FIN = 0x01
+TCP_RST = 0x04
+
+
+def _seq_diff(a, b):
+    """a - b in sequence space, negative when a is before b"""
+    d = (a - b) % SEQ_MODULO
+    return d - SEQ_MODULO if d >= SEQ_MODULO // 2 else d
+
+
+class _Direction:
+    __slots__ = ("next_seq", "pending", "pending_bytes")
+
+    def __init__(self):
+        self.next_seq = None
+        # seq -> (time, payload) of segments that arrived ahead of a hole
+        self.pending = {}
+        self.pending_bytes = 0
+
+
+class TcpReassembler:
+    """Incremental in-order byte streams of TCP connections
+
+    feed() takes segments in capture order and returns the bytes that became
+    contiguous, so a consumer sees each direction of a connection as a stream
+    without the capture ever being held in memory. Retransmitted and
+    overlapping bytes are trimmed. Segments ahead of a hole wait in a buffer
+    of at most max_out_of_order bytes per direction; past that the hole is
+    declared lost and the stream resumes after it. A connection seen without
+    its SYN starts at its first payload-carrying segment.
+
+    Returned chunks are (time, data), data None marking lost bytes so parsers
+    can resynchronize.
+    """
+
+    def __init__(self, max_out_of_order=MAX_OUT_OF_ORDER):
+        self.max_out_of_order = max_out_of_order
+        self._directions = {}
+        self.gaps = 0
+
+    def __len__(self):
+        return len(self._directions)
+
+    def feed(self, key, time, seq, flags, payload):
+        """In-order chunks delivered by one segment, key identifies the direction (e.g. src, sport, dst, dport)"""
+        state = self._directions.get(key)
+        if state is None:
+            state = self._directions[key] = _Direction()
+        if flags & TCP_SYN:
+            state.next_seq = (seq + 1) % SEQ_MODULO
+            state.pending.clear()
+            state.pending_bytes = 0
+            seq = state.next_seq
+        chunks = []
+        if payload:
+            if state.next_seq is None:
+                state.next_seq = seq
+            self._accept(state, time, seq, payload, chunks)
+        if flags & (TCP_FIN | TCP_RST):
+            del self._directions[key]
+        return chunks
+
+    def _accept(self, state, time, seq, payload, chunks):
+        offset = _seq_diff(seq, state.next_seq)
+        if offset < 0:
+            # Retransmission, keep only bytes past what was delivered
+            if -offset >= len(payload):
+                return
+            payload = payload[-offset:]
+            offset = 0
+        if offset > 0:
+            if seq not in state.pending:
+                state.pending[seq] = (time, payload)
+                state.pending_bytes += len(payload)
+            if state.pending_bytes <= self.max_out_of_order:
+                return
+            # The hole isn't getting filled, skip to the earliest buffered segment
+            self.gaps += 1
+            chunks.append((time, None))
+            seq = min(state.pending, key=lambda s: _seq_diff(s, state.next_seq))
+            time, payload = self._pop(state, seq)
+            state.next_seq = seq
+        chunks.append((time, payload))
+        state.next_seq = (state.next_seq + len(payload)) % SEQ_MODULO
+        self._drain(state, chunks)
+
+    def _pop(self, state, seq):
+        time, payload = state.pending.pop(seq)
+        state.pending_bytes -= len(payload)
+        return time, payload
+
+    def _drain(self, state, chunks):
+        """Deliver buffered segments the stream has caught up with"""
+        while state.pending:
+            ready = sorted((s for s in state.pending if _seq_diff(s, state.next_seq) <= 0),
+                           key=lambda s: _seq_diff(s, state.next_seq))
+            if not ready:
+                return
+            for s in ready:
+                time, payload = self._pop(state, s)
+                skip = -_seq_diff(s, state.next_seq)
+                if skip < len(payload):
+                    chunks.append((time, payload[skip:]))
+                    state.next_seq = (state.next_seq + len(payload) - skip) % SEQ_MODULO
@@ -1,15 +1,183 @@
-from scapy.all import rdpcap, IP, TCP, UDP
+from scapy.all import rdpcap, PcapReader
+from scapy.plist import PacketList
+from scapy.utils import RawPcapReader
+from scapy.fields import FlagValue
 import matplotlib.pyplot as plt
 from collections import defaultdict, Counter
 import numpy as np
 import seaborn as sns
 from datetime import datetime
 import os
+from packet_table import (PacketTable, PROTOCOL_NAMES, L3_IPV4, L3_ARP, L3_IPV6, L4_TCP, L4_UDP,
+                          classify_protocols, flow_ids, counts_in_order, ip_mask)
+from columnar import is_columnar_file, read_capture, write_capture
+from pcapng_reader import PcapngReader, PcapngError, MappedPackets
+from decoder import tcp_payload
+from mqtt import MQTT_PORTS, MAX_MESSAGES, mqtt_messages, summarize_mqtt
+from reports import CHARTS, render_chart, render_charts
+from delay_events import (QUEUE_THRESHOLD, CONGESTION_WINDOW, CONGESTION_SUM, JITTER_THRESHOLD,
+                          groups_in_order, detect_congestion, detect_jitter)
+from correlation import SIZE_EDGES, TIME_BUCKET, delay_correlations
+from loss_detector import detect_sequence_gaps
+from rollups import RollupPyramid
+from device_stats import DeviceAggregate
+from histograms import SIGNIFICANT_DIGITS, histogram_groups
+from heavy_hitters import TOP_K, exact_top, sketch_top
+from display_filter import compile_filter
+
+# Bump whenever analysis output changes so cached results and ETags are invalidated
+ANALYZER_VERSION = "3"
+
+# Ways of reading a pcapng: scapy's rdpcap or the zero-copy memory-mapped reader
+READERS = ("scapy", "mmap")
+
+# scapy's TCP flag letters, used to print flags the same way pkt[TCP].flags does
+TCP_FLAG_NAMES = "FSRPAUECN"
+
+# Charts drawn by plot_delay_analysis
+DELAY_ANALYSIS_CHARTS = ("delay_types_distribution", "delay_patterns_timeline", "size_delay_correlation")
+
+
+def capture_fingerprint(pcap_file):
+    """Identify a capture file on disk by path, inode, size and modification time"""
+    st = os.stat(pcap_file)
+    return f"{os.path.realpath(pcap_file)}:{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+
+
+# How often read_packets reports parsing progress
+PROGRESS_PACKETS = 2000
+
+
+def read_packets(pcap_file, progress=None):
+    """rdpcap that calls progress("parse", bytes_read, total_bytes) every PROGRESS_PACKETS packets"""
+    if progress is None:
+        return rdpcap(pcap_file)
+    total = os.path.getsize(pcap_file)
+    packets = []
+    with PcapReader(pcap_file) as reader:
+        while True:
+            try:
+                packets.append(reader.read_packet())
+            except EOFError:
+                break
+            if len(packets) % PROGRESS_PACKETS == 0:
+                progress("parse", reader.f.tell(), total)
+    progress("parse", total, total)
+    return PacketList(packets, name=os.path.basename(pcap_file))
+
+
+def read_tcp_payloads(pcap_file, frames):
+    """TCP payload of each of the given 0-based frames (ascending), streamed from the capture file
+
+    Frames that aren't TCP segments give b"". pcapng files are read through
+    the memory-mapped reader, anything else scapy reads through RawPcapReader.
+    """
+    wanted = iter(frames)
+    target = next(wanted, None)
+    try:
+        reader = PcapngReader(pcap_file)
+        raw_frames = ((frame.linktype, frame.data) for frame in reader)
+    except PcapngError:
+        reader = RawPcapReader(pcap_file)
+        raw_frames = ((reader.linktype, data) for data, _ in reader)
+    try:
+        for i, (linktype, data) in enumerate(raw_frames):
+            if target is None:
+                break
+            if i != target:
+                continue
+            payload = tcp_payload(linktype, data)
+            yield b"" if payload is None else payload
+            target = next(wanted, None)
+    finally:
+        reader.close()
+
+
+def packet_metrics(table):
+    """Per-packet derived metrics: protocol code, inter-arrival latency, jitter and flow id
+
+    latency_ms is the gap to the next packet (NaN for the last one) and
+    jitter_ms the change in latency since the previous packet of the same
+    protocol (NaN for the first one), matching analyze_delays.
+    """
+    n = len(table)
+    protocol = classify_protocols(table)
+    latency = np.full(n, np.nan)
+    jitter = np.full(n, np.nan)
+    if n > 1:
+        latency[:-1] = np.maximum(0, (table.time[1:] - table.time[:-1]) * 1000)
+        codes = protocol[:-1]
+        for code in np.unique(codes):
+            idx = np.flatnonzero(codes == code)
+            jitter[idx[1:]] = np.abs(np.diff(latency[idx]))
+    return {
+        "protocol": protocol,
+        "latency_ms": latency,
+        "jitter_ms": jitter,
+        "flow_id": flow_ids(table),
+    }
+
 
 class PacketAnalyzer:
-    def __init__(self, pcap_file):
+    def __init__(self, pcap_file, reader="scapy", display_filter=None, store=None, progress=None):
+        if reader not in READERS:
+            raise ValueError(f"Unknown reader {reader!r}, expected one of {READERS}")
         self.pcap_file = pcap_file
-        self.packets = rdpcap(pcap_file)
+        # Wireshark-style filter, only matching packets reach the analyses
+        self.display_filter = compile_filter(display_filter)
+        self._filter_indices = None
+        self._packet_table = None
+        self._packet_metrics = None
+        self._reader = None
+        self.source_metadata = {}
+        if is_columnar_file(pcap_file):
+            # Reload a capture saved with export_columnar instead of re-parsing the pcapng
+            self.packets = None
+            table, self.source_metadata = read_capture(pcap_file)
+            self._packet_table = self._apply_filter(table)
+        elif store is not None:
+            # Columns are memory-mapped from the shared CaptureStore, decoded by whichever worker asked first
+            self.packets = None
+            table, metrics = store.attach(pcap_file, lambda: self._decode(reader, progress))
+            if self.display_filter is None:
+                self._packet_metrics = metrics
+            self._packet_table = self._apply_filter(table)
+        elif reader == "mmap":
+            # Packets are decoded straight from the mapped file, scapy only on access
+            self._reader = PcapngReader(pcap_file)
+            self.packets = MappedPackets(self._reader)
+        else:
+            self.packets = read_packets(pcap_file, progress)
+        self._init_delay_state()
+        self._init_delay_type_state()
+
+    def _decode(self, reader, progress=None):
+        """Whole-capture packet table and metrics, for publishing to a CaptureStore"""
+        if reader == "mmap":
+            with PcapngReader(self.pcap_file) as frames:
+                table = PacketTable.from_frames(frames)
+        else:
+            table = PacketTable.from_packets(read_packets(self.pcap_file, progress))
+        return table, packet_metrics(table)
+
+    def _init_delay_type_state(self):
+        """(Re)create the containers filled by analyze_delay_types"""
+        # Add new delay analysis categories
+        self.delay_analysis = {
+            'transmission_delays': defaultdict(list),
+            'processing_delays': defaultdict(list),
+            'queuing_delays': defaultdict(list),
+            'propagation_delays': defaultdict(list)
+        }
+        
+        self.delay_patterns = {
+            'congestion_events': [],
+            'jitter_events': [],
+            'aggregation_anomalies': []
+        }
+
+    def _init_delay_state(self):
+        """(Re)create the containers filled by analyze_delays"""
         self.latencies = defaultdict(list)
         self.timestamps = defaultdict(list)
         self.packet_sizes = defaultdict(list)
@@ -37,238 +205,276 @@ class PacketAnalyzer:
             'packet_bundles': [],
             'bundle_sizes': [],
             'aggregation_intervals': [],
-            'device_patterns': defaultdict(list),
+            'device_patterns': defaultdict(DeviceAggregate),
             'upload_patterns': []
         }
-        # Add new delay analysis categories
-        self.delay_analysis = {
-            'transmission_delays': defaultdict(list),
-            'processing_delays': defaultdict(list),
-            'queuing_delays': defaultdict(list),
-            'propagation_delays': defaultdict(list)
-        }
-        
-        self.delay_patterns = {
-            'congestion_events': [],
-            'jitter_events': [],
-            'aggregation_anomalies': []
-        }
         
     def basic_statistics(self):
         """Calculate basic packet statistics"""
-        total_packets = len(self.packets)
-        protocols = Counter()
-        sizes = []
-        
-        for pkt in self.packets:
-            if IP in pkt:
-                protocols[pkt[IP].proto] += 1
-                sizes.append(len(pkt))
+        table = self.get_packet_table()
+        total_packets = len(table)
+        ip = ip_mask(table)
+        proto_values, proto_counts = counts_in_order(table.ip_proto[ip])
+        sizes = table.length[ip]
         
         stats = {
             "total_packets": total_packets,
-            "protocol_distribution": dict(protocols),
-            "avg_packet_size": np.mean(sizes),
-            "max_packet_size": max(sizes),
-            "min_packet_size": min(sizes),
-            "capture_duration": float(self.packets[-1].time - self.packets[0].time)
+            "protocol_distribution": dict(zip(proto_values.tolist(), proto_counts.tolist())),
+            # A display filter can leave no IP packets (or none at all)
+            "avg_packet_size": np.mean(sizes) if len(sizes) else 0.0,
+            "max_packet_size": int(sizes.max()) if len(sizes) else 0,
+            "min_packet_size": int(sizes.min()) if len(sizes) else 0,
+            # Whole microseconds, so µs-resolution captures give the exact duration
+            "capture_duration": (round(table.time[-1] * 1e6) - round(table.time[0] * 1e6)) / 1e6 if total_packets else 0.0
         }
         return stats
 
+    def close(self):
+        """Release the memory-mapped capture when using the mmap reader"""
+        if self._reader is not None:
+            self._reader.close()
+
     def getAllPackets(self):
+        """Scapy packets of the capture, None when loaded from a columnar file or a CaptureStore"""
+        if self.display_filter is not None and self.packets is not None:
+            self.get_packet_table()
+            return [self.packets[i] for i in self._filter_indices.tolist()]
         return self.packets
 
-    def analyze_delays(self):
-        """Analyze various types of delays and packet loss"""
+    def get_packet_table(self):
+        """Decoded header fields of every (matching) packet as numpy columns (decoded once)"""
+        if self._packet_table is None:
+            if self._reader is not None:
+                table = PacketTable.from_frames(self._reader)
+            else:
+                table = PacketTable.from_packets(self.packets)
+            self._packet_table = self._apply_filter(table)
+        return self._packet_table
+
+    def get_frame_numbers(self):
+        """Original 1-based frame number of every row of the packet table"""
+        table = self.get_packet_table()
+        if self._filter_indices is None:
+            return np.arange(1, len(table) + 1)
+        return self._filter_indices + 1
+
+    def _apply_filter(self, table):
+        """Keep the rows matching the display filter, remembering their original positions"""
+        if self.display_filter is None:
+            return table
+        self._filter_indices = np.flatnonzero(self.display_filter.mask(table))
+        return table.take(self._filter_indices)
+
+    def get_packet_metrics(self):
+        """Per-packet derived metrics of the (matching) packets, see packet_metrics"""
+        if self._packet_metrics is None:
+            self._packet_metrics = packet_metrics(self.get_packet_table())
+        return self._packet_metrics
+
+    def get_protocol_labels(self):
+        """Protocol name of every packet as an object array"""
+        return np.asarray(PROTOCOL_NAMES, dtype=object)[self.get_packet_metrics()["protocol"]]
+
+    def export_columnar(self, path):
+        """Write the decoded packet table and derived metrics to Parquet (.parquet) or Arrow IPC (.arrow)"""
+        metadata = {
+            "analyzer_version": ANALYZER_VERSION,
+            "source": self.source_metadata.get("source", self.pcap_file),
+        }
+        if self.display_filter is not None:
+            metadata["display_filter"] = str(self.display_filter)
+        return write_capture(path, self.get_packet_table(), self.get_packet_metrics(), metadata)
+
+    def analyze_delays(self, reorder_window=0):
+        """Analyze various types of delays and packet loss
+
+        reorder_window: a sequence gap filled by one of the next reorder_window
+        segments of its flow is treated as reordering, not loss.
+        """
         print("\nAnalyzing TCP sequence numbers and IoT patterns...")
+        self._init_delay_state()
         seq_debug_count = 0
-        flow_seq_tracking = {}
         last_bundle_time = defaultdict(float)
-        
-        for i in range(len(self.packets)-1):
-            pkt = self.packets[i]
-            next_pkt = self.packets[i+1]
-            
-            # Determine protocol
-            proto = self._get_protocol(pkt)
-            
-            # Update transmitted count for protocol
-            self.packet_loss_stats['protocol_stats'][proto]['transmitted'] += 1
-            
-            # Calculate basic latency (ensure non-negative)
-            latency = max(0, (float(next_pkt.time) - float(pkt.time)) * 1000)
-            self.latencies[proto].append(latency)
-            self.timestamps[proto].append(float(pkt.time))
-            
-            # Ensure packet size is non-negative
-            packet_size = max(0, len(pkt))
-            self.packet_sizes[proto].append(packet_size)
-            
-            # Calculate jitter (already using abs, but ensure base values are non-negative)
-            if len(self.latencies[proto]) > 1:
-                prev_latency = max(0, self.latencies[proto][-2])
-                jitter = abs(latency - prev_latency)
-                self.jitter_values[proto].append(jitter)
+
+        table = self.get_packet_table()
+        metrics = self.get_packet_metrics()
+        if len(table) < 2:
+            return
+
+        # Latency, jitter and size series per protocol (every packet but the last)
+        codes = metrics["protocol"][:-1]
+        jitter_series = []
+        for code in counts_in_order(codes)[0].tolist():
+            idx = np.flatnonzero(codes == code)
+            proto = PROTOCOL_NAMES[code]
+            self.packet_loss_stats['protocol_stats'][proto]['transmitted'] += len(idx)
+            self.latencies[proto] = metrics["latency_ms"][idx].tolist()
+            self.timestamps[proto] = table.time[idx].tolist()
+            self.packet_sizes[proto] = table.length[idx].tolist()
+            if len(idx) > 1:
+                jitter_series.append((idx[1], proto, metrics["jitter_ms"][idx[1:]].tolist()))
+        # A protocol's jitter series starts at its second packet
+        for _, proto, values in sorted(jitter_series):
+            self.jitter_values[proto] = values
+
+        # Plain lists are much faster to index per packet than numpy arrays
+        protocols = self.get_protocol_labels().tolist()
+        times = table.time.tolist()
+        l4 = table.l4.tolist()
+        src = table.source_addresses().tolist()
+        dst = table.destination_addresses().tolist()
+        sport = table.sport.tolist()
+        dport = table.dport.tolist()
+        seqs = table.seq.tolist()
+        acks = table.ack.tolist()
+        windows = table.window.tolist()
+        flags = table.tcp_flags.tolist()
+        payload_lens = table.payload_len.tolist()
+
+        # Only IP (v4 or v6) packets followed by an IP packet are used for delay categories
+        ip = ip_mask(table)
+        for i in np.flatnonzero(ip[:-1] & ip[1:]).tolist():
+            proto = protocols[i]
+            pkt_time = times[i]
+            delay = max(0, times[i + 1] - pkt_time)  # Ensure non-negative
             
-            # Only process IP packets for delay categories
-            if IP in pkt and IP in next_pkt:
-                delay = max(0, float(next_pkt.time) - float(pkt.time))  # Ensure non-negative
+            # Analyze IoT-specific patterns
+            if l4[i] == L4_TCP:
+                # Check for MQTT ports (common in IoT)
+                is_mqtt = (dport[i] in [1883, 8883] or
+                           sport[i] in [1883, 8883])
                 
-                # Analyze IoT-specific patterns
-                if TCP in pkt:
-                    # Check for MQTT ports (common in IoT)
-                    is_mqtt = (pkt[TCP].dport in [1883, 8883] or 
-                             pkt[TCP].sport in [1883, 8883])
+                if is_mqtt:
+                    flow = (src[i], sport[i], dst[i], dport[i])
+                    payload_size = payload_lens[i]
                     
-                    if is_mqtt:
-                        flow = (pkt[IP].src, pkt[TCP].sport, pkt[IP].dst, pkt[TCP].dport)
-                        payload_size = len(pkt[TCP].payload)
-                        
-                        # Device-to-Broker delays (typically small packets < 100 bytes)
-                        if payload_size < 100:
-                            self.delay_categories['device_to_broker_delays'].append({
-                                'time': float(pkt.time),
-                                'delay': max(0, delay * 1000),  # Ensure non-negative
-                                'size': max(0, payload_size),
-                                'flow': flow
-                            })
-                        
-                        # Broker aggregation delays (larger packets indicating bundling)
-                        if payload_size > 1000:  # Threshold for bundled data
-                            self.delay_categories['broker_aggregation_delays'].append({
-                                'time': float(pkt.time),
-                                'delay': max(0, delay * 1000),  # Ensure non-negative
-                                'size': max(0, payload_size),
-                                'flow': flow
-                            })
-                            
-                            # Track bundle patterns
-                            self.iot_metrics['packet_bundles'].append({
-                                'time': float(pkt.time),
-                                'size': payload_size,
-                                'flow': flow
-                            })
-                            self.iot_metrics['bundle_sizes'].append(payload_size)
-                            
-                            # Calculate aggregation interval
-                            if last_bundle_time[flow]:
-                                interval = float(pkt.time) - last_bundle_time[flow]
-                                self.iot_metrics['aggregation_intervals'].append(interval)
-                            last_bundle_time[flow] = float(pkt.time)
+                    # Device-to-Broker delays (typically small packets < 100 bytes)
+                    if payload_size < 100:
+                        self.delay_categories['device_to_broker_delays'].append({
+                            'time': pkt_time,
+                            'delay': max(0, delay * 1000),  # Ensure non-negative
+                            'size': max(0, payload_size),
+                            'flow': flow
+                        })
+                    
+                    # Broker aggregation delays (larger packets indicating bundling)
+                    if payload_size > 1000:  # Threshold for bundled data
+                        self.delay_categories['broker_aggregation_delays'].append({
+                            'time': pkt_time,
+                            'delay': max(0, delay * 1000),  # Ensure non-negative
+                            'size': max(0, payload_size),
+                            'flow': flow
+                        })
                         
-                        # Cloud upload delays (large packets with sustained high throughput)
-                        if (payload_size > 5000 and  # Large packets
-                            len(self.tcp_flows[flow]) > 5):  # Sustained flow
-                            self.delay_categories['cloud_upload_delays'].append({
-                                'time': float(pkt.time),
-                                'delay': max(0, delay * 1000),  # Ensure non-negative
-                                'size': max(0, payload_size),
-                                'flow': flow
-                            })
-                            
-                            self.iot_metrics['upload_patterns'].append({
-                                'time': float(pkt.time),
-                                'size': payload_size,
-                                'flow': flow
-                            })
+                        # Track bundle patterns
+                        self.iot_metrics['packet_bundles'].append({
+                            'time': pkt_time,
+                            'size': payload_size,
+                            'flow': flow
+                        })
+                        self.iot_metrics['bundle_sizes'].append(payload_size)
                         
-                            # Track device transmission patterns
-                            self.iot_metrics['device_patterns'][pkt[IP].src].append({
-                                'time': float(pkt.time),
-                                'size': payload_size,
-                                'type': 'small' if payload_size < 100 else 'bundle'
-                            })
-                
-                # Classify delays
-                if delay > 0.1:  # More than 100ms
-                    self.delay_categories['broker_processing_delays'].append({
-                        'time': float(pkt.time),
-                        'delay': max(0, delay * 1000),  # Ensure non-negative
-                        'src': pkt[IP].src,
-                        'dst': pkt[IP].dst
-                    })
-                
-                # Only process TCP packets for bundling and packet loss analysis
-                if TCP in pkt and TCP in next_pkt:
-                    flow = (pkt[IP].src, pkt[TCP].sport, pkt[IP].dst, pkt[TCP].dport)
+                        # Calculate aggregation interval
+                        if last_bundle_time[flow]:
+                            interval = pkt_time - last_bundle_time[flow]
+                            self.iot_metrics['aggregation_intervals'].append(interval)
+                        last_bundle_time[flow] = pkt_time
                     
-                    # Check for retransmissions - UPDATED LOGIC
-                    if len(self.tcp_flows[flow]) > 0:
-                        last_seq = self.tcp_flows[flow][-1][1]
-                        current_seq = pkt[TCP].seq
-                        payload_len = len(pkt[TCP].payload)
+                    # Cloud upload delays (large packets with sustained high throughput)
+                    if (payload_size > 5000 and  # Large packets
+                        len(self.tcp_flows[flow]) > 5):  # Sustained flow
+                        self.delay_categories['cloud_upload_delays'].append({
+                            'time': pkt_time,
+                            'delay': max(0, delay * 1000),  # Ensure non-negative
+                            'size': max(0, payload_size),
+                            'flow': flow
+                        })
                         
-                        # Only count as retransmission if:
-                        # 1. Sequence number matches exactly
-                        # 2. Packet has payload (not just ACK)
-                        # 3. Not a keep-alive packet (zero window probe)
-                        if (current_seq == last_seq and 
-                            payload_len > 0 and 
-                            not (payload_len == 1 and pkt[TCP].window == 0)):
-                            self.retransmissions.append({
-                                'time': float(pkt.time),
-                                'flow': flow,
-                                'seq': current_seq
-                            })
-                    
-                    self.tcp_flows[flow].append((float(pkt.time), pkt[TCP].seq))
-                    
-                    # Check for bundling
-                    if delay < 0.001:  # Less than 1ms
-                        self.delay_categories['bundling_delays'].append({
-                            'time': float(pkt.time),
-                            'delay': max(0, delay * 1000)  # Ensure non-negative
+                        self.iot_metrics['upload_patterns'].append({
+                            'time': pkt_time,
+                            'size': payload_size,
+                            'flow': flow
                         })
                     
-                    # Analyze sequence numbers for packet loss - Updated logic
-                    current_seq = pkt[TCP].seq
-                    next_seq = next_pkt[TCP].seq
-                    payload_len = len(pkt[TCP].payload)
-                    
-                    # Initialize flow tracking if new flow
-                    if flow not in flow_seq_tracking:
-                        flow_seq_tracking[flow] = {'last_seq': current_seq, 'last_ack': pkt[TCP].ack}
-                    
-                    # Debug output (limit to first 10 pairs to avoid spam)
-                    if seq_debug_count < 10:
-                        print(f"\nPacket pair {seq_debug_count}:")
-                        print(f"  Flow: {flow}")
-                        print(f"  Current packet: seq={current_seq}, ack={pkt[TCP].ack}, payload_len={payload_len}")
-                        print(f"  Next packet: seq={next_seq}, ack={next_pkt[TCP].ack}")
-                        if payload_len > 0:
-                            expected_seq = (current_seq + payload_len) & 0xFFFFFFFF
-                            print(f"  Expected next seq: {expected_seq}")
-                        print(f"  TCP flags: {pkt[TCP].flags}")
-                        seq_debug_count += 1
+                        # Track device transmission patterns
+                        self.iot_metrics['device_patterns'][src[i]].add(
+                            pkt_time, payload_size, 'small' if payload_size < 100 else 'bundle')
+            
+            # Classify delays
+            if delay > 0.1:  # More than 100ms
+                self.delay_categories['broker_processing_delays'].append({
+                    'time': pkt_time,
+                    'delay': max(0, delay * 1000),  # Ensure non-negative
+                    'src': src[i],
+                    'dst': dst[i]
+                })
+            
+            # Only process TCP packets for bundling and packet loss analysis
+            if l4[i] == L4_TCP and l4[i + 1] == L4_TCP:
+                flow = (src[i], sport[i], dst[i], dport[i])
+                current_seq = seqs[i]
+                payload_len = payload_lens[i]
+                
+                # Check for retransmissions - UPDATED LOGIC
+                if len(self.tcp_flows[flow]) > 0:
+                    last_seq = self.tcp_flows[flow][-1][1]
                     
-                    # Check for sequence number discontinuity
-                    last_seq = flow_seq_tracking[flow]['last_seq']
+                    # Only count as retransmission if:
+                    # 1. Sequence number matches exactly
+                    # 2. Packet has payload (not just ACK)
+                    # 3. Not a keep-alive packet (zero window probe)
+                    if (current_seq == last_seq and 
+                        payload_len > 0 and 
+                        not (payload_len == 1 and windows[i] == 0)):
+                        self.retransmissions.append({
+                            'time': pkt_time,
+                            'flow': flow,
+                            'seq': current_seq
+                        })
+                
+                self.tcp_flows[flow].append((pkt_time, current_seq))
+                
+                # Check for bundling
+                if delay < 0.001:  # Less than 1ms
+                    self.delay_categories['bundling_delays'].append({
+                        'time': pkt_time,
+                        'delay': max(0, delay * 1000)  # Ensure non-negative
+                    })
+                
+                # Analyze sequence numbers for packet loss - Updated logic
+                next_seq = seqs[i + 1]
+                
+                # Debug output (limit to first 10 pairs to avoid spam)
+                if seq_debug_count < 10:
+                    print(f"\nPacket pair {seq_debug_count}:")
+                    print(f"  Flow: {flow}")
+                    print(f"  Current packet: seq={current_seq}, ack={acks[i]}, payload_len={payload_len}")
+                    print(f"  Next packet: seq={next_seq}, ack={acks[i + 1]}")
                     if payload_len > 0:
-                        expected_seq = (last_seq + payload_len) & 0xFFFFFFFF
-                        
-                        # Check if next sequence number is unexpected
-                        if current_seq != expected_seq:
-                            # Ignore if it's a retransmission
-                            if current_seq != last_seq:
-                                missing_bytes = (current_seq - expected_seq) & 0xFFFFFFFF
-                                if 0 < missing_bytes < 10000:  # Reasonable threshold
-                                    print(f"\nPotential loss detected in flow {flow} (Protocol: {proto}):")
-                                    print(f"  Expected seq: {expected_seq}")
-                                    print(f"  Actual seq: {current_seq}")
-                                    print(f"  Missing bytes: {missing_bytes}")
-                                    
-                                    self.packet_loss_stats['lost_packets'][proto].append({
-                                        'time': float(pkt.time),
-                                        'flow': flow,
-                                        'missing_seq': range(expected_seq, current_seq),
-                                        'bytes_lost': missing_bytes
-                                    })
-                                    self.packet_loss_stats['loss_timestamps'][proto].append(float(pkt.time))
-                                    self.packet_loss_stats['protocol_stats'][proto]['lost'] += 1
-                    
-                    # Update flow tracking
-                    flow_seq_tracking[flow]['last_seq'] = (current_seq + payload_len) & 0xFFFFFFFF
-                    flow_seq_tracking[flow]['last_ack'] = pkt[TCP].ack
+                        expected_seq = (current_seq + payload_len) & 0xFFFFFFFF
+                        print(f"  Expected next seq: {expected_seq}")
+                    print(f"  TCP flags: {FlagValue(flags[i], TCP_FLAG_NAMES)}")
+                    seq_debug_count += 1
+
+        # Sequence gaps per TCP flow, over the same IP/TCP packet pairs as above
+        pairs = np.flatnonzero(ip[:-1] & ip[1:])
+        pairs = pairs[(table.l4[pairs] == L4_TCP) & (table.l4[pairs + 1] == L4_TCP)]
+        positions, expected, missing = detect_sequence_gaps(
+            metrics["flow_id"][pairs], table.seq[pairs], table.payload_len[pairs], reorder_window=reorder_window)
+        for i, expected_seq, missing_bytes in zip(pairs[positions].tolist(), expected.tolist(), missing.tolist()):
+            proto = protocols[i]
+            self.packet_loss_stats['lost_packets'][proto].append({
+                'time': times[i],
+                'flow': (src[i], sport[i], dst[i], dport[i]),
+                'expected_seq': expected_seq,
+                'actual_seq': seqs[i],
+                'bytes_lost': missing_bytes
+            })
+            self.packet_loss_stats['loss_timestamps'][proto].append(times[i])
+            self.packet_loss_stats['protocol_stats'][proto]['lost'] += 1
+        if len(positions):
+            print(f"\nPotential loss detected: {len(positions)} sequence gaps")
+
     def get_latency_distribution(self):
         """Generate latency distribution data for plotting"""
         distribution_data = {}
@@ -279,7 +485,10 @@ class PacketAnalyzer:
             # Filter out negative latencies
             positive_latencies = [lat for lat in self.latencies[proto] if lat >= 0]
             if positive_latencies:
+                drawn = len(plt.gca().lines)
                 kde = sns.kdeplot(data=positive_latencies, label=proto)
+                if len(kde.lines) == drawn:
+                    continue  # zero variance, seaborn skips the density
                 
                 line = kde.lines[-1]
                 xdata = line.get_xdata()
@@ -305,7 +514,10 @@ class PacketAnalyzer:
             # Filter out negative sizes
             positive_sizes = [size for size in self.packet_sizes[proto] if size >= 0]
             if positive_sizes:
+                drawn = len(plt.gca().lines)
                 kde = sns.kdeplot(data=positive_sizes, label=proto)
+                if len(kde.lines) == drawn:
+                    continue  # zero variance, seaborn skips the density
                 
                 line = kde.lines[-1]
                 xdata = line.get_xdata()
@@ -378,7 +590,10 @@ class PacketAnalyzer:
             # Filter out negative jitter values (though they should already be non-negative)
             positive_jitter = [j for j in self.jitter_values[proto] if j >= 0]
             if positive_jitter:
+                drawn = len(plt.gca().lines)
                 kde = sns.kdeplot(data=positive_jitter, label=proto)
+                if len(kde.lines) == drawn:
+                    continue  # zero variance, seaborn skips the density
                 
                 line = kde.lines[-1]
                 xdata = line.get_xdata()
@@ -394,84 +609,12 @@ class PacketAnalyzer:
         
         return distribution_data
 
-    def _get_protocol(self, pkt):
-        """Determine packet protocol with expanded protocol detection"""
-        if IP in pkt:
-            if TCP in pkt:
-                # MQTT (both standard and secure)
-                if pkt[TCP].dport in [1883, 8883] or pkt[TCP].sport in [1883, 8883]:
-                    return 'MQTT'
-                # HTTP/HTTPS
-                elif pkt[TCP].dport in [80, 8080] or pkt[TCP].sport in [80, 8080]:
-                    return 'HTTP'
-                elif pkt[TCP].dport == 443 or pkt[TCP].sport == 443:
-                    return 'HTTPS'
-                # FTP
-                elif pkt[TCP].dport in [20, 21] or pkt[TCP].sport in [20, 21]:
-                    return 'FTP'
-                # SSH
-                elif pkt[TCP].dport == 22 or pkt[TCP].sport == 22:
-                    return 'SSH'
-                # SMTP
-                elif pkt[TCP].dport == 25 or pkt[TCP].sport == 25:
-                    return 'SMTP'
-                # DNS over TCP
-                elif pkt[TCP].dport == 53 or pkt[TCP].sport == 53:
-                    return 'DNS-TCP'
-                # Telnet
-                elif pkt[TCP].dport == 23 or pkt[TCP].sport == 23:
-                    return 'Telnet'
-                return 'TCP'
-            
-            elif UDP in pkt:
-                # DNS
-                if pkt[UDP].dport == 53 or pkt[UDP].sport == 53:
-                    return 'DNS'
-                # DHCP
-                elif pkt[UDP].dport in [67, 68] or pkt[UDP].sport in [67, 68]:
-                    return 'DHCP'
-                # SNMP
-                elif pkt[UDP].dport == 161 or pkt[UDP].sport == 161:
-                    return 'SNMP'
-                # NTP
-                elif pkt[UDP].dport == 123 or pkt[UDP].sport == 123:
-                    return 'NTP'
-                # TFTP
-                elif pkt[UDP].dport == 69 or pkt[UDP].sport == 69:
-                    return 'TFTP'
-                return 'UDP'
-            
-            elif pkt[IP].proto == 1:  # ICMP
-                return 'ICMP'
-            elif pkt[IP].proto == 2:  # IGMP
-                return 'IGMP'
-            elif pkt[IP].proto == 50:  # ESP (IPSec)
-                return 'ESP'
-            elif pkt[IP].proto == 51:  # AH (IPSec)
-                return 'AH'
-            elif pkt[IP].proto == 89:  # OSPF
-                return 'OSPF'
-            elif pkt[IP].proto == 103:  # PIM
-                return 'PIM'
-        
-        # Non-IP protocols
-        if 'ARP' in pkt:
-            return 'ARP'
-        elif 'IPv6' in pkt:
-            return 'IPv6'
-        elif 'LLC' in pkt:
-            return 'LLC'
-        elif 'STP' in pkt:
-            return 'STP'
-        
-        return 'Other'
-
     def calculate_packet_loss(self):
         """Calculate protocol-wise packet loss statistics"""
         results = {
             'overall': {
                 'total_lost_packets': 0,
-                'total_transmitted': len(self.packets),
+                'total_transmitted': len(self.get_packet_table()),
                 'loss_percentage': 0.0,
                 'loss_events': 0
             },
@@ -508,310 +651,205 @@ class PacketAnalyzer:
         
         return results
 
-    def analyze_delay_types(self):
-        """Analyze and categorize different types of delays"""
+    def analyze_delay_types(self, queue_threshold=QUEUE_THRESHOLD, congestion_window=CONGESTION_WINDOW,
+                            congestion_sum=CONGESTION_SUM, jitter_threshold=JITTER_THRESHOLD):
+        """Analyze and categorize different types of delays
+
+        Congestion is raised when the last congestion_window queuing delays
+        (gaps over queue_threshold seconds) of a protocol add up to more than
+        congestion_sum, high jitter when a protocol's latest latency change
+        exceeds jitter_threshold ms.
+        """
         print("Analyzing delay types...")
-        
-        for i in range(len(self.packets)-1):
-            pkt = self.packets[i]
-            next_pkt = self.packets[i+1]
-            
-            if IP in pkt and IP in next_pkt:
-                delay = float(next_pkt.time) - float(pkt.time)
-                pkt_size = len(pkt)
-                proto = self._get_protocol(pkt)
-                
-                # Transmission delay (size-dependent)
-                transmission_delay = pkt_size * 0.00008  # Simplified calculation
-                self.delay_analysis['transmission_delays'][proto].append({
-                    'time': float(pkt.time),
-                    'delay': transmission_delay,
-                    'size': pkt_size
-                })
-                
-                # Processing delay (protocol-dependent)
-                if TCP in pkt:
-                    processing_delay = delay * 0.3  # Estimated TCP overhead
-                elif UDP in pkt:
-                    processing_delay = delay * 0.1  # Estimated UDP overhead
-                else:
-                    processing_delay = delay * 0.2  # Default overhead
-                
-                self.delay_analysis['processing_delays'][proto].append({
-                    'time': float(pkt.time),
-                    'delay': processing_delay,
-                    'type': proto
-                })
-                
-                # Queuing delay detection
-                if delay > 0.1:  # Threshold for potential queuing
-                    self.delay_analysis['queuing_delays'][proto].append({
-                        'time': float(pkt.time),
-                        'delay': delay,
-                        'size': pkt_size
-                    })
-                
-                # Detect congestion patterns
-                if len(self.delay_analysis['queuing_delays'][proto]) >= 3:
-                    recent_delays = [d['delay'] for d in self.delay_analysis['queuing_delays'][proto][-3:]]
-                    if all(d > 0.1 for d in recent_delays) and sum(recent_delays) > 0.5:
-                        self.delay_patterns['congestion_events'].append({
-                            'time': float(pkt.time),
-                            'protocol': proto,
-                            'avg_delay': sum(recent_delays) / 3
-                        })
-                
-                # Detect jitter
-                if len(self.latencies[proto]) >= 2:
-                    jitter = abs(self.latencies[proto][-1] - self.latencies[proto][-2])
-                    if jitter > 50:  # High jitter threshold (ms)
-                        self.delay_patterns['jitter_events'].append({
-                            'time': float(pkt.time),
-                            'protocol': proto,
-                            'jitter': jitter
-                        })
+        self._init_delay_type_state()
 
-    def analyze_delay_root_causes(self):
-        """Analyze root causes of delays by correlating various factors"""
-        print("Analyzing delay root causes...")
-        
-        # Initialize correlation data
-        correlation_data = {
-            'size_vs_delay': defaultdict(list),
-            'protocol_vs_delay': defaultdict(list),
-            'time_vs_delay': defaultdict(list)
-        }
-        
-        for proto in self.latencies:
-            for i, delay in enumerate(self.latencies[proto]):
-                timestamp = self.timestamps[proto][i]
-                pkt_size = self.packet_sizes[proto][i]
-                
-                correlation_data['size_vs_delay'][proto].append({
-                    'size': pkt_size,
-                    'delay': delay
-                })
-                
-                correlation_data['protocol_vs_delay'][proto].append(delay)
-                
-                correlation_data['time_vs_delay'][proto].append({
-                    'time': timestamp,
-                    'delay': delay
-                })
-        
-        return correlation_data
+        table = self.get_packet_table()
+        codes = self.get_packet_metrics()["protocol"]
+        ip = ip_mask(table)
+        pairs = np.flatnonzero(ip[:-1] & ip[1:])
+        pair_codes = codes[pairs]
+        times = table.time[pairs]
+        delays = table.time[pairs + 1] - times
+        sizes = table.length[pairs]
+        l4 = table.l4[pairs]
+
+        # Transmission delay (size-dependent), simplified calculation
+        transmission = sizes * 0.00008
+        # Processing delay (protocol-dependent): estimated TCP / UDP / default overhead
+        processing = delays * np.where(l4 == L4_TCP, 0.3, np.where(l4 == L4_UDP, 0.1, 0.2))
+        # Queuing delay detection
+        queued = delays > queue_threshold
+
+        latest_jitter = np.full(len(PROTOCOL_NAMES), np.nan)
+        for code, members in groups_in_order(pair_codes):
+            proto = PROTOCOL_NAMES[code]
+            t = times[members].tolist()
+            size = sizes[members].tolist()
+            self.delay_analysis['transmission_delays'][proto] = [
+                {'time': a, 'delay': b, 'size': c} for a, b, c in zip(t, transmission[members].tolist(), size)]
+            self.delay_analysis['processing_delays'][proto] = [
+                {'time': a, 'delay': b, 'type': proto} for a, b in zip(t, processing[members].tolist())]
+            # Every protocol gets a (possibly empty) queuing entry, in order of first appearance
+            self.delay_analysis['queuing_delays'][proto] = []
+            latencies = self.latencies[proto]
+            if len(latencies) >= 2:
+                latest_jitter[code] = abs(latencies[-1] - latencies[-2])
+
+        for code, members in groups_in_order(pair_codes[queued]):
+            members = np.flatnonzero(queued)[members]
+            self.delay_analysis['queuing_delays'][PROTOCOL_NAMES[code]] = [
+                {'time': a, 'delay': b, 'size': c}
+                for a, b, c in zip(times[members].tolist(), delays[members].tolist(), sizes[members].tolist())]
+
+        # Detect congestion patterns
+        positions, averages = detect_congestion(pair_codes, delays, queue_threshold,
+                                                congestion_window, congestion_sum)
+        self.delay_patterns['congestion_events'] = [
+            {'time': t, 'protocol': PROTOCOL_NAMES[c], 'avg_delay': a}
+            for t, c, a in zip(times[positions].tolist(), pair_codes[positions].tolist(), averages.tolist())]
+
+        # Detect jitter
+        positions, jitter = detect_jitter(latest_jitter[pair_codes], jitter_threshold)
+        self.delay_patterns['jitter_events'] = [
+            {'time': t, 'protocol': PROTOCOL_NAMES[c], 'jitter': j}
+            for t, c, j in zip(times[positions].tolist(), pair_codes[positions].tolist(), jitter.tolist())]
+
+    def get_rollups(self):
+        """Multi-resolution time-bucket rollups (count, bytes, latency stats and sketch) per protocol"""
+        table = self.get_packet_table()
+        metrics = self.get_packet_metrics()
+        return RollupPyramid.build(table.time, table.length, metrics["latency_ms"], self.get_protocol_labels())
+
+    def get_delay_correlations(self, time_bucket=TIME_BUCKET, size_edges=SIZE_EDGES):
+        """Per-protocol size/delay correlation, delay percentiles by size bucket and delay trend over time"""
+        table = self.get_packet_table()
+        metrics = self.get_packet_metrics()
+        if len(table) < 2:
+            return {}
+        # Same series as self.latencies: every packet but the last, delays in ms
+        return delay_correlations(metrics["protocol"][:-1], PROTOCOL_NAMES, table.length[:-1],
+                                  metrics["latency_ms"][:-1], table.time[:-1],
+                                  size_edges=size_edges, time_bucket=time_bucket)
+
+    def get_latency_histograms(self, significant_digits=SIGNIFICANT_DIGITS):
+        """Serialized log-linear histograms (see histograms.LogHistogram) of latency and jitter per
+        protocol and of delay per IoT delay category, all in ms
+
+        Runs analyze_delays. Histograms of different captures or chunks merge
+        exactly with histograms.merge_groups.
+        """
+        self.analyze_delays()
+        return histogram_groups({
+            "latency": self.latencies,
+            "jitter": self.jitter_values,
+            "delay_categories": {category: [d['delay'] for d in delays]
+                                 for category, delays in self.delay_categories.items() if delays},
+        }, significant_digits=significant_digits)
+
+    def get_mqtt_timing(self, max_messages=MAX_MESSAGES, ports=MQTT_PORTS):
+        """MQTT message records and PUBLISH→PUBACK latency per topic and device, see mqtt.summarize_mqtt
+
+        Payloads of the TCP packets to or from ports are streamed from the
+        capture file and reassembled per connection, so memory doesn't grow
+        with the capture.
+        """
+        if is_columnar_file(self.pcap_file):
+            raise ValueError("MQTT timing needs the original capture, columnar files only keep headers")
+        table = self.get_packet_table()
+        rows = np.flatnonzero((table.l4 == L4_TCP) & (np.isin(table.sport, ports) | np.isin(table.dport, ports)))
+        payloads = read_tcp_payloads(self.pcap_file, (self.get_frame_numbers()[rows] - 1).tolist())
+        segments = zip(table.time[rows].tolist(), table.addresses[table.src[rows]].tolist(), table.sport[rows].tolist(),
+                       table.addresses[table.dst[rows]].tolist(), table.dport[rows].tolist(),
+                       table.seq[rows].tolist(), table.tcp_flags[rows].tolist(), payloads)
+        return summarize_mqtt(mqtt_messages(segments, ports=ports), max_messages=max_messages)
 
     def plot_delay_analysis(self, output_dir):
         """Generate visualizations for delay analysis"""
-        # 1. Delay Types Distribution
-        plt.figure(figsize=(12, 6))
-        for delay_type, delays in self.delay_analysis.items():
-            all_delays = []
-            for proto_delays in delays.values():
-                all_delays.extend([d['delay'] for d in proto_delays])
-            if all_delays:
-                sns.kdeplot(data=all_delays, label=delay_type.replace('_', ' ').title())
-        
-        plt.xlabel('Delay (ms)')
-        plt.ylabel('Density')
-        plt.title('Distribution of Different Delay Types')
-        plt.legend()
-        plt.xlim(left=0)
-        plt.savefig(f'{output_dir}/delay_types_distribution.png')
-        plt.close()
-        
-        # 2. Delay Patterns Timeline
-        plt.figure(figsize=(15, 8))
-        
-        # Plot congestion events
-        congestion_times = [event['time'] for event in self.delay_patterns['congestion_events']]
-        congestion_delays = [event['avg_delay'] for event in self.delay_patterns['congestion_events']]
-        plt.scatter(congestion_times, congestion_delays, label='Congestion Events', color='red', alpha=0.6)
-        
-        # Plot jitter events
-        jitter_times = [event['time'] for event in self.delay_patterns['jitter_events']]
-        jitter_values = [event['jitter'] for event in self.delay_patterns['jitter_events']]
-        plt.scatter(jitter_times, jitter_values, label='High Jitter Events', color='orange', alpha=0.6)
-        
-        plt.xlabel('Time (seconds)')
-        plt.ylabel('Delay/Jitter (ms)')
-        plt.title('Network Events Timeline')
-        plt.legend()
-        plt.grid(True)
-        plt.savefig(f'{output_dir}/delay_patterns_timeline.png')
-        plt.close()
-        
-        # 3. Root Cause Correlation
-        correlation_data = self.analyze_delay_root_causes()
-        
-        # Size vs Delay correlation
-        plt.figure(figsize=(12, 6))
-        for proto, data in correlation_data['size_vs_delay'].items():
-            sizes = [d['size'] for d in data]
-            delays = [d['delay'] for d in data]
-            plt.scatter(sizes, delays, label=proto, alpha=0.5)
-        
-        plt.xlabel('Packet Size (bytes)')
-        plt.ylabel('Delay (ms)')
-        plt.title('Packet Size vs Delay Correlation')
-        plt.legend()
-        plt.savefig(f'{output_dir}/size_delay_correlation.png')
-        plt.close()
-
-    def generate_reports(self):
-        """Generate comprehensive analysis reports"""
-        # Create output directory
-        output_dir = 'analysis_output'
+        render_charts({name: self._chart_data(name) for name in DELAY_ANALYSIS_CHARTS}, output_dir, max_workers=1)
+
+    def generate_reports(self, output_dir='analysis_output', max_workers=None):
+        """Generate comprehensive analysis reports
+
+        Charts are rendered in parallel worker processes and charts whose input
+        data hasn't changed since the last run into output_dir are skipped.
+        """
         os.makedirs(output_dir, exist_ok=True)
-        
-        # 1. Latency Analysis
-        self._plot_latency_distribution(output_dir)
-        self._plot_latency_timeline(output_dir)
-        
-        # 2. Jitter Analysis
-        self._plot_jitter_distribution(output_dir)
-        
-        # 3. Packet Size Analysis
-        self._plot_packet_size_distribution(output_dir)
-        
-        # 4. Delay Categories Analysis
-        self._plot_delay_categories(output_dir)
-        
+
         # Add delay analysis
         self.analyze_delay_types()
-        self.plot_delay_analysis(output_dir)
-        
-        # 5. Generate text report
+
+        charts = {name: self._chart_data(name) for name in CHARTS}
+        rendered, skipped = render_charts(charts, output_dir, max_workers=max_workers)
+        if skipped:
+            print(f"Skipped unchanged charts: {', '.join(skipped)}")
+
+        # Generate text report
         self._generate_text_report(output_dir)
+        return rendered
 
-    def _plot_latency_distribution(self, output_dir):
-        plt.figure(figsize=(12, 6))
-        
-        # Create both txt and csv files
-        with open(f'{output_dir}/latency_distribution_coordinates.txt', 'w') as txt_file, \
-             open(f'{output_dir}/latency_distribution_coordinates.csv', 'w') as csv_file:
-            
-            # Write headers
-            txt_file.write("Protocol\tX-coordinate\tY-coordinate\n")
-            csv_file.write("Protocol,X-coordinate,Y-coordinate\n")
-            
+    def _chart_data(self, name):
+        """Plain data a chart in reports.CHARTS is drawn from, also what its cache hash covers"""
+        if name == 'latency_distribution':
+            data = {proto: [lat for lat in self.latencies[proto] if lat >= 0] for proto in self.latencies}
+            return {proto: latencies for proto, latencies in data.items() if latencies}
+        if name == 'latency_timeline':
+            data = {}
             for proto in self.latencies:
-                # Filter out negative latencies
-                positive_latencies = [lat for lat in self.latencies[proto] if lat >= 0]
-                if positive_latencies:
-                    kde = sns.kdeplot(data=positive_latencies, label=proto)
-                    
-                    line = kde.lines[-1]
-                    xdata = line.get_xdata()
-                    ydata = line.get_ydata()
-                    
-                    # Write coordinates to both files
-                    for x, y in zip(xdata, ydata):
-                        if x >= 0:
-                            txt_file.write(f"{proto}\t{x:.6f}\t{y:.6f}\n")
-                            csv_file.write(f"{proto},{x:.6f},{y:.6f}\n")
-                    
-                    # Add separator between protocols
-                    txt_file.write("\n")
-                    csv_file.write("\n")
-        
-        plt.xlabel('Latency (ms)')
-        plt.ylabel('Density')
-        plt.title('Latency Distribution by Protocol')
-        plt.legend()
-        plt.xlim(left=0)  # Force x-axis to start at 0
-        plt.savefig(f'{output_dir}/latency_distribution.png')
-        plt.close()
+                positive_data = [(t, l) for t, l in zip(self.timestamps[proto], self.latencies[proto]) if l >= 0]
+                if positive_data:
+                    timestamps, latencies = zip(*positive_data)
+                    data[proto] = (list(timestamps), list(latencies))
+            return data
+        if name == 'jitter_distribution':
+            data = {proto: [j for j in self.jitter_values[proto] if j >= 0] for proto in self.jitter_values}
+            return {proto: jitter for proto, jitter in data.items() if jitter}
+        if name == 'packet_size_distribution':
+            return {proto: [size for size in self.packet_sizes[proto] if size >= 0] for proto in self.packet_sizes}
+        if name == 'delay_categories':
+            return [(category, [d['delay'] for d in delays if d['delay'] >= 0])
+                    for category, delays in self.delay_categories.items()]
+        if name == 'delay_types_distribution':
+            data = {}
+            for delay_type, delays in self.delay_analysis.items():
+                all_delays = [d['delay'] for proto_delays in delays.values() for d in proto_delays]
+                if all_delays:
+                    data[delay_type] = all_delays
+            return data
+        if name == 'delay_patterns_timeline':
+            congestion = self.delay_patterns['congestion_events']
+            jitter = self.delay_patterns['jitter_events']
+            return {
+                'congestion': ([e['time'] for e in congestion], [e['avg_delay'] for e in congestion]),
+                'jitter': ([e['time'] for e in jitter], [e['jitter'] for e in jitter]),
+            }
+        if name == 'size_delay_correlation':
+            return {proto: (self.packet_sizes[proto][:len(self.latencies[proto])], list(self.latencies[proto]))
+                    for proto in self.latencies if self.latencies[proto]}
+        raise KeyError(name)
+
+    def _plot_latency_distribution(self, output_dir):
+        render_chart('latency_distribution', self._chart_data('latency_distribution'), output_dir)
 
     def _plot_latency_timeline(self, output_dir):
-        plt.figure(figsize=(15, 7))
-        for proto in self.latencies:
-            # Filter out negative latencies
-            positive_data = [(t, l) for t, l in zip(self.timestamps[proto], self.latencies[proto]) if l >= 0]
-            if positive_data:
-                timestamps, latencies = zip(*positive_data)
-                plt.plot(timestamps, latencies, label=proto, alpha=0.7, marker='.')
-        
-        plt.xlabel('Time (seconds)')
-        plt.ylabel('Latency (ms)')
-        plt.title('Packet Latency Timeline')
-        plt.legend()
-        plt.grid(True)
-        plt.ylim(bottom=0)  # Force y-axis to start at 0
-        plt.savefig(f'{output_dir}/latency_timeline.png')
-        plt.close()
+        render_chart('latency_timeline', self._chart_data('latency_timeline'), output_dir)
 
     def _plot_jitter_distribution(self, output_dir):
-        plt.figure(figsize=(12, 6))
-        for proto in self.jitter_values:
-            # Jitter values should already be non-negative (abs), but let's ensure
-            jitter_values = [j for j in self.jitter_values[proto] if j >= 0]
-            if jitter_values:
-                sns.kdeplot(data=jitter_values, label=proto)
-        
-        plt.xlabel('Jitter (ms)')
-        plt.ylabel('Density')
-        plt.title('Jitter Distribution by Protocol')
-        plt.legend()
-        plt.xlim(left=0)  # Force x-axis to start at 0
-        plt.savefig(f'{output_dir}/jitter_distribution.png')
-        plt.close()
+        render_chart('jitter_distribution', self._chart_data('jitter_distribution'), output_dir)
 
     def _plot_packet_size_distribution(self, output_dir):
-        plt.figure(figsize=(12, 6))
-        has_data = False
-        
-        for proto in self.packet_sizes:
-            # Ensure all packet sizes are non-negative
-            sizes = [size for size in self.packet_sizes[proto] if size >= 0]
-            if len(sizes) > 1 and np.var(sizes) > 0:
-                sns.kdeplot(data=sizes, label=f"{proto} (n={len(sizes)})")
-                has_data = True
-            elif len(sizes) > 0:
-                avg_size = np.mean(sizes)
-                plt.axvline(x=avg_size, label=f"{proto} (constant {avg_size:.0f} bytes, n={len(sizes)})", 
-                           linestyle='--')
-                has_data = True
-        
-        if has_data:
-            plt.xlabel('Packet Size (bytes)')
-            plt.ylabel('Density')
-            plt.title('Packet Size Distribution by Protocol')
-            plt.legend()
-            plt.xlim(left=0)  # Force x-axis to start at 0
-        else:
-            plt.text(0.5, 0.5, 'No packet size data available', 
-                    horizontalalignment='center', verticalalignment='center')
-        
-        plt.savefig(f'{output_dir}/packet_size_distribution.png')
-        plt.close()
+        render_chart('packet_size_distribution', self._chart_data('packet_size_distribution'), output_dir)
 
     def _plot_delay_categories(self, output_dir):
-        plt.figure(figsize=(15, 7))
-        for category, delays in self.delay_categories.items():
-            if delays:
-                # Filter out negative delays
-                positive_delays = [d['delay'] for d in delays if d['delay'] >= 0]
-                if positive_delays:
-                    plt.boxplot(positive_delays, positions=[list(self.delay_categories.keys()).index(category)],
-                              labels=[category.replace('_', ' ').title()])
-        
-        plt.xlabel('Delay Category')
-        plt.ylabel('Delay (ms)')
-        plt.title('Delay Distribution by Category')
-        plt.xticks(rotation=45)
-        plt.grid(True)
-        plt.ylim(bottom=0)  # Force y-axis to start at 0
-        plt.tight_layout()
-        plt.savefig(f'{output_dir}/delay_categories.png')
-        plt.close()
+        render_chart('delay_categories', self._chart_data('delay_categories'), output_dir)
 
     def _generate_text_report(self, output_dir):
         """Generate comprehensive analysis report"""
         with open(f'{output_dir}/analysis_report.txt', 'w') as f:
             # Get overview data
-            overview = self.get_capture_overview()
+            overview = self.get_capture_overview(address_stats=False)
+            talkers = self.get_top_talkers(10)
             stats = self.basic_statistics()
+            total_packets = stats['total_packets']
             
             # File Information
             f.write("=====================================\n")
@@ -832,35 +870,35 @@ class PacketAnalyzer:
             # Protocol Distribution
             f.write("\n=== Protocol Distribution ===\n")
             for proto, count in sorted(overview['protocols'].items(), key=lambda x: x[1], reverse=True):
-                percentage = (count / len(self.packets)) * 100
+                percentage = (count / total_packets) * 100
                 f.write(f"{proto:<10} : {count:>6} packets ({percentage:>6.2f}%)\n")
             
             # Packet Type Distribution
             f.write("\n=== Packet Type Distribution ===\n")
             for pkt_type, count in sorted(overview['packet_counts'].items(), key=lambda x: x[1], reverse=True):
-                percentage = (count / len(self.packets)) * 100
+                percentage = (count / total_packets) * 100
                 f.write(f"{pkt_type:<10} : {count:>6} packets ({percentage:>6.2f}%)\n")
             
             # IP Statistics
             f.write("\n=== Top Source IP Addresses ===\n")
-            for ip, count in sorted(overview['ip_stats']['sources'].items(), key=lambda x: x[1], reverse=True)[:10]:
-                percentage = (count / len(self.packets)) * 100
+            for ip, count, _ in talkers['ip_stats']['sources']:
+                percentage = (count / total_packets) * 100
                 f.write(f"{ip:<15} : {count:>6} packets ({percentage:>6.2f}%)\n")
             
             f.write("\n=== Top Destination IP Addresses ===\n")
-            for ip, count in sorted(overview['ip_stats']['destinations'].items(), key=lambda x: x[1], reverse=True)[:10]:
-                percentage = (count / len(self.packets)) * 100
+            for ip, count, _ in talkers['ip_stats']['destinations']:
+                percentage = (count / total_packets) * 100
                 f.write(f"{ip:<15} : {count:>6} packets ({percentage:>6.2f}%)\n")
             
             # Port Statistics
             f.write("\n=== Top Source Ports ===\n")
-            for port, count in sorted(overview['port_stats']['sources'].items(), key=lambda x: x[1], reverse=True)[:10]:
-                percentage = (count / len(self.packets)) * 100
+            for port, count, _ in talkers['port_stats']['sources']:
+                percentage = (count / total_packets) * 100
                 f.write(f"Port {port:<6} : {count:>6} packets ({percentage:>6.2f}%)\n")
             
             f.write("\n=== Top Destination Ports ===\n")
-            for port, count in sorted(overview['port_stats']['destinations'].items(), key=lambda x: x[1], reverse=True)[:10]:
-                percentage = (count / len(self.packets)) * 100
+            for port, count, _ in talkers['port_stats']['destinations']:
+                percentage = (count / total_packets) * 100
                 f.write(f"Port {port:<6} : {count:>6} packets ({percentage:>6.2f}%)\n")
             
             # Protocol-specific Statistics
@@ -891,7 +929,7 @@ class PacketAnalyzer:
             # Performance Insights
             f.write("\n=== Performance Insights ===\n")
             # Add average packet rates
-            packets_per_second = len(self.packets) / duration
+            packets_per_second = total_packets / duration
             f.write(f"Average Packet Rate: {packets_per_second:.2f} packets/second\n")
             
             # Add protocol-specific rates
@@ -901,7 +939,7 @@ class PacketAnalyzer:
                 f.write(f"  {proto:<10}: {rate:.2f} packets/second\n")
             
             # Add overall network load
-            total_bytes = sum(len(pkt) for pkt in self.packets)
+            total_bytes = int(self.get_packet_table().length.sum())
             bandwidth = (total_bytes * 8) / (duration * 1000000)  # Mbps
             f.write(f"\nAverage Network Load: {bandwidth:.2f} Mbps\n")
             
@@ -954,12 +992,10 @@ class PacketAnalyzer:
             
             # Device patterns
             f.write("\nDevice Transmission Patterns:\n")
-            for device, patterns in self.iot_metrics['device_patterns'].items():
-                small_pkts = sum(1 for p in patterns if p['type'] == 'small')
-                bundle_pkts = sum(1 for p in patterns if p['type'] == 'bundle')
+            for device, aggregate in self.iot_metrics['device_patterns'].items():
                 f.write(f"\n  Device {device}:\n")
-                f.write(f"    Small Packets: {small_pkts}\n")
-                f.write(f"    Bundled Packets: {bundle_pkts}\n")
+                f.write(f"    Small Packets: {aggregate.types['small']}\n")
+                f.write(f"    Bundled Packets: {aggregate.types['bundle']}\n")
 
             # Add delay analysis
             f.write("\n=== Detailed Delay Analysis ===\n")
@@ -984,24 +1020,24 @@ class PacketAnalyzer:
             
             # Root Cause Analysis
             f.write("\nRoot Cause Analysis:\n")
-            correlation_data = self.analyze_delay_root_causes()
-            for proto in correlation_data['protocol_vs_delay']:
-                delays = correlation_data['protocol_vs_delay'][proto]
-                if delays:
+            correlations = self.get_delay_correlations()
+            for proto, correlation in correlations.items():
+                delays = np.asarray(self.latencies.get(proto, []))
+                if len(delays):
                     f.write(f"\n{proto}:\n")
                     f.write(f"  Average Delay: {np.mean(delays):.2f} ms\n")
                     f.write(f"  Delay Variation: {np.std(delays):.2f} ms\n")
                     
                     # Size correlation
-                    size_data = correlation_data['size_vs_delay'][proto]
-                    sizes = [d['size'] for d in size_data]
-                    size_delays = [d['delay'] for d in size_data]
-                    if len(sizes) > 1:
-                        correlation = np.corrcoef(sizes, size_delays)[0,1]
-                        f.write(f"  Size-Delay Correlation: {correlation:.2f}\n")
-
-    def get_capture_overview(self):
-        """Generate a comprehensive overview of the capture file"""
+                    if correlation['pearson'] is not None:
+                        f.write(f"  Size-Delay Correlation: {correlation['pearson']:.2f}\n")
+
+    def get_capture_overview(self, address_stats=True):
+        """Generate a comprehensive overview of the capture file
+
+        address_stats=False leaves the per-address/port counts empty, for
+        callers that only need the top ones (see get_top_talkers).
+        """
         overview = {
             'packet_counts': defaultdict(int),
             'protocols': defaultdict(int),
@@ -1019,49 +1055,84 @@ class PacketAnalyzer:
             }
         }
         
-        for pkt in self.packets:
-            # Update timestamp range
-            pkt_time = float(pkt.time)
-            overview['time_range']['start'] = min(overview['time_range']['start'], pkt_time)
-            overview['time_range']['end'] = max(overview['time_range']['end'], pkt_time)
-            
-            # Get protocol and update counts
-            proto = self._get_protocol(pkt)
-            overview['protocols'][proto] += 1
-            
-            # IP-level statistics
-            if IP in pkt:
-                overview['packet_counts']['IP'] += 1
-                overview['ip_stats']['sources'][pkt[IP].src] += 1
-                overview['ip_stats']['destinations'][pkt[IP].dst] += 1
-                
-                # TCP statistics
-                if TCP in pkt:
-                    overview['packet_counts']['TCP'] += 1
-                    overview['port_stats']['sources'][pkt[TCP].sport] += 1
-                    overview['port_stats']['destinations'][pkt[TCP].dport] += 1
-                
-                # UDP statistics
-                elif UDP in pkt:
-                    overview['packet_counts']['UDP'] += 1
-                    overview['port_stats']['sources'][pkt[UDP].sport] += 1
-                    overview['port_stats']['destinations'][pkt[UDP].dport] += 1
-            
-            # Non-IP packet statistics
-            elif 'ARP' in pkt:
-                overview['packet_counts']['ARP'] += 1
-            elif 'IPv6' in pkt:
-                overview['packet_counts']['IPv6'] += 1
+        table = self.get_packet_table()
+        if len(table) == 0:
+            return overview
+
+        # Update timestamp range
+        overview['time_range']['start'] = float(table.time.min())
+        overview['time_range']['end'] = float(table.time.max())
+        
+        # Protocol counts, in order of first appearance like the per-packet loop used to produce
+        codes, counts = counts_in_order(self.get_packet_metrics()["protocol"])
+        for code, count in zip(codes.tolist(), counts.tolist()):
+            overview['protocols'][PROTOCOL_NAMES[code]] = count
+        
+        # Packet type counts, ordered by first packet of each type (IP before its TCP/UDP)
+        ipv4 = table.l3 == L3_IPV4
+        ip = ip_mask(table)
+        tcp = ip & (table.l4 == L4_TCP)
+        udp = ip & (table.l4 == L4_UDP)
+        type_masks = [('IP', ipv4, 0), ('TCP', tcp, 1), ('UDP', udp, 1),
+                      ('ARP', table.l3 == L3_ARP, 0), ('IPv6', table.l3 == L3_IPV6, 0)]
+        present = [(int(np.argmax(mask)), rank, name, int(mask.sum()))
+                   for name, mask, rank in type_masks if mask.any()]
+        for _, _, name, count in sorted(present):
+            overview['packet_counts'][name] = count
+        
+        if not address_stats:
+            return overview
+
+        # IP-level statistics
+        for key, column in (('sources', table.src), ('destinations', table.dst)):
+            addr_codes, counts = counts_in_order(column[ip])
+            for addr, count in zip(table.addresses[addr_codes].tolist(), counts.tolist()):
+                overview['ip_stats'][key][addr] = count
+        
+        # TCP/UDP port statistics
+        transport = tcp | udp
+        for key, column in (('sources', table.sport), ('destinations', table.dport)):
+            ports, counts = counts_in_order(column[transport])
+            for port, count in zip(ports.tolist(), counts.tolist()):
+                overview['port_stats'][key][port] = count
         
         return overview
 
+    def get_top_talkers(self, k=TOP_K, capacity=None):
+        """Top k source/destination IPs and TCP/UDP ports as [(value, packets, error)]
+
+        Without a capacity the counts are exact and only the k largest get
+        sorted. With one they come from Space-Saving and Count-Min sketches of
+        capacity counters, so memory stays bounded whatever the number of
+        distinct addresses and ports; packets then overestimates by at most
+        error, itself at most packets / capacity.
+        """
+        table = self.get_packet_table()
+        ip = ip_mask(table)
+        transport = ip & ((table.l4 == L4_TCP) | (table.l4 == L4_UDP))
+
+        def top(column, mask):
+            if capacity:
+                return sketch_top(column, k, capacity, mask=mask)
+            return exact_top(column[mask], k)
+
+        talkers = {'ip_stats': {}, 'port_stats': {}}
+        for key, column in (('sources', table.src), ('destinations', table.dst)):
+            talkers['ip_stats'][key] = [(str(table.addresses[code]), count, error)
+                                        for code, count, error in top(column, ip)]
+        for key, column in (('sources', table.sport), ('destinations', table.dport)):
+            talkers['port_stats'][key] = top(column, transport)
+        return talkers
+
     def print_capture_overview(self):
         """Print a formatted overview of the capture file"""
-        overview = self.get_capture_overview()
+        overview = self.get_capture_overview(address_stats=False)
+        talkers = self.get_top_talkers(5)
         
         print("\n=== PCAP File Overview ===")
         print(f"File: {self.pcap_file}")
-        print(f"Total Packets: {len(self.packets)}")
+        total_packets = len(self.get_packet_table())
+        print(f"Total Packets: {total_packets}")
         
         # Time range
         start_time = datetime.fromtimestamp(overview['time_range']['start'])
@@ -1075,35 +1146,35 @@ class PacketAnalyzer:
         # Protocol distribution
         print("\nProtocol Distribution:")
         for proto, count in sorted(overview['protocols'].items(), key=lambda x: x[1], reverse=True):
-            percentage = (count / len(self.packets)) * 100
+            percentage = (count / total_packets) * 100
             print(f"  {proto:<10} : {count:>6} packets ({percentage:>6.2f}%)")
         
         # Packet type counts
         print("\nPacket Type Counts:")
         for pkt_type, count in sorted(overview['packet_counts'].items(), key=lambda x: x[1], reverse=True):
-            percentage = (count / len(self.packets)) * 100
+            percentage = (count / total_packets) * 100
             print(f"  {pkt_type:<10} : {count:>6} packets ({percentage:>6.2f}%)")
         
         # Top IP addresses
         print("\nTop Source IP Addresses:")
-        for ip, count in sorted(overview['ip_stats']['sources'].items(), key=lambda x: x[1], reverse=True)[:5]:
-            percentage = (count / len(self.packets)) * 100
+        for ip, count, _ in talkers['ip_stats']['sources']:
+            percentage = (count / total_packets) * 100
             print(f"  {ip:<15} : {count:>6} packets ({percentage:>6.2f}%)")
         
         print("\nTop Destination IP Addresses:")
-        for ip, count in sorted(overview['ip_stats']['destinations'].items(), key=lambda x: x[1], reverse=True)[:5]:
-            percentage = (count / len(self.packets)) * 100
+        for ip, count, _ in talkers['ip_stats']['destinations']:
+            percentage = (count / total_packets) * 100
             print(f"  {ip:<15} : {count:>6} packets ({percentage:>6.2f}%)")
         
         # Top ports
         print("\nTop Source Ports:")
-        for port, count in sorted(overview['port_stats']['sources'].items(), key=lambda x: x[1], reverse=True)[:5]:
-            percentage = (count / len(self.packets)) * 100
+        for port, count, _ in talkers['port_stats']['sources']:
+            percentage = (count / total_packets) * 100
             print(f"  Port {port:<6} : {count:>6} packets ({percentage:>6.2f}%)")
         
         print("\nTop Destination Ports:")
-        for port, count in sorted(overview['port_stats']['destinations'].items(), key=lambda x: x[1], reverse=True)[:5]:
-            percentage = (count / len(self.packets)) * 100
+        for port, count, _ in talkers['port_stats']['destinations']:
+            percentage = (count / total_packets) * 100
             print(f"  Port {port:<6} : {count:>6} packets ({percentage:>6.2f}%)")
 
 def main():